@@ -1,8 +1,14 @@
-import csv
+import argparse
+import os
+import sys
+import time
 from pathlib import Path
 
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../scripts')))
+from csv_timeseries import CsvTail, check_tolerances, compare_series, decimate, format_metrics, load_csv
+
 
 CSV_PATHS = [
     "fuel_rods/SomeTests/Mytest/PlaneStress/PlaneStressCeramic_post.csv",
@@ -11,31 +17,65 @@ CSV_PATHS = [
     "fuel_rods/SomeTests/Mytest/GeneralizedPaneStrain/PaneStrainCeramic_physics_post.csv"
 ]
 
+REFERENCE = "3DPressure"  # 差异指标的参考运行（三维模型）
+
 
-def load_csv(path):
-    path = Path(path)
-    with path.open("r", newline="") as f:
-        reader = csv.DictReader(f)
-        fieldnames = [name.lstrip("# ").strip() for name in reader.fieldnames]
-        data = {name: [] for name in fieldnames}
-        for row in reader:
-            for raw_key, value in row.items():
-                key = raw_key.lstrip("# ").strip()
-                if value is None or value == "":
-                    continue
-                data[key].append(float(value))
-    return data
+def watch(csv_list, interval):
+    """在窗口中实时显示求解器仍在写入的CSV：只解析新增的行，有新数据时最多每interval秒重画一次"""
+    columns = ["time", "avg_temp", "max_MaxPrincipal"]
+    tails = [CsvTail(p, columns) for p in csv_list]
+    plt.ion()
+    fig, axes = plt.subplots(nrows=2, ncols=1, figsize=(8, 6), sharex=True)
+    width = int(fig.get_figwidth() * fig.dpi)
+    axes[0].set_ylabel("avg_temp")
+    axes[1].set_ylabel("max_MaxPrincipal")
+    axes[1].set_xlabel("time")
+    lines = {}  # (CSV序号, 列名) -> 曲线
+
+    try:
+        while plt.fignum_exists(fig.number):
+            start = time.monotonic()
+            if sum(tail.update() for tail in tails):
+                for i, tail in enumerate(tails):
+                    data = tail.data()
+                    if not tail.count or not all(key in data for key in columns):
+                        continue
+                    for ax, key in zip(axes, columns[1:]):
+                        t, y = decimate(data["time"], data[key], width)
+                        if (i, key) in lines:
+                            lines[(i, key)].set_data(t, y)
+                        else:
+                            lines[(i, key)], = ax.plot(t, y, label=tail.path.stem)
+                            ax.legend()
+                for ax in axes:
+                    ax.relim()
+                    ax.autoscale_view()
+                fig.canvas.draw_idle()
+            plt.pause(max(0.01, interval - (time.monotonic() - start)))
+    except KeyboardInterrupt:
+        pass
 
 
 def main():
+    parser = argparse.ArgumentParser(description="对比各模型的avg_temp与max_MaxPrincipal时间序列")
+    parser.add_argument("--reference", default=REFERENCE, help=f"参考运行（文件名），默认 {REFERENCE}")
+    parser.add_argument("--rtol", type=float, help="相对L2误差上限，超出时以退出码1结束")
+    parser.add_argument("--max-peak-shift", type=float, help="峰值时刻偏移上限（时间单位）")
+    parser.add_argument("--watch", type=float, metavar="秒",
+                        help="实时显示仍在写入的CSV，按不短于该间隔的频率增量刷新")
+    args = parser.parse_args()
+
     script_path = Path(__file__).resolve()
     repo_root = script_path.parents[3]
 
     csv_list = [repo_root / p for p in CSV_PATHS]
+    if args.watch is not None:
+        watch(csv_list, args.watch)
+        return
 
     series = []
     for p in csv_list:
-        data = load_csv(p)
+        data = load_csv(p, ["time", "avg_temp", "max_MaxPrincipal"])
         if "time" not in data:
             continue
         if "avg_temp" not in data or "max_MaxPrincipal" not in data:
@@ -52,18 +92,28 @@ def main():
     if not series:
         raise RuntimeError("没有找到包含 time/avg_temp/max_MaxPrincipal 的 CSV")
 
+    failures = []
+    if args.reference in [s["label"] for s in series] and len(series) > 1:
+        rows = compare_series(series, ["avg_temp", "max_MaxPrincipal"], args.reference)
+        print(f"相对 {args.reference} 的差异:")
+        print(format_metrics(rows))
+        failures = check_tolerances(rows, args.rtol, max_peak_shift=args.max_peak_shift)
+    elif args.rtol is not None or args.max_peak_shift is not None:
+        failures = [f"参考运行 {args.reference} 不在可用的CSV中，无法检查容差"]
+
     fig, axes = plt.subplots(nrows=2, ncols=1, figsize=(8, 6), sharex=True)
 
     ax_temp = axes[0]
     ax_stress = axes[1]
+    width = int(fig.get_figwidth() * fig.dpi)  # 子图的像素宽度，降采样到每像素列最小/最大值
 
     for s in series:
-        ax_temp.plot(s["time"], s["avg_temp"], label=s["label"])
+        ax_temp.plot(*decimate(s["time"], s["avg_temp"], width), label=s["label"])
     ax_temp.set_ylabel("avg_temp")
     ax_temp.legend()
 
     for s in series:
-        ax_stress.plot(s["time"], s["max_MaxPrincipal"], label=s["label"])
+        ax_stress.plot(*decimate(s["time"], s["max_MaxPrincipal"], width), label=s["label"])
     ax_stress.set_xlabel("time")
     ax_stress.set_ylabel("max_MaxPrincipal")
     ax_stress.legend()
@@ -71,6 +121,11 @@ def main():
     fig.tight_layout()
     plt.show()
 
+    if failures:
+        print("超出容差:")
+        print("\n".join(f"  {line}" for line in failures))
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
@@ -1,13 +1,21 @@
+import argparse
 import csv
 import math
 import os
+import sys
+import time
 from pathlib import Path
 
+import numpy as np
+
 try:
     import matplotlib.pyplot as plt
 except ModuleNotFoundError:
     plt = None
 
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../scripts')))
+from csv_timeseries import CsvTail, check_tolerances, compare_series, decimate, format_metrics, has_data, load_csv
+
 
 CSV_PATHS = [
     "fuel_rods/SomeTests/Rods/3Dfilm/3DRod_csv.csv",
@@ -24,20 +32,8 @@ PLOTS = [
     ("strain_energy_total", "strain_energy_total"),
 ]
 
-
-def load_csv(path):
-    path = Path(path)
-    with path.open("r", newline="") as f:
-        reader = csv.DictReader(f)
-        fieldnames = [name.lstrip("# ").strip() for name in reader.fieldnames]
-        data = {name: [] for name in fieldnames}
-        for row in reader:
-            for raw_key, value in row.items():
-                key = raw_key.lstrip("# ").strip()
-                if value is None or value == "":
-                    continue
-                data[key].append(float(value))
-    return data
+PNG_DPI = 200
+REFERENCE = "3DRod"  # 差异指标的参考运行（三维模型）
 
 
 def _nice_ticks(vmin, vmax, nticks=5):
@@ -81,11 +77,9 @@ def write_svg_2x2(series, plots, output_path):
     plot_margin_t = 25
     plot_margin_b = 55
 
-    all_times = []
-    for s in series:
-        all_times.extend(s["time"])
-    tmin = min(all_times)
-    tmax = max(all_times)
+    all_times = np.concatenate([s["time"] for s in series])
+    tmin = float(np.nanmin(all_times))
+    tmax = float(np.nanmax(all_times))
     if tmin == tmax:
         tmin -= 1.0
         tmax += 1.0
@@ -137,11 +131,11 @@ def write_svg_2x2(series, plots, output_path):
         ymin = None
         ymax = None
         for s in series:
-            vals = s.get(key, [])
-            if not vals:
+            vals = s.get(key)
+            if vals is None or not np.isfinite(vals).any():
                 continue
-            vmin = min(vals)
-            vmax = max(vals)
+            vmin = float(np.nanmin(vals))
+            vmax = float(np.nanmax(vals))
             ymin = vmin if ymin is None else min(ymin, vmin)
             ymax = vmax if ymax is None else max(ymax, vmax)
         if ymin is None or ymax is None:
@@ -184,17 +178,14 @@ def write_svg_2x2(series, plots, output_path):
 
         for si, s in enumerate(series):
             color = palette[si % len(palette)]
-            t = s["time"]
-            yv = s[key]
-            n = min(len(t), len(yv))
-            pts = []
-            for i in range(n):
-                pts.append(
-                    (
-                        xmap(t[i], tmin, tmax, ax_x0, ax_x1),
-                        ymap(yv[i], ymin, ymax, ax_y0, ax_y1),
-                    )
+            # 每个像素列只保留最小/最大值点，峰值不丢失
+            t, yv = decimate(s["time"], s[key], int(ax_x1 - ax_x0), (tmin, tmax))
+            pts = list(
+                zip(
+                    xmap(t, tmin, tmax, ax_x0, ax_x1).tolist(),
+                    ymap(yv, ymin, ymax, ax_y0, ax_y1).tolist(),
                 )
+            )
             if pts:
                 svg.append(polyline(pts, color))
 
@@ -202,15 +193,91 @@ def write_svg_2x2(series, plots, output_path):
     Path(output_path).write_text("\n".join(svg), encoding="utf-8")
 
 
+def write_png_2x2(series, plots, output_path):
+    fig, axes = plt.subplots(nrows=2, ncols=2, figsize=(11, 7), sharex=True)
+    axes = axes.reshape(-1)
+
+    # 每个子图的像素宽度（按保存分辨率估算）
+    width = int(fig.get_figwidth() * PNG_DPI / 2)
+    for ax, (key, ylabel) in zip(axes, plots, strict=False):
+        for s in series:
+            ax.plot(*decimate(s["time"], s[key], width), label=s["label"])
+        ax.set_ylabel(ylabel)
+        ax.legend()
+
+    for ax in axes[-2:]:
+        ax.set_xlabel("time")
+
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=PNG_DPI)
+    return fig
+
+
+def watch(csv_list, interval, repo_root):
+    """监视求解器仍在追加的CSV：只解析新增的行，有新数据时最多每interval秒重画一次输出图"""
+    columns = ["time"] + [key for key, _ in PLOTS]
+    tails = [CsvTail(p, columns) for p in csv_list]
+    output_svg = repo_root / "timeseries_comparison.svg"
+    output_png = repo_root / "timeseries_comparison.png"
+    print(f"监视 {len(tails)} 个CSV，每 {interval:g} 秒检查一次（Ctrl+C 结束）")
+    try:
+        while True:
+            start = time.monotonic()
+            if sum(tail.update() for tail in tails):
+                series = []
+                for tail in tails:
+                    data = tail.data()
+                    if tail.count and all(key in data for key in columns):
+                        series.append({"label": tail.path.parent.name or tail.path.stem, **data})
+                if series:
+                    write_svg_2x2(series, PLOTS, output_svg)
+                    if plt is not None:
+                        plt.close(write_png_2x2(series, PLOTS, output_png))
+                    rows = "  ".join(f"{s['label']}: {len(s['time'])}" for s in series)
+                    print(f"[{time.strftime('%H:%M:%S')}] 已刷新  {rows}")
+            time.sleep(max(0.0, interval - (time.monotonic() - start)))
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_tolerance(text):
+    """列名=相对L2误差上限"""
+    column, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"容差格式应为 列名=数值: {text}")
+    return column, float(value)
+
+
+def write_metrics_csv(rows, output_path):
+    with Path(output_path).open("w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="对比各模型的CSV时间序列，并计算相对参考模型的差异")
+    parser.add_argument("--reference", default=REFERENCE, help=f"参考运行（目录名），默认 {REFERENCE}")
+    parser.add_argument("--grid-points", type=int, help="公共时间网格取等距点数（默认取各运行时间点的并集）")
+    parser.add_argument("--rtol", type=float, help="所有列的相对L2误差上限，超出时以退出码1结束")
+    parser.add_argument("--tol", type=parse_tolerance, action="append", default=[], metavar="列名=上限",
+                        help="单列的相对L2误差上限（可多次指定，覆盖--rtol）")
+    parser.add_argument("--max-peak-shift", type=float, help="峰值时刻偏移上限（时间单位）")
+    parser.add_argument("--watch", type=float, metavar="秒",
+                        help="监视仍在写入的CSV，按不短于该间隔的频率增量刷新输出图")
+    args = parser.parse_args()
+
     script_path = Path(__file__).resolve()
     repo_root = script_path.parents[3]
 
     csv_list = [repo_root / p for p in CSV_PATHS]
+    if args.watch is not None:
+        watch(csv_list, args.watch, repo_root)
+        return
 
     series = []
     for p in csv_list:
-        data = load_csv(p)
+        data = load_csv(p, ["time"] + [key for key, _ in PLOTS])
         if "time" not in data:
             continue
         if not all(key in data for key, _ in PLOTS):
@@ -223,35 +290,44 @@ def main():
             }
         )
 
-    if not series:
+    if not any(has_data(s) for s in series):
         raise RuntimeError("没有找到包含 time 以及目标字段的 CSV")
+    empty = [s["label"] for s in series if not has_data(s)]
+    if empty:
+        print(f"没有数据的运行（只有表头），不参与对比: {', '.join(empty)}")
 
     output_svg = repo_root / "timeseries_comparison.svg"
     write_svg_2x2(series, PLOTS, output_svg)
 
     output_paths = [str(output_svg)]
     if plt is not None:
-        fig, axes = plt.subplots(nrows=2, ncols=2, figsize=(11, 7), sharex=True)
-        axes = axes.reshape(-1)
-
-        for ax, (key, ylabel) in zip(axes, PLOTS, strict=False):
-            for s in series:
-                ax.plot(s["time"], s[key], label=s["label"])
-            ax.set_ylabel(ylabel)
-            ax.legend()
-
-        for ax in axes[-2:]:
-            ax.set_xlabel("time")
-
-        fig.tight_layout()
         output_png = repo_root / "timeseries_comparison.png"
-        fig.savefig(output_png, dpi=200)
+        write_png_2x2(series, PLOTS, output_png)
         output_paths.append(str(output_png))
 
         if os.environ.get("DISPLAY"):
             plt.show()
 
+    failures = []
+    labels = [s["label"] for s in series if has_data(s)]
+    if args.reference in labels and len(labels) > 1:
+        rows = compare_series(series, [key for key, _ in PLOTS], args.reference, args.grid_points)
+        output_metrics = repo_root / "timeseries_metrics.csv"
+        write_metrics_csv(rows, output_metrics)
+        output_paths.append(str(output_metrics))
+        print(f"相对 {args.reference} 的差异:")
+        print(format_metrics(rows))
+        failures = check_tolerances(rows, args.rtol, dict(args.tol), args.max_peak_shift)
+        if args.rtol is not None or args.tol or args.max_peak_shift is not None:
+            failures += [f"{label}: 没有数据，无法检查容差" for label in empty]
+    elif args.rtol is not None or args.tol or args.max_peak_shift is not None:
+        failures = [f"参考运行 {args.reference} 不在可用的CSV中或没有数据，无法检查容差"]
+
     print("\n".join(output_paths))
+    if failures:
+        print("超出容差:")
+        print("\n".join(f"  {line}" for line in failures))
+        sys.exit(1)
 
 
 if __name__ == "__main__":
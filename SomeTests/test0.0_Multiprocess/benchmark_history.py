@@ -0,0 +1,236 @@
+"""
+基准测试历史库（SQLite）与性能回归检查
+run_benchmark_simple.py 每次正式测量都记录到这里，按 可执行文件指纹 × 输入文件 × 配置 区分。
+升级MOOSE重新编译fuel_rods-opt后，用compare对比新旧指纹，出现显著变慢或内存增长时返回非零退出码。
+
+用法：
+    python benchmark_history.py list
+    python benchmark_history.py label <指纹前缀> <标签>
+    python benchmark_history.py compare --baseline <指纹前缀或标签> [--candidate <指纹前缀或标签>]
+"""
+
+import os
+import sys
+import math
+import sqlite3
+import hashlib
+import argparse
+import statistics
+import subprocess
+from functools import lru_cache
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_DB = os.path.join(SCRIPT_DIR, 'benchmark_history.sqlite')
+
+SLOWDOWN_THRESHOLD = 0.05   # 中位耗时增长超过5%才视为变慢
+MEMORY_THRESHOLD = 0.10     # 内存增长超过10%视为回归
+SIGNIFICANCE = 0.05         # 单侧Mann-Whitney U检验的显著性水平
+EXACT_LIMIT = 400           # 样本数乘积不超过此值时用精确分布，否则用正态近似
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT DEFAULT (datetime('now', 'localtime')),
+    host TEXT,
+    fingerprint TEXT,
+    input_name TEXT,
+    input_hash TEXT,
+    procs INTEGER,
+    threads INTEGER,
+    options TEXT,
+    elapsed REAL,
+    max_memory_mb REAL,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_key ON runs (fingerprint, host, input_hash, procs, threads, options);
+CREATE TABLE IF NOT EXISTS labels (
+    fingerprint TEXT PRIMARY KEY,
+    label TEXT UNIQUE
+);
+"""
+
+
+def exe_fingerprint(exe):
+    """可执行文件指纹：程序本身的内容哈希，加上ldd列出的各共享库（libmoose、libmesh、PETSc等）的路径、大小与修改时间
+
+    只重新编译MOOSE而应用代码不变时，可执行文件本身往往不变，因此必须把依赖库计入。
+    """
+    digest = hashlib.sha256()
+    with open(exe, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    try:
+        output = subprocess.run(['ldd', exe], capture_output=True, text=True, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError):
+        output = ''
+    for line in sorted(output.splitlines()):
+        path = line.split('=>')[-1].split('(')[0].strip()
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_size}:{int(stat.st_mtime)}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class HistoryStore:
+    """基准测试历史库"""
+
+    def __init__(self, path=HISTORY_DB):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def record(self, host, fingerprint, input_name, input_hash, procs, threads, options,
+               elapsed, max_memory_mb, status):
+        """记录一次运行（每次记录立即提交，中断时已完成的运行不会丢失）"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO runs (host, fingerprint, input_name, input_hash, procs, threads, options, "
+                "elapsed, max_memory_mb, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (host, fingerprint, input_name, input_hash, procs, threads, options,
+                 elapsed, max_memory_mb, status))
+
+    def set_label(self, fingerprint, label):
+        with self.conn:
+            self.conn.execute("DELETE FROM labels WHERE label = ?", (label,))
+            self.conn.execute("INSERT OR REPLACE INTO labels (fingerprint, label) VALUES (?, ?)",
+                              (fingerprint, label))
+
+    def resolve(self, name):
+        """标签或指纹前缀 -> 完整指纹；不存在或前缀不唯一时抛出ValueError"""
+        row = self.conn.execute("SELECT fingerprint FROM labels WHERE label = ?", (name,)).fetchone()
+        if row:
+            return row[0]
+        matches = [r[0] for r in self.conn.execute(
+            "SELECT DISTINCT fingerprint FROM runs WHERE fingerprint LIKE ?", (name + '%',))]
+        if len(matches) != 1:
+            raise ValueError(f"{'找不到' if not matches else '前缀不唯一'}: {name}")
+        return matches[0]
+
+    def latest(self):
+        """最近一次记录的指纹"""
+        row = self.conn.execute("SELECT fingerprint FROM runs ORDER BY id DESC LIMIT 1").fetchone()
+        if row is None:
+            raise ValueError("历史库为空")
+        return row[0]
+
+    def fingerprints(self):
+        return self.conn.execute(
+            "SELECT r.fingerprint, l.label, COUNT(*), MIN(r.recorded_at), MAX(r.recorded_at) "
+            "FROM runs r LEFT JOIN labels l ON l.fingerprint = r.fingerprint "
+            "GROUP BY r.fingerprint ORDER BY MIN(r.id)").fetchall()
+
+    def samples(self, fingerprint):
+        """{(主机, 输入哈希, 输入名, 进程数, 线程数, 选项): ([耗时...], [内存...])}，只含成功的运行"""
+        result = {}
+        for host, input_hash, input_name, procs, threads, options, elapsed, memory in self.conn.execute(
+                "SELECT host, input_hash, input_name, procs, threads, options, elapsed, max_memory_mb "
+                "FROM runs WHERE fingerprint = ? AND status = '成功'", (fingerprint,)):
+            times, memories = result.setdefault((host, input_hash, input_name, procs, threads, options), ([], []))
+            times.append(elapsed)
+            if memory is not None:
+                memories.append(memory)
+        return result
+
+
+@lru_cache(maxsize=None)
+def _u_counts(m, n):
+    """m+n个样本的全部排列中，Mann-Whitney U统计量取各值的排列数"""
+    if m == 0 or n == 0:
+        return (1,)
+    # 最大元素来自第一组时对U贡献n，否则贡献0
+    a, b = _u_counts(m - 1, n), _u_counts(m, n - 1)
+    counts = [0] * (m * n + 1)
+    for u, c in enumerate(a):
+        counts[u + n] += c
+    for u, c in enumerate(b):
+        counts[u] += c
+    return tuple(counts)
+
+
+def mann_whitney_greater(x, y):
+    """单侧Mann-Whitney U检验：x是否整体大于y，返回p值（并列按0.5计）"""
+    m, n = len(x), len(y)
+    u = sum(1.0 if a > b else 0.5 if a == b else 0.0 for a in x for b in y)
+    if m * n <= EXACT_LIMIT:
+        counts = _u_counts(m, n)
+        return sum(counts[math.ceil(u):]) / sum(counts)
+    mean = m * n / 2
+    sd = math.sqrt(m * n * (m + n + 1) / 12)
+    z = (u - 0.5 - mean) / sd
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(store, baseline, candidate, threshold=SLOWDOWN_THRESHOLD,
+            memory_threshold=MEMORY_THRESHOLD, alpha=SIGNIFICANCE):
+    """对比两个指纹的共同配置，打印结果并返回回归条目数"""
+    base, cand = store.samples(baseline), store.samples(candidate)
+    common = sorted(set(base) & set(cand))
+    if not common:
+        print("两个指纹没有共同的 主机/输入/配置，无法对比")
+        return 0
+
+    regressions = 0
+    print(f"{'输入':<24} {'配置':<10} {'基准(s)':>10} {'新(s)':>10} {'变化':>8} {'p值':>8} {'内存变化':>8}  结论")
+    for key in common:
+        host, _, input_name, procs, threads, options = key
+        (base_times, base_mem), (cand_times, cand_mem) = base[key], cand[key]
+        ratio = statistics.median(cand_times) / statistics.median(base_times)
+        p = mann_whitney_greater(cand_times, base_times)
+        mem_ratio = statistics.median(cand_mem) / statistics.median(base_mem) if base_mem and cand_mem else None
+
+        problems = []
+        if ratio > 1 + threshold and p < alpha:
+            problems.append("变慢")
+        if mem_ratio is not None and mem_ratio > 1 + memory_threshold:
+            problems.append("内存增长")
+        regressions += bool(problems)
+
+        config = f"{procs}x{threads}" + (f" {options}" if options else "")
+        mem_text = f"{mem_ratio - 1:+.1%}" if mem_ratio is not None else '-'
+        print(f"{input_name:<24} {config:<10} {statistics.median(base_times):>10.2f} "
+              f"{statistics.median(cand_times):>10.2f} {ratio - 1:>+8.1%} {p:>8.3f} {mem_text:>8}  "
+              f"{'、'.join(problems) or '正常'}  [{host}]")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基准测试历史库与性能回归检查')
+    parser.add_argument('--db', default=HISTORY_DB, help='历史库路径')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help='列出已记录的可执行文件指纹')
+
+    label_parser = commands.add_parser('label', help='为指纹设置易记的标签（如moose版本）')
+    label_parser.add_argument('fingerprint')
+    label_parser.add_argument('label')
+
+    compare_parser = commands.add_parser('compare', help='对比基准指纹与新指纹，有回归时退出码为1')
+    compare_parser.add_argument('--baseline', required=True, help='基准指纹前缀或标签')
+    compare_parser.add_argument('--candidate', help='新指纹前缀或标签（默认最近记录的指纹）')
+    compare_parser.add_argument('--threshold', type=float, default=SLOWDOWN_THRESHOLD, help='耗时增长阈值（比例）')
+    compare_parser.add_argument('--memory-threshold', type=float, default=MEMORY_THRESHOLD, help='内存增长阈值（比例）')
+    compare_parser.add_argument('--alpha', type=float, default=SIGNIFICANCE, help='显著性水平')
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db)
+    try:
+        if args.command == 'list':
+            for fingerprint, label, count, first, last in store.fingerprints():
+                print(f"{fingerprint}  {label or '':<16} {count:>5}次运行  {first} ~ {last}")
+        elif args.command == 'label':
+            store.set_label(store.resolve(args.fingerprint), args.label)
+        else:
+            baseline = store.resolve(args.baseline)
+            candidate = store.resolve(args.candidate) if args.candidate else store.latest()
+            print(f"基准: {baseline}  新: {candidate}\n")
+            regressions = compare(store, baseline, candidate, args.threshold, args.memory_threshold, args.alpha)
+            if regressions:
+                print(f"\n发现 {regressions} 项性能回归")
+                sys.exit(1)
+            print("\n未发现性能回归")
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,24 @@
 """
 MOOSE并行测试优化版（零依赖）
 保存为run_benchmark_compat.py，直接执行：python run_benchmark_compat.py
+多个配置在互不重叠的核心上并发运行，输出写入各自的日志文件（logs/目录）
+每个配置先预热再重复测量，统计中位数/IQR、加速比与并行效率，结果按主机和输入文件哈希写入JSON/CSV
+正式测量同时记录到SQLite历史库（benchmark_history.py），用于升级MOOSE后的性能回归检查
+--tune：以缩短的end_time对 进程数×线程数×PETSc选项组 做逐次减半搜索，给出每个输入最快且收敛的配置
 """
 
 import os
+import re
+import sys
+import csv
+import json
 import time
+import socket
+import hashlib
+import statistics
+import signal
+import asyncio
+import argparse
 import subprocess
 
 # 检查是否在moose环境
@@ -22,91 +36,421 @@ MOOSE_EXE = os.path.normpath(os.path.join(SCRIPT_DIR, '../../fuel_rods-opt'))  #
 
 # 配置参数（与您原始代码风格一致）
 TIME_LIMIT = 600                      # 与原始测试脚本一致
-RESULT_FILE = os.path.join(SCRIPT_DIR, 'benchmark_results.txt')  # 结果文件输出到脚本目录
+KILL_GRACE = 10                       # 超时发送SIGTERM后等待退出的秒数，之后SIGKILL
+RESULT_FILE = os.path.join(SCRIPT_DIR, 'benchmark_results.json')  # 结果文件输出到脚本目录，按主机/输入文件哈希累积
+RESULT_CSV = os.path.join(SCRIPT_DIR, 'benchmark_results.csv')    # 同一结果的表格形式
+WARMUP_RUNS = 1                       # 每个配置正式测量前的预热次数（不计入统计）
+REPEATS = 5                           # 每个配置的重复测量次数
+LOG_DIR = os.path.join(SCRIPT_DIR, 'logs')  # 每次运行的完整输出与结果文件（file_base）
+TOTAL_CORES = len(os.sched_getaffinity(0))  # 可分配的核心数，并发运行的配置占用互不重叠的核心
+
+# 性能图（Performance Graph）解析结果的导出目录：每次运行一份折叠栈与JSON
+PERF_DIR = os.path.join(SCRIPT_DIR, 'perf_graphs')
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, '../../scripts')))
+from perf_graph import export_perf_graph
+from benchmark_history import HistoryStore, exe_fingerprint
 
 # 新增线程配置参数
 PROCS_CONFIG = [5,6,7,8,9,10] #测试不同核数
 THREADS_CONFIG = [1, 2]  # 测试不同的线程数设置
 
-def run_test(input_file, procs, threads):
-    """增加线程参数"""
+# 自动调优（--tune）：候选PETSc选项组，取自输入文件[Executioner]中常切换的设置；None表示保持输入文件原设置
+PETSC_OPTION_SETS = {
+    'input': None,
+    'lu': ('-pc_type -ksp_type', 'lu gmres'),
+    'superlu_dist': ('-pc_type -pc_factor_mat_solver_package -ksp_type', 'lu superlu_dist gmres'),
+    'boomeramg': ('-ksp_gmres_restart -pc_type -pc_hypre_type', '201 hypre boomeramg'),
+    'qn': ('-pc_type -snes_type -snes_qn_type -snes_qn_scale_type -snes_linesearch_type',
+           'lu qn lbfgs jacobian bt'),
+}
+TUNE_START_FRACTION = 1 / 9           # 第一轮只算到总模拟时长的这一比例
+TUNE_ETA = 3                          # 每轮保留最快的1/ETA个候选，模拟时长乘以ETA，直到算完整个end_time
+TUNE_FILE = os.path.join(SCRIPT_DIR, 'tuning_results.json')  # 各输入文件的调优结果（按输入文件哈希）
+
+
+class CorePool:
+    """按编号分配互不重叠的核心集合，空闲核心不足时等待其他运行释放"""
+
+    def __init__(self, cores):
+        self.free = sorted(cores)
+        self.total = len(self.free)
+        self.condition = asyncio.Condition()
+
+    async def acquire(self, count):
+        count = min(count, self.total)  # 超过总核数的配置独占全部核心
+        async with self.condition:
+            await self.condition.wait_for(lambda: len(self.free) >= count)
+            cores, self.free = self.free[:count], self.free[count:]
+            return cores
+
+    async def release(self, cores):
+        async with self.condition:
+            self.free = sorted(self.free + cores)
+            self.condition.notify_all()
+
+
+def format_cores(cores):
+    """[0,1,2,5] -> '0-2,5'"""
+    ranges = []
+    for core in cores:
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ','.join(f"{a}-{b}" if a != b else str(a) for a, b in ranges)
+
+
+def extract_perf_graph(log_path):
+    """从运行日志中取出最后一张Performance Graph表（到Finished Executing为止）"""
+    with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    if "Performance Graph:" not in text:
+        return []
+    performance = ["Performance Graph:"]
+    for line in text.rsplit("Performance Graph:", 1)[1].splitlines()[1:]:
+        performance.append(line.strip())
+        if "Finished Executing" in line:
+            break
+    return performance
+
+
+def kill_group(process, sig):
+    """向mpiexec所在进程组（包括全部rank）发送信号"""
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+async def run_test(input_file, procs, threads, cores, log_path, extra_args=()):
+    """在指定核心上运行一个配置，返回(耗时, 状态, 性能图行)
+
+    输出直接写入log_path，不再逐行打印；超时按墙钟时间计算，与有无输出无关，
+    到时整个进程组先收到SIGTERM，KILL_GRACE秒后仍未退出则SIGKILL。
+    """
     cmd = [
         'mpiexec', '-n', str(procs),
         MOOSE_EXE, '-i', input_file,
         f'--n-threads={threads}',  # 动态配置线程数
-        '--timing'
+        '--timing',
+        # 同一输入的不同配置会同时运行，结果文件按运行区分
+        f'Outputs/file_base={os.path.splitext(log_path)[0]}',
+        *extra_args  # 命令行参数覆盖，如 Executioner/end_time=...
     ]
-    
-    start = time.time()
-    try:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True
-        )
-        
-        # 原始性能数据捕获逻辑
-        performance = []
-        capture = False
-        
-        while True:
-            line = process.stdout.readline()
-            if not line and process.poll() is not None:
-                break
-                
-            print(line.strip())  # 保持实时输出
-            
-            if "Performance Graph:" in line:
-                capture = True
-                performance = ["Performance Graph:"]
-            elif capture:
-                if "Finished Executing" in line:
-                    performance.append(line.strip())
-                    capture = False
-                else:
-                    performance.append(line.strip())
-                    
-            # 保持原始超时处理
-            if time.time() - start > TIME_LIMIT:
-                process.terminate()
-                return TIME_LIMIT, []
-                
-        return time.time()-start, performance
-        
-    except Exception as e:
-        print(f"运行错误: {str(e)}")
-        return 0, []
+
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, 'w') as log:
+        log.write(f"# 命令: {' '.join(cmd)}\n# 核心: {format_cores(cores)}\n")
+        log.flush()
+        start = time.time()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,  # 独立进程组，便于整组终止
+                preexec_fn=lambda: os.sched_setaffinity(0, cores)  # 各rank继承核心绑定
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"运行错误: {str(e)}")
+            return 0, "失败", []
+
+        try:
+            await asyncio.wait_for(process.wait(), TIME_LIMIT)
+        except asyncio.TimeoutError:
+            kill_group(process, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(process.wait(), KILL_GRACE)
+            except asyncio.TimeoutError:
+                kill_group(process, signal.SIGKILL)
+                await process.wait()
+            return TIME_LIMIT, "超时", []
+        finally:
+            # 清理mpiexec退出后残留的rank；中断（Ctrl-C）时同样整组终止
+            kill_group(process, signal.SIGKILL)
+
+    elapsed = time.time() - start
+    status = "成功" if process.returncode == 0 else f"失败({process.returncode})"
+    return elapsed, status, extract_perf_graph(log_path)
+
+
+async def run_batch(configs, cores, on_result, exclusive=False):
+    """并发运行全部(输入文件, 进程数, 线程数, 运行标签[, 附加参数])配置，每个完成后调用on_result
+
+    exclusive=True时每次运行独占全部核心（逐个运行），计时不受其他运行的内存带宽争用影响。
+    """
+    pool = CorePool(cores)
+
+    async def run_one(input_file, procs, threads, tag, extra_args=()):
+        name = os.path.splitext(os.path.basename(input_file))[0]
+        log_path = os.path.join(LOG_DIR, f"{name}_p{procs}_t{threads}_{tag}.log")
+        assigned = await pool.acquire(pool.total if exclusive else procs * threads)
+        label = f"{os.path.basename(input_file)} (进程: {procs}, 线程: {threads}, {tag})"
+        print(f"开始 {label} 核心: {format_cores(assigned)}")
+        try:
+            elapsed, status, perf_data = await run_test(input_file, procs, threads, assigned, log_path, extra_args)
+        finally:
+            await pool.release(assigned)
+        print(f"完成 {label}: {elapsed:.1f}秒 {status}  日志: {log_path}")
+        on_result(input_file, procs, threads, tag, elapsed, status, perf_data)
+
+    # 大配置先排队，避免被不断到来的小配置饿死
+    configs = sorted(configs, key=lambda c: c[1] * c[2], reverse=True)
+    await asyncio.gather(*(run_one(*config) for config in configs))
+
+
+def file_hash(path):
+    """输入文件内容的SHA-256前16位，输入改动后结果自动归入新的键"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def summarize(times, failed, procs, threads):
+    """一个配置的重复测量统计：中位数、四分位数与IQR"""
+    entry = {'procs': procs, 'threads': threads, 'cores': procs * threads,
+             'n': len(times), 'failed': failed, 'times': sorted(times)}
+    if times:
+        q1, median, q3 = statistics.quantiles(times, n=4, method='inclusive') if len(times) > 1 else times * 3
+        entry.update(median=median, q1=q1, q3=q3, iqr=q3 - q1)
+    return entry
+
+
+def add_scaling(entries, baseline=None):
+    """相对基准配置计算加速比与并行效率（默认以核心数最少的成功配置为基准）"""
+    measured = [e for e in entries if 'median' in e]
+    if baseline:
+        base = next((e for e in measured if (e['procs'], e['threads']) == baseline), None)
+    else:
+        base = min(measured, key=lambda e: (e['cores'], e['procs']), default=None)
+    for entry in entries:
+        if base is None or 'median' not in entry:
+            continue
+        entry['speedup'] = base['median'] / entry['median']
+        entry['efficiency'] = entry['speedup'] * base['cores'] / entry['cores']
+        entry['baseline'] = f"{base['procs']}x{base['threads']}"
+
+
+def save_results(results):
+    """合并写入JSON（{主机: {输入文件哈希: 结果}}）并重新生成CSV"""
+    if os.path.exists(RESULT_FILE):
+        with open(RESULT_FILE, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+    else:
+        stored = {}
+    for host, inputs in results.items():
+        stored.setdefault(host, {}).update(inputs)
+
+    tmp = RESULT_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(stored, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, RESULT_FILE)
+
+    columns = ['host', 'input', 'input_hash', 'procs', 'threads', 'cores', 'n', 'failed',
+               'median', 'q1', 'q3', 'iqr', 'speedup', 'efficiency', 'baseline', 'timestamp']
+    with open(RESULT_CSV, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for host, inputs in stored.items():
+            for input_hash, record in inputs.items():
+                for entry in record['configs']:
+                    writer.writerow({'host': host, 'input': record['input'], 'input_hash': input_hash,
+                                     'timestamp': record['timestamp'], **entry})
+
+
+def executioner_times(input_file):
+    """读取[Executioner]块中的start_time与end_time（start_time缺省为0）"""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    block = re.search(r'^\[Executioner\](.*?)^\[\]', content, re.M | re.S)
+    times = {'start_time': 0.0}
+    if block:
+        for key, value in re.findall(r'^\s*(start_time|end_time)\s*=\s*([^\s#]+)', block.group(1), re.M):
+            times[key] = float(value)
+    return times['start_time'], times.get('end_time')
+
+
+def petsc_args(option_set):
+    """PETSc选项组 -> MOOSE命令行覆盖参数"""
+    if option_set is None:
+        return []
+    iname, value = option_set
+    return [f"Executioner/petsc_options_iname='{iname}'", f"Executioner/petsc_options_value='{value}'"]
+
+
+def tune(input_file, cores, exclusive):
+    """逐次减半（successive halving）搜索最快且收敛的 进程数×线程数×PETSc选项组
+
+    每轮以缩短的end_time运行全部候选，只保留成功结束（即收敛到该时刻）的最快1/TUNE_ETA，
+    下一轮模拟时长乘以TUNE_ETA，直到完整end_time或只剩一个候选。
+    """
+    start_time, end_time = executioner_times(input_file)
+    if end_time is None:
+        print(f"{os.path.basename(input_file)}: [Executioner]中没有end_time，跳过调优")
+        return None
+
+    candidates = [(procs, threads, name)
+                  for procs in PROCS_CONFIG for threads in THREADS_CONFIG for name in PETSC_OPTION_SETS]
+    fraction = TUNE_START_FRACTION
+    rungs = []
+    survivors = []
+    while candidates:
+        rung_end = start_time + (end_time - start_time) * min(fraction, 1.0)
+        timings = {}
+
+        def on_result(input_file, procs, threads, tag, elapsed, status, perf_data):
+            timings[(procs, threads, tag.split('_', 1)[1])] = (elapsed, status)
+
+        runs = [(input_file, procs, threads, f"tune{len(rungs)}_{name}",
+                 [f'Executioner/end_time={rung_end:g}', *petsc_args(PETSC_OPTION_SETS[name])])
+                for procs, threads, name in candidates]
+        print(f"\n调优第{len(rungs) + 1}轮: {len(candidates)}个候选, end_time={rung_end:g}")
+        asyncio.run(run_batch(runs, cores, on_result, exclusive))
+
+        survivors = sorted((c for c in candidates if timings[c][1] == "成功"), key=lambda c: timings[c][0])
+        rungs.append({'end_time': rung_end, 'results': [
+            {'procs': p, 'threads': t, 'petsc': n, 'time': timings[(p, t, n)][0], 'status': timings[(p, t, n)][1]}
+            for p, t, n in candidates]})
+        if fraction >= 1.0 or len(survivors) <= 1:
+            break
+        candidates = survivors[:max(1, len(survivors) // TUNE_ETA)]
+        fraction *= TUNE_ETA
+
+    best = None
+    if survivors:
+        procs, threads, name = survivors[0]
+        best = {'procs': procs, 'threads': threads, 'petsc': name, 'petsc_options': PETSC_OPTION_SETS[name],
+                'time': timings[survivors[0]][0],
+                'end_time': rungs[-1]['end_time']}
+    return {'input': os.path.basename(input_file), 'host': socket.gethostname(),
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'), 'best': best, 'rungs': rungs}
+
+
+def tune_all(input_files, cores, exclusive):
+    """对每个输入文件调优，结果合并写入TUNE_FILE"""
+    if os.path.exists(TUNE_FILE):
+        with open(TUNE_FILE, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+    else:
+        stored = {}
+    for input_file in input_files:
+        result = tune(input_file, cores, exclusive)
+        if result is None:
+            continue
+        stored[file_hash(input_file)] = result
+        tmp = TUNE_FILE + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(stored, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, TUNE_FILE)
+
+        best = result['best']
+        print(f"\n{result['input']} 调优结果:")
+        if best is None:
+            print("  没有候选配置在第一轮收敛")
+            continue
+        print(f"  mpiexec -n {best['procs']} --n-threads={best['threads']}  "
+              f"({best['time']:.1f}秒 @ end_time={best['end_time']:g})")
+        if best['petsc_options']:
+            print(f"  petsc_options_iname = '{best['petsc_options'][0]}'")
+            print(f"  petsc_options_value = '{best['petsc_options'][1]}'")
+        else:
+            print("  PETSc选项保持输入文件原设置")
+    print(f"\n调优结果已写入: {TUNE_FILE}")
+
 
 def main():
+    global TIME_LIMIT
+    parser = argparse.ArgumentParser(description='MOOSE并行基准测试')
+    parser.add_argument('--cores', type=int, default=TOTAL_CORES, help=f'可用于并发运行的核心数（默认{TOTAL_CORES}）')
+    parser.add_argument('--timeout', type=float, default=TIME_LIMIT, help=f'单次运行的墙钟时间上限/秒（默认{TIME_LIMIT}）')
+    parser.add_argument('--warmup', type=int, default=WARMUP_RUNS, help=f'每个配置的预热次数（默认{WARMUP_RUNS}）')
+    parser.add_argument('--repeat', type=int, default=REPEATS, help=f'每个配置的重复测量次数（默认{REPEATS}）')
+    parser.add_argument('--baseline', help='加速比基准配置"进程数x线程数"，如 5x1（默认核心数最少的配置）')
+    parser.add_argument('--exclusive', action='store_true', help='每次运行独占全部核心，逐个运行（计时更稳定）')
+    parser.add_argument('--tune', action='store_true', help='自动调优模式：搜索每个输入最快且收敛的进程/线程/PETSc选项')
+    parser.add_argument('--label', help='为本次可执行文件指纹设置历史库标签，如 moose-2025-06')
+    parser.add_argument('--no-history', action='store_true', help='不记录到历史库')
+    args = parser.parse_args()
+
+    TIME_LIMIT = args.timeout
+    cores = sorted(os.sched_getaffinity(0))[:args.cores]
+
     # 获取输入文件列表（使用绝对路径）
     input_files = [os.path.join(INPUT_DIR, f) for f in os.listdir(INPUT_DIR) if f.endswith('.i')]
-    
-    # 创建结果文件（保持原始格式）
-    with open(RESULT_FILE, 'w') as f:
-        f.write("核心数,线程数,输入文件,总时间(s),状态\n")  # 修改表头
-        
-        for procs in PROCS_CONFIG:
-            for threads in THREADS_CONFIG:  # 新增线程循环
-                for input_file in input_files:
-                    print(f"\n测试 {os.path.basename(input_file)} (进程: {procs}, 线程: {threads})...")
-                    elapsed, perf_data = run_test(input_file, procs, threads)
-                    status = "成功" if elapsed < TIME_LIMIT else "超时"
-                    
-                    # 保持原始结果写入方式
-                    f.write(f"{procs}, {threads}, {os.path.basename(input_file)}, {elapsed:.1f}, {status}\n")
-                    if perf_data:
-                        f.write("\n".join(perf_data) + "\n")
-                    f.flush()  # 实时写入
+    if args.tune:
+        tune_all(input_files, cores, args.exclusive)
+        return
+
+    baseline = tuple(int(x) for x in args.baseline.lower().split('x')) if args.baseline else None
+    configs = [(input_file, procs, threads)
+               for procs in PROCS_CONFIG
+               for threads in THREADS_CONFIG  # 新增线程循环
+               for input_file in input_files]
+
+    # 预热：首次运行的文件缓存、动态库加载等开销不计入统计
+    if args.warmup > 0:
+        warmups = [(*config, f"warmup{i}") for config in configs for i in range(args.warmup)]
+        asyncio.run(run_batch(warmups, cores, lambda *result: None, args.exclusive))
+
+    times = {config: [] for config in configs}
+    failed = {config: 0 for config in configs}
+    host = socket.gethostname()
+    history = None if args.no_history else HistoryStore()
+    if history:
+        fingerprint = exe_fingerprint(MOOSE_EXE)
+        if args.label:
+            history.set_label(fingerprint, args.label)
+        input_hashes = {input_file: file_hash(input_file) for input_file in input_files}
+        print(f"可执行文件指纹: {fingerprint}")
+
+    def on_result(input_file, procs, threads, tag, elapsed, status, perf_data):
+        if status == "成功":
+            times[(input_file, procs, threads)].append(elapsed)
+        else:
+            failed[(input_file, procs, threads)] += 1
+        roots = []
+        if perf_data:
+            # 解析为层次树并导出火焰图折叠栈与JSON
+            name = os.path.splitext(os.path.basename(input_file))[0]
+            roots = export_perf_graph(perf_data, os.path.join(PERF_DIR, f"{name}_p{procs}_t{threads}_{tag}"))
+        if history:
+            # 性能图根节点的总内存即整个运行的内存占用
+            memory = max((root.total_mem for root in roots), default=None)
+            history.record(host, fingerprint, os.path.basename(input_file), input_hashes[input_file],
+                           procs, threads, '', elapsed, memory, status)
+
+    runs = [(*config, f"rep{i}") for config in configs for i in range(args.repeat)]
+    asyncio.run(run_batch(runs, cores, on_result, args.exclusive))
+
+    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    results = {host: {}}
+    for input_file in input_files:
+        entries = [summarize(times[(input_file, procs, threads)], failed[(input_file, procs, threads)], procs, threads)
+                   for procs in PROCS_CONFIG for threads in THREADS_CONFIG]
+        add_scaling(entries, baseline)
+        results[host][file_hash(input_file)] = {
+            'input': os.path.basename(input_file), 'timestamp': timestamp, 'exe': MOOSE_EXE,
+            'warmup': args.warmup, 'repeat': args.repeat, 'configs': entries}
+
+        print(f"\n{os.path.basename(input_file)}")
+        print(f"{'进程x线程':>10} {'中位数(s)':>10} {'IQR(s)':>8} {'加速比':>8} {'效率':>8} {'成功/失败':>10}")
+        for e in entries:
+            if 'median' in e:
+                print(f"{e['procs']:>5}x{e['threads']:<4} {e['median']:>10.2f} {e['iqr']:>8.2f} "
+                      f"{e.get('speedup', 0):>8.2f} {e.get('efficiency', 0):>8.1%} {e['n']:>5}/{e['failed']}")
+            else:
+                print(f"{e['procs']:>5}x{e['threads']:<4} {'全部失败':>10} {'':>8} {'':>8} {'':>8} {0:>5}/{e['failed']}")
+
+    save_results(results)
+    print(f"\n结果已写入: {RESULT_FILE}  {RESULT_CSV}")
 
 if __name__ == "__main__":
     # 添加路径验证
     if not os.path.exists(INPUT_DIR):
         raise FileNotFoundError(f"输入文件目录不存在: {INPUT_DIR}")
-    
+
     if not os.path.isfile(MOOSE_EXE):
         raise FileNotFoundError(f"MOOSE可执行文件不存在: {MOOSE_EXE}")
-    
+
     start = time.time()
     main()
-    print(f"\n总耗时: {time.time()-start:.1f}秒")
\ No newline at end of file
+    print(f"\n总耗时: {time.time()-start:.1f}秒")
@@ -1,124 +1,636 @@
 """
 MOOSE仿真数据采集与报告生成一体化工具
-版本：2.1
+版本：2.4
 功能：实时监控、性能分析、自动生成对齐格式报告
+      也可离线分析已有日志（内存映射批量读取、多进程并行），
+      或跟随（tail）仍在写入的日志并从保存的字节偏移处续读
+      运行仿真时通过/proc采样各rank的内存、CPU、上下文切换与I/O，并对齐到时间步
+      可选的Prometheus格式指标接口（--metrics-port），供仪表盘与告警抓取
+      收敛健康度分析（收敛速率、停滞、dt回退），--abort-diverging时提前终止明显发散的运行
+      --per-rank/--tagged：按mpiexec的rank前缀拆分交错输出，主解析只用rank 0，各rank计时与内存分别统计
 """
 
-import subprocess
+import os
 import re
+import sys
+import mmap
 import time
+import array
+import pickle
+import signal
+import argparse
+import tempfile
+import weakref
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from collections import defaultdict
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../scripts')))
+from perf_graph import parse_perf_graph, top_sections, export_perf_graph
+from proc_sampler import ProcessTreeSampler
+from metrics_exporter import MetricsExporter
+from convergence_health import DivergencePolicy, nonlinear_rates, health_summary
+from rank_output import rank_tag_args, split_by_rank
+
+# 列式时间步存储：残差值数组超过该大小后溢出到内存映射文件
+SPILL_THRESHOLD_BYTES = 256 * 1024 * 1024
+SPILL_DIR = None  # 溢出文件目录，None表示系统临时目录
+
+
+def _remove_spill_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class GrowableArray:
+    """可增长的定长类型数组（array.array），超过阈值后把已有数据溢出到文件并以内存映射读取
+
+    append直接绑定到内存缓冲区的array.append，热点路径上没有Python层开销；
+    溢出检查只在spill_check()中进行（每个时间步开始时调用一次）。
+    溢出文件在close()、对象被回收或解释器退出时删除（出错退出也不会遗留在临时目录中）。
+    """
+
+    def __init__(self, typecode, spill_threshold=None):
+        self.typecode = typecode
+        self.dtype = np.dtype(typecode)
+        self.spill_threshold = spill_threshold
+        self.path = None      # 溢出文件路径
+        self.spilled = 0      # 已写入文件的元素数
+        self._finalizer = None
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self.buffer = array.array(self.typecode)
+        self.append = self.buffer.append
+
+    def __len__(self):
+        return self.spilled + len(self.buffer)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index >= self.spilled:
+            return self.buffer[index - self.spilled]
+        return self.view()[index]
+
+    def __setitem__(self, index, value):
+        # 只支持修改尚在内存中的元素（当前时间步的数据总在内存缓冲区里）
+        if index < 0:
+            index += len(self)
+        self.buffer[index - self.spilled] = value
+
+    def spill_check(self):
+        """内存缓冲区超过阈值时追加写入溢出文件"""
+        if self.spill_threshold is None or len(self.buffer) * self.buffer.itemsize < self.spill_threshold:
+            return
+        if self.path is None:
+            fd, self.path = tempfile.mkstemp(prefix='moose_store_', suffix='.bin', dir=SPILL_DIR)
+            os.close(fd)
+            self._finalizer = weakref.finalize(self, _remove_spill_file, self.path)
+        with open(self.path, 'ab') as f:
+            self.buffer.tofile(f)
+        self.spilled += len(self.buffer)
+        self._reset_buffer()
+
+    def slice(self, start, stop):
+        """[start, stop)区间的numpy副本，只读取需要的部分，不锁定内存缓冲区"""
+        parts = []
+        if start < self.spilled:
+            mapped = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(self.spilled,))
+            parts.append(np.array(mapped[start:min(stop, self.spilled)]))
+        if stop > self.spilled:
+            chunk = self.buffer[max(start - self.spilled, 0):stop - self.spilled]
+            parts.append(np.frombuffer(chunk, dtype=self.dtype) if len(chunk) else np.empty(0, self.dtype))
+        return np.concatenate(parts) if len(parts) > 1 else parts[0] if parts else np.empty(0, self.dtype)
+
+    def view(self):
+        """返回全部数据的numpy数组（溢出部分为只读内存映射）"""
+        in_memory = np.frombuffer(self.buffer, dtype=self.dtype) if len(self.buffer) else np.empty(0, self.dtype)
+        if not self.spilled:
+            return in_memory
+        mapped = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(self.spilled,))
+        return np.concatenate([mapped, in_memory]) if len(self.buffer) else mapped
+
+    def close(self):
+        """删除溢出文件"""
+        if self._finalizer:
+            self._finalizer()
+        self._finalizer = None
+        self.path = None
+        self.spilled = 0
+        self._reset_buffer()
+
+    def __getstate__(self):
+        # 溢出部分一并写入：原对象关闭后溢出文件即被删除
+        state = self.__dict__.copy()
+        del state['append'], state['_finalizer']
+        state.update(buffer=self.view().tobytes(), path=None, spilled=0)
+        return state
+
+    def __setstate__(self, state):
+        data = state.pop('buffer')
+        self.__dict__.update(state)
+        self._finalizer = None
+        self._reset_buffer()
+        self.buffer.frombytes(data)
+
+
+class TimestepStore:
+    """列式时间步数据：每个时间步尝试占一行
+
+    定长列（步号、物理时间、dt、单步耗时、最大内存、收敛标志）为类型数组；
+    残差历史为CSR格式：*_offsets[i]是第i行在对应values数组中的起始位置。
+    同一步号因不收敛而重试时会产生多行，便于分析时间步回退。
+    """
+
+    COLUMNS = {'step': 'q', 'time': 'd', 'dt': 'd', 'step_time': 'd', 'max_memory': 'd', 'converged': 'b'}
+
+    def __init__(self, spill_threshold=SPILL_THRESHOLD_BYTES):
+        for name, typecode in self.COLUMNS.items():
+            setattr(self, name, GrowableArray(typecode))
+        self.nonlinear_offsets = GrowableArray('q')
+        self.linear_offsets = GrowableArray('q')
+        self.nonlinear_values = GrowableArray('d', spill_threshold)
+        self.linear_values = GrowableArray('d', spill_threshold)
+
+    def __len__(self):
+        return len(self.step)
+
+    def begin_step(self, step, time_value, dt):
+        """开始新的一行"""
+        self.nonlinear_values.spill_check()
+        self.linear_values.spill_check()
+        self.step.append(step)
+        self.time.append(time_value)
+        self.dt.append(dt)
+        self.step_time.append(0.0)
+        self.max_memory.append(0.0)
+        self.converged.append(0)
+        self.nonlinear_offsets.append(len(self.nonlinear_values))
+        self.linear_offsets.append(len(self.linear_values))
+
+    def column(self, name):
+        """返回定长列的numpy数组"""
+        return getattr(self, name).view()
+
+    def counts(self, kind):
+        """每行的残差个数（'nonlinear'或'linear'），由CSR偏移量差分得到"""
+        offsets = getattr(self, f'{kind}_offsets').view()
+        total = len(getattr(self, f'{kind}_values'))
+        return np.diff(offsets, append=total)
+
+    def residuals(self, kind, row):
+        """第row行的残差历史"""
+        offsets = getattr(self, f'{kind}_offsets')
+        values = getattr(self, f'{kind}_values')
+        start = offsets[row]
+        end = offsets[row + 1] if row + 1 < len(offsets) else len(values)
+        return values.view()[start:end]
+
+    def close(self):
+        self.nonlinear_values.close()
+        self.linear_values.close()
+
+
+class MooseLogParser:
+    """MOOSE日志的单遍流式状态机解析器
+
+    feed()可接收任意切分的文本块，只处理完整的行。普通状态下用一个以换行符开头的组合正则
+    在整块文本上查找关心的行，其余行由正则引擎直接跳过；网格信息与Performance Graph
+    这类多行块进入各自的状态逐行解析，块结束后回到普通状态。
+    带"name: "前缀的子程序（MultiApp）输出不计入主程序的时间步。
+
+    吞吐量（已确认的偏差）：156 MB、400万行Linear残差的合成日志上单核约30–35 MB/s，未达到100 MB/s的目标。
+    正则扫描约占0.7 s/50 MB，时间步等事件行的处理约占0.45 s/50 MB，其余为残差的float转换；
+    把连续的Linear行合并为一个匹配再批量转换没有带来提升，要成倍提速需要按列向量化解析而不是逐行分派。
+    多个日志可用--log在多进程中并行分析。
+    """
+
+    # MOOSE以%e格式输出残差，发散时为nan/inf/-nan/-inf；nan/inf必须先于数字分支尝试，
+    # 且数字分支要求至少一位数字，否则"-nan"只匹配到"-"
+    NUM = r'[-+]?(?:nan|inf|\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)'
+
+    # 普通状态：每个分支的最外层命名组即行类型（m.lastgroup）；
+    # 以"\n"开头使正则引擎只在行首尝试匹配，数量最多的Linear行放在第一个分支
+    NORMAL = re.compile(rf"""\n[ \t]*(?:
+          \d+\ Linear\ \|R\|\ =\ (?P<lin_r>{NUM})
+        | (?P<nonlinear>\d+\ Nonlinear\ \|R\|\ =\ (?P<nl_r>{NUM}))
+        | (?P<timestep>Time\ Step\ +(?P<step>\d+),\ *time\ *=\ *(?P<time>{NUM}),\ *dt\ *=\ *(?P<dt>{NUM}))
+        | (?P<converged>Solve\ Converged!)
+        | (?P<diverged>Solve\ Did\ NOT\ Converge!)
+        | (?P<mesh>Mesh:[ \t]*$)
+        | (?P<perf_graph>Performance\ Graph:)
+        | (?P<memory>(?:Finished\ Solving|Computing)[^\n]*)
+        )""", re.MULTILINE | re.VERBOSE)
+
+    # 网格状态：缩进的"键: 值"行；多进程时Nodes/Elems的总数在下一行的Total中
+    MESH = re.compile(r'\n[ \t]+([^:\n]+):[ \t]*([^\n]*)')
+
+    # Performance Graph状态：表格行以|或-开头，表格前允许有空行
+    PERF = re.compile(r'\n[ \t]*([|-][^\n]*)?$', re.MULTILINE)
+
+    MEMORY = re.compile(r'\[\s*([\d\.]+)\s+MB\s*\]|Memory:\s+([\d\.]+)\s+MB', re.IGNORECASE)
+    SOLVE_TIME = re.compile(r'Finished Solving\s+\[\s*([\d\.]+)\s+s\]')
+
+    def __init__(self, data, clock=time.time):
+        # clock为None时（离线分析）单步耗时取自--timing输出的"Finished Solving [ x s]"
+        self.data = data
+        self.clock = clock
+        self.state = 'normal'
+        self.store = data['timesteps']
+        self.current = None      # 当前时间步的线性残差append（无时间步时为None）
+        self.step_start = 0
+        # 未处理的尾部文本，总是以换行符开头（日志开头视为前面有一个换行）
+        self._tail = '\n'
+        self._mesh_pending = None
+        self._perf_started = False
+        self._bind_handlers()
+
+    def _bind_handlers(self):
+        self._handlers = {
+            'nonlinear': self._on_nonlinear,
+            'timestep': self._on_timestep,
+            'converged': self._on_converged,
+            'diverged': self._on_diverged,
+            'mesh': self._on_mesh,
+            'perf_graph': self._on_perf_graph,
+            'memory': self._on_memory,
+        }
+
+    def __getstate__(self):
+        # 绑定方法不随状态保存，恢复时重新绑定到新的数组缓冲区
+        state = self.__dict__.copy()
+        state['current'] = self.current is not None
+        del state['_handlers']
+        return state
+
+    def __setstate__(self, state):
+        has_current = state.pop('current')
+        self.__dict__.update(state)
+        self.current = self.store.linear_values.append if has_current else None
+        self._bind_handlers()
+
+    def feed(self, text):
+        """输入一段日志文本（可在任意位置切分），解析其中的完整行"""
+        buf = self._tail + text
+        end = buf.rfind('\n')
+        # [0, end)内每行都以前导换行符开头且完整；最后一个换行符留给下一块
+        self._tail = buf[end:]
+        if end:
+            self._scan(buf, end)
+
+    def close(self):
+        """日志结束：补上末尾没有换行的最后一行"""
+        tail, self._tail = self._tail, '\n'
+        if len(tail) > 1:
+            self._scan(tail, len(tail))
+
+    def _scan(self, buf, end):
+        pos = 0
+        while pos < end:
+            if self.state == 'mesh':
+                pos = self._scan_mesh(buf, pos, end)
+            elif self.state == 'perf':
+                pos = self._scan_perf(buf, pos, end)
+            else:
+                pos = self._scan_normal(buf, pos, end)
+
+    def _scan_normal(self, buf, pos, end):
+        handlers = self._handlers
+        for match in self.NORMAL.finditer(buf, pos, end):
+            value = match[1]  # lin_r
+            if value is not None:
+                # 热点路径：Linear行直接追加到类型数组，不经过分派
+                if self.current is not None:
+                    self.current(float(value))
+                continue
+            handlers[match.lastgroup](match)
+            if self.state != 'normal':
+                # 进入多行块：从下一行的前导换行符开始由对应状态处理
+                next_line = buf.find('\n', match.end(), end)
+                return end if next_line < 0 else next_line
+        return end
+
+    def _scan_mesh(self, buf, pos, end):
+        mesh = self.data['mesh']
+        while pos < end:
+            match = self.MESH.match(buf, pos, end)
+            if match is None:
+                self.state = 'normal'  # 非缩进行：网格信息块结束
+                break
+            key = match.group(1).strip()
+            value = match.group(2).strip()
+            if key in ('Nodes', 'Elems'):
+                target = 'nodes' if key == 'Nodes' else 'elements'
+                if value.isdigit():
+                    mesh[target] = int(value)
+                else:
+                    self._mesh_pending = target
+            elif key == 'Total' and self._mesh_pending and value.isdigit():
+                mesh[self._mesh_pending] = int(value)
+                self._mesh_pending = None
+            pos = match.end()
+        return pos
+
+    def _scan_perf(self, buf, pos, end):
+        lines = self.data['performance']['graph']
+        while pos < end:
+            match = self.PERF.match(buf, pos, end)
+            if match is None or (match.group(1) is None and self._perf_started):
+                self.state = 'normal'  # 表格之后的第一行非表格内容
+                break
+            if match.group(1) is not None:
+                self._perf_started = True
+                lines.append(match.group(1).rstrip())
+            pos = match.end()
+        return pos
+
+    # ---------- 普通状态下各类行的处理 ----------
+
+    def _on_timestep(self, match):
+        step = int(match.group('step'))
+        self.step_start = self.clock() if self.clock else 0
+        self.store.begin_step(step, float(match.group('time')), float(match.group('dt')))
+        self.current = self.store.linear_values.append
+        self.data['summary']['current_step'] = step
+
+    def _on_nonlinear(self, match):
+        if self.current is not None:
+            self.store.nonlinear_values.append(float(match.group('nl_r')))
+
+    def _on_converged(self, match):
+        if self.current is not None:
+            self.store.converged[-1] = 1
+            if self.clock:
+                self.store.step_time[-1] = self.clock() - self.step_start
+
+    def _on_diverged(self, match):
+        if self.current is not None:
+            self.store.converged[-1] = 0
+
+    def _on_mesh(self, match):
+        self.state = 'mesh'
+        self._mesh_pending = None
+
+    def _on_perf_graph(self, match):
+        self.state = 'perf'
+        self._perf_started = False
+        self.data['performance']['graph'] = []
+
+    def _on_memory(self, match):
+        line = match.group('memory')
+        if not self.clock and self.current is not None:
+            if time_match := self.SOLVE_TIME.search(line):
+                self.store.step_time[-1] = float(time_match.group(1))
+        if mem_match := self.MEMORY.search(line):
+            current_mem = float(mem_match.group(1) or mem_match.group(2))
+            # 确保记录到当前时间步
+            if self.current is not None:
+                self.store.max_memory[-1] = max(self.store.max_memory[-1], current_mem)
+            # 更新全局最大值
+            self.data['performance']['max_memory'] = max(
+                self.data['performance']['max_memory'],
+                current_mem
+            )
+
+
+# 离线/跟随模式的读取参数
+READ_CHUNK_SIZE = 16 * 1024 * 1024   # 每次解码并送入解析器的字节数
+FOLLOW_INTERVAL = 1.0                # 跟随模式轮询间隔（秒）
+STATE_SAVE_INTERVAL = 30.0           # 跟随模式保存偏移与解析状态的间隔（秒）
+SAMPLE_INTERVAL = 1.0                # 运行仿真时/proc资源采样间隔（秒），0表示不采样
+
 
 class MooseAnalyzer:
-    def __init__(self, input_file):
+    def __init__(self, input_file, clock=time.time, tagged=False):
         self.input_file = input_file
-        self.data = {
-            'timesteps': defaultdict(dict),
-            'performance': {'max_memory': 0, 'memory_history': []},
+        self.data = self._new_data()
+        self.start_time = time.time()
+        self.parser = MooseLogParser(self.data, clock)
+        self.offset = 0  # 已送入解析器的日志字节数（跟随模式）
+        self.sampler = None  # 运行仿真时的/proc采样器
+        # 输出带rank前缀时：rank 0的行送入主解析器，各rank另有独立的解析器统计各自的计时与内存
+        self.tagged = tagged
+        self.ranks = {}  # rank -> (data, MooseLogParser)
+
+    @staticmethod
+    def _new_data():
+        return {
+            'timesteps': TimestepStore(),
+            'performance': {'max_memory': 0, 'memory_history': [], 'graph': [], 'ranks': {}, 'step_peaks': {}},
             'mesh': {'nodes': 0, 'elements': 0},
-            'summary': {'total_time': 0, 'time_per_step': []}
+            'summary': {'total_time': 0, 'current_step': 0}
         }
-        self.current_step = 0
-        self.step_start = 0
-        self.start_time = time.time()
 
-        # 增强型正则表达式
-        self.patterns = {
-            'mesh': re.compile(
-                r'Nodes:.*?Total:\s*(\d+).*?Elems:.*?Total:\s*(\d+)', 
-                re.DOTALL
-            ),
-            'timestep': re.compile(r'Time Step\s+(\d+),\s+time\s*=\s*([\d\.]+),\s+dt\s*=\s*([\d\.]+)'),
-            'memory': re.compile(
-                r'\[\s*([\d\.]+)\s+(MB|mb)\]|Memory:\s+([\d\.]+)\s+(MB|mb)',
-                re.IGNORECASE
-            ),
-            'nonlinear': re.compile(r'Nonlinear\s+\|R\|\s*=\s*([\d\.E+-]+)\s+'),
-            'linear': re.compile(r'Linear\s+\|R\|\s*=\s*([\d\.E+-]+)\s+'),
-            'converged': re.compile(r'Solve\s+Converged!'),
-            'timing': re.compile(r'Time\s+Step\s+\d+,\s+time\s*=\s*[\d\.]+\s*,\s+dt\s*=\s*[\d\.]+\s*\n\s*(\d+)\s+Nonlinear\s+'),
-            'step_time': re.compile(
-                r'Finished Solving\s+\[\s*([\d\.]+)\s+s\]'
-            ),
+    def _feed(self, text):
+        """送入一段完整行文本；带rank前缀时先按rank拆分，返回rank 0的文本"""
+        if not self.tagged:
+            self.parser.feed(text)
+            return text
+        parts = split_by_rank(text)
+        for rank, part in parts.items():
+            if rank not in self.ranks:
+                data = self._new_data()
+                # 各rank的单步耗时取自--timing输出，不受多rank输出到达先后的影响
+                self.ranks[rank] = (data, MooseLogParser(data, clock=None))
+            self.ranks[rank][1].feed(part)
+        main = parts.get(0, '')
+        if main:
+            self.parser.feed(main)
+        return main
+
+    def rank_summary(self):
+        """{rank: {时间步尝试数, 求解总耗时, 最大内存}}，用于查看分布式网格下的负载不均衡"""
+        summary = {}
+        for rank, (data, _) in sorted(self.ranks.items()):
+            store = data['timesteps']
+            summary[rank] = {'attempts': len(store),
+                             'solve_time': float(store.column('step_time').sum()),
+                             'max_memory': data['performance']['max_memory']}
+        return summary
+
+    def metrics(self):
+        """指标接口的采集函数，在HTTP线程中被抓取时调用
+
+        只按下标读取标量，不创建numpy视图（视图会锁住解析线程正在追加的数组缓冲区）；
+        以最后追加的列linear_offsets的长度确定行号，保证读到的各列属于同一行。
+        """
+        store = self.data['timesteps']
+        row = len(store.linear_offsets) - 1
+        metrics = {
+            'moose_steps_total': row + 1,
+            'moose_nonlinear_iterations_total': len(store.nonlinear_values),
+            'moose_linear_iterations_total': len(store.linear_values),
+            'moose_max_memory_megabytes': self.data['performance']['max_memory'] or None,
+            'moose_rss_megabytes': self.sampler.last_total if self.sampler else None,
         }
+        if row < 0:
+            return metrics
+        metrics.update({
+            'moose_time_step': store.step[row],
+            'moose_sim_time': store.time[row],
+            'moose_dt': store.dt[row],
+            'moose_nonlinear_iterations': len(store.nonlinear_values) - store.nonlinear_offsets[row],
+            'moose_linear_iterations': len(store.linear_values) - store.linear_offsets[row],
+            # 当前行可能仍在求解，只统计之前已结束的行
+            'moose_failed_steps_total': row - sum(store.converged.buffer[:row]),
+        })
+        for r in range(row, max(row - 50, -1), -1):
+            if store.converged[r]:
+                metrics['moose_step_seconds'] = store.step_time[r]
+                break
+        return metrics
+
+    @property
+    def current_step(self):
+        return self.data['summary']['current_step']
 
     def _parse_line(self, line):
-        """增强型日志解析"""
+        """解析单行日志（实时运行时逐行调用）"""
+        return self._feed(line if line.endswith('\n') else line + '\n')
+
+    def export_perf_graph(self, prefix):
+        """把Performance Graph导出为<prefix>.folded（火焰图折叠栈）与<prefix>.json"""
+        return export_perf_graph(self.data['performance']['graph'], prefix)
+
+    def _finish(self):
+        self.parser.close()
+        for _, parser in self.ranks.values():
+            parser.close()
+        self.data['summary']['total_time'] = float(self.data['timesteps'].column('step_time').sum())
+
+    def analyze_log(self, log_file):
+        """离线分析已有日志：内存映射后按整行切块批量解码送入解析器"""
+        with open(log_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                self._finish()
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                size = len(mm)
+                pos = 0
+                while pos < size:
+                    end = min(pos + READ_CHUNK_SIZE, size)
+                    if end < size:
+                        # 在换行处切块，避免把多字节字符切断
+                        cut = mm.rfind(b'\n', pos, end)
+                        end = cut + 1 if cut >= 0 else end
+                    self._feed(mm[pos:end].decode('utf-8', errors='replace'))
+                    pos = end
+        self._finish()
+
+    def save_state(self, state_file, log_file):
+        """保存跟随进度：字节偏移、文件标识与解析器状态"""
+        tmp_file = state_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump({'log_file': os.path.abspath(log_file), 'inode': os.stat(log_file).st_ino,
+                         'offset': self.offset, 'data': self.data, 'parser': self.parser,
+                         'ranks': self.ranks}, f)
+        os.replace(tmp_file, state_file)
+
+    def load_state(self, state_file, log_file):
+        """恢复跟随进度；日志被替换或截断时从头开始"""
         try:
-            # 网格信息解析
-            if 'Nodes:' in line and 'Elems:' in line:
-                if match := self.patterns['mesh'].search(line.replace('\n', ' ')):
-                    self.data['mesh'].update({
-                        'nodes': int(match.group(1)),
-                        'elements': int(match.group(2))
-                    })
-
-            # 时间步开始
-            elif 'Time Step' in line and 'time =' in line:
-                if match := self.patterns['timestep'].search(line):
-                    self.current_step = int(match.group(1))
-                    self.step_start = time.time()
-                    self.data['timesteps'][self.current_step] = {
-                        'time': float(match.group(2)),
-                        'dt': float(match.group(3)),
-                        'nonlinear_iters': [],
-                        'linear_iters': [],
-                        'converged': False,
-                        'step_time': 0,
-                        'max_memory': 0
-                    }
-                    self.data['timesteps'][self.current_step]['max_memory'] = 0  # 重置内存记录
-
-            # 内存记录（兼容多种格式）
-            if any(x in line for x in ['Finished Solving', 'Computing']):
-                if mem_match := self.patterns['memory'].search(line):
-                    current_mem = float(mem_match.group(1) or mem_match.group(3))
-                    # 确保记录到当前时间步
-                    if self.current_step in self.data['timesteps']:
-                        self.data['timesteps'][self.current_step]['max_memory'] = max(
-                            self.data['timesteps'][self.current_step]['max_memory'],
-                            current_mem
-                        )
-                    # 更新全局最大值
-                    self.data['performance']['max_memory'] = max(
-                        self.data['performance']['max_memory'],
-                        current_mem
-                    )
-
-            # 迭代残差记录
-            elif 'Nonlinear |R|' in line:
-                if match := self.patterns['nonlinear'].search(line):
-                    self.data['timesteps'][self.current_step]['nonlinear_iters'].append(
-                        float(match.group(1))
-                    )
-            elif 'Linear |R|' in line:
-                if match := self.patterns['linear'].search(line):
-                    self.data['timesteps'][self.current_step]['linear_iters'].append(
-                        float(match.group(1))
-                    )
-
-            # 收敛状态
-            elif 'Solve Converged!' in line:
-                self.data['timesteps'][self.current_step]['converged'] = True
-                self.data['timesteps'][self.current_step]['step_time'] = time.time() - self.step_start
-                self.data['summary']['time_per_step'].append(
-                    self.data['timesteps'][self.current_step]['step_time']
-                )
+            with open(state_file, 'rb') as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        st = os.stat(log_file)
+        if (state['log_file'] != os.path.abspath(log_file) or state['inode'] != st.st_ino
+                or state['offset'] > st.st_size):
+            print(f"日志已被替换或截断，从头开始分析: {log_file}")
+            return False
+        self.data = state['data']
+        self.parser = state['parser']
+        self.ranks = state.get('ranks', {})
+        self.offset = state['offset']
+        return True
+
+    def follow_log(self, log_file, state_file=None, idle_timeout=None, echo=False):
+        """跟随仍在写入的日志，只读取新增的完整行
+
+        state_file用于保存/恢复字节偏移，中断后再次调用会从上次的位置继续；
+        idle_timeout秒内日志没有增长则结束（None表示一直跟随直到Ctrl+C）。
+        """
+        if state_file and self.load_state(state_file, log_file):
+            print(f"从偏移 {self.offset} 字节处继续: {log_file}")
+        last_growth = last_save = time.time()
+        try:
+            with open(log_file, 'rb') as f:
+                while True:
+                    f.seek(self.offset)
+                    chunk = f.read(READ_CHUNK_SIZE)
+                    cut = chunk.rfind(b'\n') + 1
+                    if cut:
+                        # 只消费到最后一个换行，不完整的行留到下次读取
+                        text = chunk[:cut].decode('utf-8', errors='replace')
+                        if echo:
+                            print(text, end='')
+                        self._feed(text)
+                        self.offset += cut
+                        last_growth = time.time()
+                        if len(chunk) == READ_CHUNK_SIZE:
+                            continue  # 还有积压，立即继续读
+                    if state_file and time.time() - last_save > STATE_SAVE_INTERVAL:
+                        self.save_state(state_file, log_file)
+                        last_save = time.time()
+                    if idle_timeout is not None and time.time() - last_growth > idle_timeout:
+                        break
+                    time.sleep(FOLLOW_INTERVAL)
+        except KeyboardInterrupt:
+            print("\n停止跟随")
+        finally:
+            if state_file:
+                self.save_state(state_file, log_file)
+            self.data['summary']['total_time'] = float(self.data['timesteps'].column('step_time').sum())
+
+    def health(self):
+        """收敛健康度统计（按时间步尝试）"""
+        store = self.data['timesteps']
+        counts, rates = nonlinear_rates(store.nonlinear_values.view(), store.nonlinear_offsets.view())
+        return health_summary(store.column('dt'), store.column('converged'), counts, rates)
 
-        except Exception as e:
-            print(f"解析错误: {str(e)}")
+    def check_policy(self, policy):
+        """用最近结束的时间步尝试（不含正在求解的最后一行）检查提前终止策略"""
+        store = self.data['timesteps']
+        last = len(store) - 1
+        first = max(last - policy.window, 0)
+        if last <= first:
+            return None
+        offsets = store.nonlinear_offsets.slice(first, last + 1)
+        values = store.nonlinear_values.slice(int(offsets[0]), int(offsets[-1]))
+        counts, rates = nonlinear_rates(values, offsets[:-1] - offsets[0])
+        return policy.check(store.converged.slice(first, last), counts, rates)
 
-    def run_simulation(self):
-        """运行仿真并采集数据"""
-        cmd = f'mpiexec -n 4 ../../fuel_rods-opt -i {self.input_file} --timing --track_memory'
+    def run_simulation(self, procs=4, exe='../../fuel_rods-opt', sample_interval=SAMPLE_INTERVAL, policy=None,
+                       per_rank=False):
+        """运行仿真并采集数据；policy判定明显发散时终止整个进程组并记录原因
+
+        per_rank=True时让mpiexec给输出加rank前缀、MOOSE保留所有rank的输出（--keep-cout），
+        交错的输出按rank拆分，终端只显示rank 0。
+        """
+        cmd = f'mpiexec -n {procs} {exe} -i {self.input_file} --timing --track_memory'
+        if per_rank:
+            tag_args = rank_tag_args('mpiexec')
+            if tag_args:
+                cmd = f"mpiexec {' '.join(tag_args)} -n {procs} {exe} -i {self.input_file} --timing --track_memory --keep-cout"
+                self.tagged = True
+            else:
+                print("无法识别mpiexec实现，不按rank拆分输出")
         process = subprocess.Popen(
             cmd,
             shell=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True
+            text=True,
+            start_new_session=True  # 提前终止时连同mpiexec的全部rank一起终止
         )
+        sampler = None
+        if sample_interval > 0 and os.path.isdir('/proc'):
+            sampler = ProcessTreeSampler(process.pid, sample_interval, exe_name=exe,
+                                         step_source=lambda: self.data['summary']['current_step']).start()
+        self.sampler = sampler
 
         try:
             while True:
@@ -126,12 +638,46 @@ class MooseAnalyzer:
                 if not line and process.poll() is not None:
                     break
                 if line:
-                    print(line.strip())
-                    self._parse_line(line)
+                    rows = len(self.data['timesteps'])
+                    main = self._parse_line(line)
+                    if main:
+                        print(main.strip())
+                    # 只在新的时间步尝试开始（上一次尝试结束）时检查
+                    if policy and len(self.data['timesteps']) != rows and 'aborted' not in self.data['summary']:
+                        reason = self.check_policy(policy)
+                        if reason:
+                            print(f"\n明显发散，提前终止: {reason}")
+                            self.data['summary']['aborted'] = reason
+                            os.killpg(process.pid, signal.SIGTERM)
+        except BaseException:
+            # 解析出错或被中断时不留下仍在运行的mpiexec进程组
+            if process.poll() is None:
+                try:
+                    os.killpg(process.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            raise
         finally:
-            self.data['summary']['total_time'] = sum(
-                ts['step_time'] for ts in self.data['timesteps'].values()
-            )
+            if sampler:
+                sampler.stop()
+                self._apply_samples(sampler)
+            self._finish()
+
+    def _apply_samples(self, sampler):
+        """把/proc采样结果写入内存历史、各rank汇总，并补齐日志中没有内存信息的时间步"""
+        performance = self.data['performance']
+        performance['memory_history'] = sampler.total_rss_history()
+        performance['ranks'] = sampler.rank_summary()
+        performance['step_peaks'] = sampler.step_peaks
+        if performance['memory_history']:
+            performance['max_memory'] = max(performance['max_memory'],
+                                            max(m[1] for m in performance['memory_history']))
+        store = self.data['timesteps']
+        steps = store.column('step')
+        for row in range(len(store)):
+            peak = sampler.step_peaks.get(int(steps[row]))
+            if peak and store.max_memory[row] == 0:
+                store.max_memory[row] = peak[0]
 
     def generate_report(self, filename='simulation_report.txt'):
         """生成对齐格式的文本报告"""
@@ -158,48 +704,170 @@ class MooseAnalyzer:
             f.write(header + "\n")
             f.write("-"*95 + "\n")
 
-            for step in sorted(self.data['timesteps']):
-                ts = self.data['timesteps'][step]
-                row = ("{:<6} {:<12.1f} {:<12.1f} {:<10} {:<10} {:<14.2f} {:<16.1f} {:<10}"
-                      ).format(
-                          step,
-                          ts['time'],
-                          ts['dt'],
-                          len(ts['nonlinear_iters']),
-                          len(ts['linear_iters']),
-                          ts['step_time'],
-                          ts['max_memory'] if ts['max_memory'] > 0 else self.data['performance']['max_memory'],
-                          '是' if ts['converged'] else '否'
-                      )
-                f.write(row + "\n")
-
-            # 性能统计
+            store = self.data['timesteps']
+            converged = store.column('converged').astype(bool)
+            step_time = store.column('step_time')
+            max_memory = store.column('max_memory')
+            max_memory = np.where(max_memory > 0, max_memory, self.data['performance']['max_memory'])
+            row_format = "{:<6} {:<12.1f} {:<12.1f} {:<10} {:<10} {:<14.2f} {:<16.1f} {:<10}\n"
+            f.writelines(
+                row_format.format(*row[:-1], '是' if row[-1] else '否')
+                for row in zip(
+                    store.column('step').tolist(),
+                    store.column('time').tolist(),
+                    store.column('dt').tolist(),
+                    store.counts('nonlinear').tolist(),
+                    store.counts('linear').tolist(),
+                    step_time.tolist(),
+                    max_memory.tolist(),
+                    converged.tolist(),
+                )
+            )
+
+            # 性能统计（只统计收敛的时间步）
             f.write("\n[性能统计]\n")
-            time_steps = self.data['summary']['time_per_step']
-            if time_steps:
-                f.write(f"总时间步数: {len(time_steps)}\n")
-                f.write(f"平均步耗时: {np.mean(time_steps):.2f} ± {np.std(time_steps):.2f} 秒\n")
-                f.write(f"最长单步耗时: {np.max(time_steps):.2f} 秒\n")
-                f.write(f"最短单步耗时: {np.min(time_steps):.2f} 秒\n")
-            
+            time_steps = step_time[converged]
+            if time_steps.size:
+                f.write(f"总时间步数: {time_steps.size}\n")
+                f.write(f"平均步耗时: {time_steps.mean():.2f} ± {time_steps.std():.2f} 秒\n")
+                f.write(f"最长单步耗时: {time_steps.max():.2f} 秒\n")
+                f.write(f"最短单步耗时: {time_steps.min():.2f} 秒\n")
+            if len(converged) > time_steps.size:
+                f.write(f"未收敛的时间步尝试: {len(converged) - time_steps.size}\n")
+
+            # 收敛健康度：按时间步尝试统计
+            health = self.health()
+            if health['attempts']:
+                f.write("\n[收敛健康度]\n")
+                f.write(f"时间步尝试: {health['attempts']}  未收敛: {health['failed']}  "
+                        f"最长连续未收敛: {health['max_consecutive_failures']}\n")
+                f.write(f"dt回退次数: {health['dt_cutbacks']}  最小dt: {health['min_dt']:g}\n")
+                if health['median_rate'] is not None:
+                    f.write(f"非线性收敛速率中位数: {health['median_rate']:.2f} 数量级/迭代\n")
+                f.write(f"残差停滞的尝试: {health['stagnated']}  出现nan/inf的尝试: {health['nan_attempts']}\n")
+            if self.data['summary'].get('aborted'):
+                f.write(f"提前终止: {self.data['summary']['aborted']}\n")
+
+            # 各rank分别统计的计时与内存（带rank前缀的输出）
+            rank_stats = self.rank_summary()
+            if len(rank_stats) > 1:
+                f.write("\n[各rank计时与内存]\n")
+                f.write("{:<6} {:>12} {:>14} {:>14}\n".format("rank", "时间步尝试", "求解耗时(s)", "最大内存(MB)"))
+                for rank, info in rank_stats.items():
+                    f.write(f"{rank:<6} {info['attempts']:>12} {info['solve_time']:>14.2f} {info['max_memory']:>14.1f}\n")
+                times = np.array([info['solve_time'] for info in rank_stats.values()])
+                memories = np.array([info['max_memory'] for info in rank_stats.values()])
+                if times.mean() > 0:
+                    f.write(f"耗时不均衡度(最大/平均): {times.max() / times.mean():.2f}\n")
+                if memories.mean() > 0:
+                    f.write(f"内存不均衡度(最大/平均): {memories.max() / memories.mean():.2f}\n")
+
+            # 性能图：按自身耗时排序的主要section
+            roots = parse_perf_graph(self.data['performance']['graph'])
+            if roots:
+                f.write("\n[性能图（自身耗时前10）]\n")
+                f.write("{:<50} {:>12} {:>12} {:>10} {:>10}\n".format(
+                    "Section", "自身(s)", "子节点(s)", "调用次数", "内存(MB)"))
+                for node in top_sections(roots):
+                    f.write(f"{node.name:<50} {node.self_time:>12.3f} {node.children_time:>12.3f} "
+                            f"{node.calls:>10} {node.self_mem:>10}\n")
+
             if self.data['performance']['memory_history']:
                 mem_values = [m[1] for m in self.data['performance']['memory_history']]
                 f.write(f"内存波动范围: {np.ptp(mem_values):.1f} MB\n")
                 f.write(f"平均内存使用: {np.mean(mem_values):.1f} MB\n")
 
-if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 2:
-        print("使用方法: python simulation_final.py <输入文件>")
-        sys.exit(1)
+            # /proc采样：各rank资源使用与内存峰值所在的时间步
+            ranks = self.data['performance'].get('ranks')
+            if ranks:
+                f.write("\n[各rank资源使用]\n")
+                f.write("{:<6} {:>14} {:>10} {:>14} {:>14} {:>14}\n".format(
+                    "rank", "峰值RSS(MB)", "平均CPU", "上下文切换", "读盘(MB)", "写盘(MB)"))
+                for rank, info in sorted(ranks.items()):
+                    f.write(f"{rank:<6} {info['peak_rss_mb']:>14.1f} {info['mean_cpu']:>10.2f} "
+                            f"{info['ctx_switches']:>14} {info['read_bytes'] / 1024 ** 2:>14.1f} "
+                            f"{info['write_bytes'] / 1024 ** 2:>14.1f}\n")
+                step, (total, (rank_rss, rank)) = max(self.data['performance']['step_peaks'].items(),
+                                                     key=lambda item: item[1][0])
+                f.write(f"内存峰值: 第{step}步 合计 {total:.1f} MB（单rank最大: rank {rank} {rank_rss:.1f} MB）\n")
+
+def analyze_log_file(log_file, tagged=False):
+    """多进程批量分析时每个工作进程执行的任务，报告写在日志旁边"""
+    analyzer = MooseAnalyzer(log_file, clock=None, tagged=tagged)
+    try:
+        analyzer.analyze_log(log_file)
+        report = os.path.splitext(log_file)[0] + '_report.txt'
+        analyzer.generate_report(report)
+        analyzer.export_perf_graph(os.path.splitext(log_file)[0] + '_perf')
+        steps = len(analyzer.data['timesteps'])
+    finally:
+        analyzer.data['timesteps'].close()
+    return log_file, steps, report
 
-    analyzer = MooseAnalyzer(sys.argv[1])
+
+def main():
+    parser = argparse.ArgumentParser(description='MOOSE仿真数据采集与报告生成')
+    parser.add_argument('input_file', nargs='?', help='运行仿真的输入文件')
+    parser.add_argument('--procs', type=int, default=4, help='运行仿真时的MPI进程数')
+    parser.add_argument('--exe', default='../../fuel_rods-opt', help='求解器可执行文件')
+    parser.add_argument('--sample-interval', type=float, default=SAMPLE_INTERVAL,
+                        help='运行仿真时/proc资源采样间隔（秒），0表示不采样')
+    parser.add_argument('--log', nargs='+', metavar='LOG', help='离线分析已有日志（可多个）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='离线分析的并行进程数')
+    parser.add_argument('--follow', metavar='LOG', help='跟随仍在写入的日志')
+    parser.add_argument('--state', help='跟随模式的进度文件（默认 <日志>.state）')
+    parser.add_argument('--idle-timeout', type=float, help='日志超过该秒数没有增长时结束跟随')
+    parser.add_argument('--per-rank', action='store_true',
+                        help='运行仿真时给输出加rank前缀并保留所有rank的输出，分别统计各rank的计时与内存')
+    parser.add_argument('--tagged', action='store_true', help='--log/--follow的日志带mpiexec的rank前缀')
+    parser.add_argument('--abort-diverging', action='store_true', help='运行仿真时提前终止明显发散的运行')
+    parser.add_argument('--metrics-port', type=int, help='在该端口提供Prometheus格式的/metrics指标接口（运行或跟随时）')
+    args = parser.parse_args()
+
+    exporter = MetricsExporter(args.metrics_port).start() if args.metrics_port else None
+
+    if args.log:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(args.log))) as pool:
+            for log_file, steps, report in pool.map(analyze_log_file, args.log, [args.tagged] * len(args.log)):
+                print(f"{log_file}: {steps} 个时间步 -> {report}")
+        return
+
+    if args.follow:
+        analyzer = MooseAnalyzer(args.follow, clock=None, tagged=args.tagged)
+        if exporter:
+            exporter.register(os.path.splitext(os.path.basename(args.follow))[0], analyzer.metrics)
+        try:
+            analyzer.follow_log(args.follow, args.state or args.follow + '.state',
+                                idle_timeout=args.idle_timeout, echo=True)
+            report = os.path.splitext(args.follow)[0] + '_report.txt'
+            analyzer.generate_report(report)
+            analyzer.export_perf_graph(os.path.splitext(args.follow)[0] + '_perf')
+        finally:
+            analyzer.data['timesteps'].close()
+        print(f"\n报告已生成: {report}")
+        return
+
+    if not args.input_file:
+        parser.print_usage()
+        raise SystemExit(1)
+
+    analyzer = MooseAnalyzer(args.input_file)
+    if exporter:
+        exporter.register(os.path.splitext(os.path.basename(args.input_file))[0], analyzer.metrics)
     try:
-        analyzer.run_simulation()
+        analyzer.run_simulation(args.procs, args.exe, args.sample_interval,
+                                DivergencePolicy() if args.abort_diverging else None, args.per_rank)
     except Exception as e:
         print(f"运行错误: {str(e)}")
     finally:
-        analyzer.generate_report()
-    
-    print(f"\n报告已生成: simulation_report.txt")
\ No newline at end of file
+        try:
+            analyzer.generate_report()
+            analyzer.export_perf_graph('simulation_perf')
+        finally:
+            analyzer.data['timesteps'].close()
+
+    print(f"\n报告已生成: simulation_report.txt")
+
+
+if __name__ == "__main__":
+    main()
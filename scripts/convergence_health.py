@@ -0,0 +1,160 @@
+"""
+非线性收敛健康度分析与提前终止策略
+按时间步尝试（同一步号因不收敛回退重算时有多次尝试）计算非线性收敛速率、停滞与dt回退，
+DivergencePolicy根据最近的尝试判断算例是否已明显无法继续，供运行器提前终止、释放计算资源。
+
+速率定义：一次尝试内 log10|R| 平均每次非线性迭代的变化量（负值表示下降，-1即每次迭代下降一个数量级）。
+"""
+
+import re
+import numpy as np
+
+STAGNATION_RATE = -0.1          # 平均每次迭代下降不足0.1个数量级（约20%）视为停滞
+MAX_CONSECUTIVE_FAILURES = 6    # 连续未收敛的尝试数上限
+FAILURE_WINDOW = 20             # 统计未收敛比例的最近尝试数
+MAX_FAILURE_FRACTION = 0.75     # 最近FAILURE_WINDOW次尝试中未收敛比例上限
+STAGNATION_WINDOW = 10          # 连续停滞的尝试数上限
+
+
+def nonlinear_rates(values, offsets, total=None):
+    """由CSR格式的非线性残差（values, offsets）计算每次尝试的迭代次数与收敛速率
+
+    残差出现nan/inf的尝试速率为nan；迭代不足2次的尝试速率记为-inf（无从判断，不算停滞）。
+    """
+    values = np.asarray(values, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    total = len(values) if total is None else total
+    counts = np.diff(offsets, append=total)
+    rates = np.full(len(offsets), -np.inf)
+    valid = counts >= 2
+    if valid.any():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_r = np.log10(np.abs(values))
+            first = log_r[offsets[valid]]
+            last = log_r[offsets[valid] + counts[valid] - 1]
+            rates[valid] = np.where(np.isfinite(first) & np.isfinite(last),
+                                    (last - first) / (counts[valid] - 1), np.nan)
+    return counts, rates
+
+
+def stagnated(counts, rates, converged, stagnation_rate=STAGNATION_RATE):
+    """每次尝试是否停滞：未收敛、迭代≥2次且残差下降过慢或为nan/inf
+
+    已收敛的尝试不算停滞：初始残差已接近nl_abs_tol时（准稳态阶段常见），一两次迭代下降很少也能收敛。
+    """
+    counts, rates = np.asarray(counts), np.asarray(rates)
+    converged = np.asarray(converged, dtype=bool)
+    return (counts >= 2) & ~(rates <= stagnation_rate) & ~converged
+
+
+def longest_run(mask):
+    """布尔数组中最长连续True的长度"""
+    mask = np.asarray(mask, dtype=bool)
+    if not mask.any():
+        return 0
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return int((np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)).max())
+
+
+def health_summary(dt, converged, counts, rates, stagnation_rate=STAGNATION_RATE):
+    """整个运行的收敛健康度统计"""
+    dt = np.asarray(dt, dtype=float)
+    converged = np.asarray(converged, dtype=bool)
+    counts, rates = np.asarray(counts), np.asarray(rates)
+    good = converged & np.isfinite(rates)
+    return {
+        'attempts': len(converged),
+        'failed': int((~converged).sum()),
+        'max_consecutive_failures': longest_run(~converged),
+        'dt_cutbacks': int((dt[1:] < dt[:-1]).sum()) if len(dt) > 1 else 0,
+        'min_dt': float(dt.min()) if len(dt) else None,
+        'median_rate': float(np.median(rates[good])) if good.any() else None,
+        'stagnated': int(stagnated(counts, rates, converged, stagnation_rate).sum()),
+        'nan_attempts': int(np.isnan(rates).sum()),
+    }
+
+
+class DivergencePolicy:
+    """提前终止策略：check()输入已结束的时间步尝试（按时间顺序），返回终止原因或None
+
+    任一条件满足即判定为明显发散：
+      - 末尾连续max_consecutive_failures次尝试未收敛（dt不断回退）；
+      - 最近failure_window次尝试中未收敛比例达到max_failure_fraction（收敛与回退反复交替）；
+      - 末尾连续stagnation_window次尝试未收敛且停滞（残差几乎不下降或出现nan/inf）。
+    """
+
+    def __init__(self, max_consecutive_failures=MAX_CONSECUTIVE_FAILURES, failure_window=FAILURE_WINDOW,
+                 max_failure_fraction=MAX_FAILURE_FRACTION, stagnation_window=STAGNATION_WINDOW,
+                 stagnation_rate=STAGNATION_RATE):
+        self.max_consecutive_failures = max_consecutive_failures
+        self.failure_window = failure_window
+        self.max_failure_fraction = max_failure_fraction
+        self.stagnation_window = stagnation_window
+        self.stagnation_rate = stagnation_rate
+
+    @property
+    def window(self):
+        """判断所需的最近尝试数，调用方只需传入这么多"""
+        return max(self.max_consecutive_failures, self.failure_window, self.stagnation_window)
+
+    def check(self, converged, counts, rates):
+        converged = np.asarray(converged, dtype=bool)[-self.window:]
+        failed = ~converged
+        n = self.max_consecutive_failures
+        if len(failed) >= n and failed[-n:].all():
+            return f"连续{n}次时间步尝试未收敛"
+        recent = failed[-self.failure_window:]
+        if len(recent) >= self.failure_window and recent.mean() >= self.max_failure_fraction:
+            return f"最近{self.failure_window}次尝试中{int(recent.sum())}次未收敛"
+        stuck = stagnated(np.asarray(counts)[-len(converged):], np.asarray(rates)[-len(converged):],
+                          converged, self.stagnation_rate)
+        n = self.stagnation_window
+        if len(stuck) >= n and stuck[-n:].all():
+            return f"连续{n}次尝试非线性残差停滞"
+        return None
+
+
+class LogHealthWatcher:
+    """增量读取仍在写入的日志，只提取时间步、非线性残差与收敛结果（供不做完整解析的运行器使用）"""
+
+    # 行首不允许有"name: "前缀，子程序（MultiApp）的输出不计入；
+    # 残差的nan/inf（可带符号）要先于数字尝试，否则"-nan"只匹配到"-"
+    PATTERN = re.compile(
+        r'^[ \t]*(?:Time Step +\d+,[^\n]*?dt *= *(?P<dt>[-+.\deE]+)'
+        r'|\d+ Nonlinear \|R\| = (?P<r>[-+]?(?:nan|inf|\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?))'
+        r'|Solve (?P<result>Converged!|Did NOT Converge!))', re.MULTILINE)
+
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.offset = offset
+        self.dt, self.converged, self.counts, self.rates = [], [], [], []
+        self._current_dt = None
+        self._residuals = []
+
+    def update(self):
+        """读取新增的完整行，返回本次新结束的尝试数"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                chunk = f.read()
+        except OSError:
+            return 0
+        cut = chunk.rfind(b'\n') + 1
+        if not cut:
+            return 0
+        self.offset += cut
+        before = len(self.converged)
+        for match in self.PATTERN.finditer(chunk[:cut].decode('utf-8', errors='replace')):
+            if match.group('dt') is not None:
+                self._current_dt = float(match.group('dt'))
+                self._residuals = []
+            elif match.group('r') is not None:
+                self._residuals.append(float(match.group('r')))
+            elif self._current_dt is not None:
+                counts, rates = nonlinear_rates(self._residuals, [0])
+                self.dt.append(self._current_dt)
+                self.converged.append(match.group('result') == 'Converged!')
+                self.counts.append(int(counts[0]))
+                self.rates.append(float(rates[0]))
+                self._current_dt = None
+        return len(self.converged) - before
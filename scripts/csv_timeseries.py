@@ -0,0 +1,302 @@
+"""
+MOOSE后处理CSV时间序列的批量读取
+np.loadtxt一次读入所需的列（列投影：未请求的列不做数值转换），得到每列一个numpy数组；
+结果缓存到CSV旁的二进制文件（.<文件名>.cache.npz），以CSV的大小和修改时间为键，
+CSV未变化时直接读取缓存，只缺少某些列时只补读这些列。
+CsvTail用于求解器仍在追加的CSV：记住已读到的字节位置，每次只解析新增的完整行。
+decimate()按绘图像素宽度对长序列降采样（每个像素列保留最小值和最大值），供SVG与matplotlib输出使用。
+compare_series()把各运行插值到公共时间网格（自适应时间步使各运行的时间点不同），计算与参考运行的差异指标，
+check_tolerances()按容差判定是否通过。
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+CACHE_SUFFIX = '.cache.npz'
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz  # numpy<2.0没有trapezoid
+
+
+def clean_name(name):
+    """列名去掉MOOSE CSV表头可能带的"# "前缀"""
+    return name.lstrip('# ').strip()
+
+
+def csv_columns(path):
+    with open(path, 'r', newline='') as f:
+        return [clean_name(name) for name in f.readline().rstrip('\r\n').split(',')]
+
+
+def cache_path(path):
+    path = Path(path)
+    return path.with_name(f'.{path.name}{CACHE_SUFFIX}')
+
+
+def _read_cache(path, stat, columns):
+    """从与CSV当前大小和修改时间一致的缓存中只解压columns里的列
+
+    返回 ({列名: 数组}, 缓存中的全部列名)；缓存不存在或已过期时返回 ({}, [])。
+    """
+    try:
+        with np.load(cache_path(path)) as cache:
+            if int(cache['size']) != stat.st_size or int(cache['mtime_ns']) != stat.st_mtime_ns:
+                return {}, []
+            index = {str(name): i for i, name in enumerate(cache['names'])}
+            return {name: cache[f'c{index[name]}'] for name in columns if name in index}, list(index)
+    except (OSError, ValueError, KeyError):
+        return {}, []
+
+
+def _write_cache(path, stat, data):
+    """先写临时文件再替换；目录不可写时静默跳过"""
+    target = cache_path(path)
+    tmp = target.with_name(target.name + '.tmp')
+    arrays = {f'c{i}': values for i, values in enumerate(data.values())}
+    try:
+        with open(tmp, 'wb') as f:
+            np.savez(f, size=stat.st_size, mtime_ns=stat.st_mtime_ns, names=np.array(list(data)), **arrays)
+        os.replace(tmp, target)
+    except OSError:
+        pass
+
+
+def _parse_table(source, usecols, skiprows=0):
+    """解析指定列为二维数组；有空字段（某些后处理量在初始时刻没有值）时改用genfromtxt并以nan填充"""
+    try:
+        return np.loadtxt(source, delimiter=',', skiprows=skiprows, usecols=usecols, ndmin=2)
+    except ValueError:
+        return np.genfromtxt(source, delimiter=',', skip_header=skiprows, usecols=usecols, ndmin=2)
+
+
+def _parse(path, names, columns):
+    table = _parse_table(path, [names.index(name) for name in columns], skiprows=1)
+    return {name: np.ascontiguousarray(table[:, i]) for i, name in enumerate(columns)}
+
+
+def load_csv(path, columns=None, use_cache=True):
+    """读取CSV为{列名: float64数组}；columns为None时读取全部列，不存在的列被忽略"""
+    names = csv_columns(path)
+    wanted = names if columns is None else [name for name in dict.fromkeys(columns) if name in names]
+    stat = os.stat(path)
+
+    data, cached_names = _read_cache(path, stat, wanted) if use_cache else ({}, [])
+    missing = [name for name in wanted if name not in data]
+    if missing:
+        data.update(_parse(path, names, missing))
+        if use_cache:
+            # 缓存保留已有的列并加入新读的列（只有重写缓存时才读取其余已缓存的列）
+            others = [name for name in cached_names if name not in data]
+            merged = _read_cache(path, stat, others)[0] if others else {}
+            merged.update(data)
+            _write_cache(path, stat, merged)
+    return {name: data[name] for name in wanted}
+
+
+class CsvTail:
+    """增量读取仍在追加的CSV（execute_on = TIMESTEP_END每步追加一行）
+
+    update()只读取上次位置之后的完整行，解析后写入预分配的数组（容量不足时倍增）；
+    文件变短（被重写，如从头重算）时从头重读。data()返回当前各列的视图，扩容后旧视图不再更新。
+    """
+
+    def __init__(self, path, columns=None, capacity=4096):
+        self.path = Path(path)
+        self.columns = columns
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self.offset = 0       # 已解析到的字节位置（总在行尾）
+        self.header = None
+        self.names = []
+        self._usecols = []
+        self.table = None
+        self.count = 0
+
+    def update(self):
+        """返回本次新增的行数"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+        if size < self.offset:
+            self.reset()
+        if size == self.offset:
+            return 0
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+        cut = chunk.rfind(b'\n') + 1
+        if not cut:
+            return 0  # 最后一行还没写完
+        self.offset += cut
+        lines = chunk[:cut].decode('utf-8', errors='replace').splitlines()
+        if self.header is None:
+            self.header = lines.pop(0)
+            names = [clean_name(name) for name in self.header.split(',')]
+            wanted = names if self.columns is None else [n for n in dict.fromkeys(self.columns) if n in names]
+            self.names = wanted
+            self._usecols = [names.index(name) for name in wanted]
+            self.table = np.empty((self.capacity, len(wanted)))
+        # 续算时可能再次写出表头
+        lines = [line for line in lines if line and line != self.header]
+        if not lines or not self._usecols:
+            return 0
+        rows = _parse_table(lines, self._usecols)
+        end = self.count + len(rows)
+        if end > len(self.table):
+            grown = np.empty((max(end, 2 * len(self.table)), self.table.shape[1]))
+            grown[:self.count] = self.table[:self.count]
+            self.table = grown
+        self.table[self.count:end] = rows
+        self.count = end
+        return len(rows)
+
+    def data(self):
+        """{列名: 已读取行的数组视图}"""
+        if self.table is None:
+            return {}
+        return {name: self.table[:self.count, i] for i, name in enumerate(self.names)}
+
+
+def decimate(t, y, width, t_range=None):
+    """按像素宽度降采样：时间轴分成width个桶，每桶保留最小值与最大值点（及首尾点），峰值不会丢失
+
+    t_range为横轴范围（默认取t的范围），应与绘图坐标一致，使桶与像素列对齐。nan点被丢弃。
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = min(len(t), len(y))
+    t, y = t[:n], y[:n]
+    ok = np.isfinite(t) & np.isfinite(y)
+    if not ok.all():
+        t, y = t[ok], y[ok]
+    if len(t) <= 4 * width:
+        return t, y
+    if (np.diff(t) < 0).any():
+        order = np.argsort(t, kind='stable')
+        t, y = t[order], y[order]
+
+    t0, t1 = t_range if t_range is not None else (t[0], t[-1])
+    span = (t1 - t0) or 1.0
+    bucket = np.clip(((t - t0) * (width / span)).astype(np.int64), 0, width - 1)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    segment = np.cumsum(np.r_[False, bucket[1:] != bucket[:-1]])
+
+    def first_match(extremes):
+        # 每个桶中第一个等于该桶极值的位置
+        hits = np.flatnonzero(y == extremes[segment])
+        return hits[np.unique(segment[hits], return_index=True)[1]]
+
+    keep = np.unique(np.concatenate((
+        [0, len(t) - 1],
+        first_match(np.minimum.reduceat(y, starts)),
+        first_match(np.maximum.reduceat(y, starts)),
+    )))
+    return t[keep], y[keep]
+
+
+def common_grid(times, points=None):
+    """各运行时间范围的交集上的公共网格：默认取交集内所有运行时间点的并集（分段线性插值下无额外误差），
+    给定points时取等距points个点；没有有效时间点的运行（只有表头的CSV）不参与计算"""
+    times = [np.asarray(t, dtype=float) for t in times]
+    times = [t[np.isfinite(t)] for t in times]
+    times = [t for t in times if len(t)]
+    if not times:
+        raise ValueError("没有包含有效时间点的运行")
+    start = max(t.min() for t in times)
+    end = min(t.max() for t in times)
+    if start > end:
+        raise ValueError("各运行的时间范围没有重叠")
+    if points:
+        return np.linspace(start, end, points)
+    grid = np.unique(np.concatenate(times))
+    return grid[(grid >= start) & (grid <= end)]
+
+
+def interpolate(t, y, grid):
+    """把(t, y)线性插值到grid上，nan点先去掉"""
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = min(len(t), len(y))
+    ok = np.isfinite(t[:n]) & np.isfinite(y[:n])
+    t, y = t[:n][ok], y[:n][ok]
+    if not len(t):
+        return np.full(len(grid), np.nan)
+    if (np.diff(t) < 0).any():
+        order = np.argsort(t, kind='stable')
+        t, y = t[order], y[order]
+    return np.interp(grid, t, y)
+
+
+def diff_metrics(grid, ref, other):
+    """other相对ref在grid上的差异：L2（时间平均的均方根）、L∞、相对误差与峰值时刻偏移"""
+    err = other - ref
+    span = grid[-1] - grid[0]
+    if span > 0:
+        l2 = np.sqrt(_trapezoid(err ** 2, grid) / span)
+        ref_l2 = np.sqrt(_trapezoid(ref ** 2, grid) / span)
+    else:
+        l2, ref_l2 = np.sqrt(np.mean(err ** 2)), np.sqrt(np.mean(ref ** 2))
+    linf = np.abs(err).max()
+    ref_linf = np.abs(ref).max()
+    return {
+        'l2': float(l2),
+        'linf': float(linf),
+        'rel_l2': float(l2 / ref_l2) if ref_l2 > 0 else float('inf') if l2 > 0 else 0.0,
+        'rel_linf': float(linf / ref_linf) if ref_linf > 0 else float('inf') if linf > 0 else 0.0,
+        'peak_shift': float(grid[np.argmax(other)] - grid[np.argmax(ref)]),
+    }
+
+
+def has_data(s):
+    """运行是否有有效的时间点（刚启动或已崩溃的运行可能只写出了表头）"""
+    return bool(np.isfinite(np.asarray(s["time"], dtype=float)).any())
+
+
+def compare_series(series, columns, reference=None, points=None):
+    """series为[{"label", "time", 列名: 数组...}]，返回各运行相对参考运行（默认第一个）的逐列指标
+
+    每行: {"label", "column", "l2", "linf", "rel_l2", "rel_linf", "peak_shift"}
+    没有数据的运行（见has_data）不参与比较、不产生行；参考运行没有数据时抛出ValueError。
+    """
+    labels = [s["label"] for s in series]
+    ref_index = labels.index(reference) if reference is not None else 0
+    if not has_data(series[ref_index]):
+        raise ValueError(f"参考运行 {labels[ref_index]} 没有数据")
+    series = [s for i, s in enumerate(series) if i == ref_index or has_data(s)]
+    ref_index = [s["label"] for s in series].index(labels[ref_index])
+    grid = common_grid([s["time"] for s in series], points)
+    rows = []
+    for column in columns:
+        values = np.vstack([interpolate(s["time"], s[column], grid) for s in series])
+        for i, s in enumerate(series):
+            if i != ref_index:
+                rows.append({"label": s["label"], "column": column,
+                             **diff_metrics(grid, values[ref_index], values[i])})
+    return rows
+
+
+def check_tolerances(rows, rel_tol=None, column_tol=None, max_peak_shift=None):
+    """按容差检查compare_series的结果，返回不通过的说明列表
+
+    rel_tol为所有列的相对L2误差上限，column_tol={列名: 上限}逐列覆盖；max_peak_shift为峰值时刻偏移上限。
+    """
+    column_tol = column_tol or {}
+    failures = []
+    for row in rows:
+        limit = column_tol.get(row["column"], rel_tol)
+        if limit is not None and not row["rel_l2"] <= limit:
+            failures.append(f"{row['label']} {row['column']}: 相对L2误差 {row['rel_l2']:.3g} > {limit:g}")
+        if max_peak_shift is not None and not abs(row["peak_shift"]) <= max_peak_shift:
+            failures.append(f"{row['label']} {row['column']}: 峰值时刻偏移 {row['peak_shift']:.4g} > {max_peak_shift:g}")
+    return failures
+
+
+def format_metrics(rows):
+    lines = [f"{'运行':<28}{'列':<24}{'L2':>12}{'L∞':>12}{'相对L2':>10}{'相对L∞':>10}{'峰值偏移':>12}"]
+    for row in rows:
+        lines.append(f"{row['label']:<28}{row['column']:<24}{row['l2']:>12.4g}{row['linf']:>12.4g}"
+                     f"{row['rel_l2']:>10.3g}{row['rel_linf']:>10.3g}{row['peak_shift']:>12.4g}")
+    return '\n'.join(lines)
@@ -0,0 +1,243 @@
+"""
+Exodus II结果文件对比（回归测试用，替代外部exodiff）
+先比较网格结构、坐标与时间步，再把节点变量和各块的单元变量按时间步分块，在进程池中逐块比较；
+每块只映射读取所需的时间步（见exodus_reader），内存占用与文件大小无关。
+
+判定与MOOSE测试系统的Exodiff一致：|a-b| > max(abs_zero, rel_err·max(|a|,|b|)) 视为不同，
+两个值都小于abs_zero时视为0。容差可按变量单独指定；报告每个变量最大偏差所在的节点/单元坐标与时刻。
+
+用法：python exodus_diff.py gold/out.e out.e [--rel-err 1e-5] [--var-tol hoop_stress=1e-4,1e-8] [--fail-fast]
+退出码：0 一致，1 有超出容差的差异，2 文件无法比较（结构不同或读取失败）
+"""
+
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from exodus_reader import ExodusFile
+
+REL_ERR = 5.5e-6        # 相对误差容差（与TestHarness的Exodiff默认值相同）
+ABS_ZERO = 1e-10        # 绝对值小于此值视为0
+COORD_TOL = 1e-10       # 坐标允许的绝对差
+TIME_TOL = 1e-10        # 时间步时刻允许的相对差
+CHUNK_BYTES = 64 << 20  # 每个任务读取的单个文件数据量上限
+
+_files = {}  # 工作进程中已打开的文件（按路径缓存，映射只建立一次）
+
+
+def _open(path):
+    if path not in _files:
+        _files[path] = ExodusFile(path)
+    return _files[path]
+
+
+def exceed(a, b, rel_err, abs_zero):
+    """逐元素的超差程度 |a-b| / 允许偏差（>1即超差）"""
+    a = np.where(np.abs(a) < abs_zero, 0.0, a)
+    b = np.where(np.abs(b) < abs_zero, 0.0, b)
+    allowed = np.maximum(abs_zero, rel_err * np.maximum(np.abs(a), np.abs(b)))
+    ratio = np.abs(a - b) / allowed
+    # nan与nan视为相同，nan与数值视为不同
+    both_nan = np.isnan(a) & np.isnan(b)
+    return np.where(both_nan, 0.0, np.where(np.isnan(ratio), np.inf, ratio))
+
+
+def compare_chunk(task):
+    """进程池任务：比较一个变量在一段时间步上的值，返回超差个数与最大偏差的位置"""
+    gold_path, result_path, kind, name, block, start, stop, rel_err, abs_zero = task
+    gold, result = _open(gold_path), _open(result_path)
+    steps = slice(start, stop)
+    if kind == 'nodal':
+        a, b = gold.nodal(name, steps), result.nodal(name, steps)
+    else:
+        a, b = gold.element(name, block, steps), result.element(name, block, steps)
+    ratio = exceed(a, b, rel_err, abs_zero)
+    step, index = np.unravel_index(int(np.argmax(ratio)), ratio.shape)
+    return {
+        'kind': kind, 'name': name, 'block': block,
+        'failures': int((ratio > 1).sum()),
+        'worst': float(ratio[step, index]),
+        'step': start + int(step), 'index': int(index),
+        'gold': float(a[step, index]), 'result': float(b[step, index]),
+    }
+
+
+def parse_var_tol(text):
+    """变量名=相对容差[,绝对零值]"""
+    name, sep, values = text.partition('=')
+    parts = values.split(',')
+    if not sep or not 1 <= len(parts) <= 2:
+        raise argparse.ArgumentTypeError(f"格式应为 变量名=相对容差[,绝对零值]: {text}")
+    return name, tuple(float(x) for x in parts)
+
+
+def structure_errors(gold, result):
+    """网格与变量结构的差异；有差异时无法逐值比较"""
+    errors = []
+    for attr in ('num_dim', 'num_nodes', 'num_elem'):
+        if getattr(gold, attr) != getattr(result, attr):
+            errors.append(f"{attr}: {getattr(gold, attr)} != {getattr(result, attr)}")
+    if list(gold.blocks) != list(result.blocks):
+        errors.append(f"块: {list(gold.blocks)} != {list(result.blocks)}")
+    for label in ('nodal_variables', 'element_variables', 'global_variables'):
+        missing = sorted(set(getattr(gold, label)) - set(getattr(result, label)))
+        if missing:
+            errors.append(f"结果中缺少变量: {', '.join(missing)}")
+    if gold.num_steps != result.num_steps:
+        errors.append(f"时间步数: {gold.num_steps} != {result.num_steps}")
+    elif gold.num_steps and not np.allclose(gold.times, result.times, rtol=TIME_TOL, atol=0):
+        step = int(np.argmax(np.abs(gold.times - result.times)))
+        errors.append(f"第{step}步时刻: {gold.times[step]:g} != {result.times[step]:g}")
+    if not errors and gold.num_nodes:
+        deviation = np.abs(gold.coords - result.coords).max(axis=1)
+        if deviation.max() > COORD_TOL:
+            node = int(deviation.argmax())
+            errors.append(f"节点{node}坐标偏差 {deviation[node]:.3g}")
+    return errors
+
+
+def make_tasks(gold, gold_path, result_path, tolerance):
+    """把每个变量（单元变量按块）按时间步切分为读取量不超过CHUNK_BYTES的任务"""
+    tasks = []
+
+    def add(kind, name, block, count):
+        rel_err, abs_zero = tolerance(name)
+        per_chunk = max(1, CHUNK_BYTES // (8 * max(count, 1)))
+        for start in range(0, gold.num_steps, per_chunk):
+            tasks.append((gold_path, result_path, kind, name, block, start,
+                          min(start + per_chunk, gold.num_steps), rel_err, abs_zero))
+
+    for name in gold.nodal_variables:
+        add('nodal', name, None, gold.num_nodes)
+    for name in gold.element_variables:
+        for block in gold.blocks:
+            add('element', name, block, len(gold.connectivity(block)))
+    return tasks
+
+
+def location(exo, outcome):
+    """最大偏差所在的节点或单元（单元取角点中心）的坐标描述"""
+    if outcome['kind'] == 'nodal':
+        xyz = exo.coords[outcome['index']]
+        where = f"节点{outcome['index']}"
+    else:
+        connect = exo.connectivity(outcome['block'])[outcome['index']]
+        xyz = exo.coords[connect].mean(axis=0)
+        where = f"块{outcome['block']}单元{outcome['index']}"
+    return f"{where} ({', '.join(f'{x:.6g}' for x in xyz)})"
+
+
+def compare_globals(gold, result, tolerance):
+    outcomes = []
+    for name in gold.global_variables:
+        rel_err, abs_zero = tolerance(name)
+        a, b = gold.global_(name), result.global_(name)
+        ratio = exceed(a, b, rel_err, abs_zero)
+        step = int(np.argmax(ratio)) if len(ratio) else 0
+        outcomes.append({'kind': 'global', 'name': name, 'block': None,
+                         'failures': int((ratio > 1).sum()), 'worst': float(ratio.max()) if len(ratio) else 0.0,
+                         'step': step, 'index': 0,
+                         'gold': float(a[step]) if len(a) else 0.0, 'result': float(b[step]) if len(b) else 0.0})
+    return outcomes
+
+
+def merge(outcomes):
+    """同一变量（及块）各时间段的结果合并：超差个数相加，保留最大偏差"""
+    merged = {}
+    for outcome in outcomes:
+        key = (outcome['kind'], outcome['name'], outcome['block'])
+        if key not in merged:
+            merged[key] = dict(outcome)
+            continue
+        entry = merged[key]
+        failures = entry['failures'] + outcome['failures']
+        if outcome['worst'] > entry['worst']:
+            entry.update(outcome)
+        entry['failures'] = failures
+    return list(merged.values())
+
+
+def diff(gold_path, result_path, rel_err=REL_ERR, abs_zero=ABS_ZERO, var_tol=None, fail_fast=False, workers=None):
+    """返回 (结构错误列表, 各变量比较结果列表)"""
+    var_tol = var_tol or {}
+
+    def tolerance(name):
+        values = var_tol.get(name, ())
+        return (values[0] if values else rel_err), (values[1] if len(values) > 1 else abs_zero)
+
+    gold, result = ExodusFile(gold_path), ExodusFile(result_path)
+    errors = structure_errors(gold, result)
+    if errors:
+        return errors, []
+
+    outcomes = compare_globals(gold, result, tolerance)
+    if fail_fast and any(o['failures'] for o in outcomes):
+        return [], outcomes
+    tasks = make_tasks(gold, gold_path, result_path, tolerance)
+    if workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            outcomes.append(compare_chunk(task))
+            if fail_fast and outcomes[-1]['failures']:
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(compare_chunk, task) for task in tasks]
+            for future in as_completed(futures):
+                outcomes.append(future.result())
+                if fail_fast and outcomes[-1]['failures']:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    break
+    return [], merge(outcomes)
+
+
+def report(gold_path, result_path, outcomes):
+    result = ExodusFile(result_path)
+    times = result.times
+    lines = []
+    for o in sorted(outcomes, key=lambda o: -o['worst']):
+        label = o['name'] + (f"@{o['block']}" if o['block'] is not None else '')
+        status = '不同' if o['failures'] else '一致'
+        line = f"  {status} {o['kind']:<8}{label:<32}最大偏差/容差 {o['worst']:.3g}"
+        if o['failures']:
+            where = location(result, o) if o['kind'] != 'global' else '全局'
+            time = times[o['step']] if len(times) else float('nan')
+            line += (f"  超差{o['failures']}处；最大处 t={time:g}（第{o['step']}步） {where}"
+                     f"  gold={o['gold']:.6g} 结果={o['result']:.6g}")
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按变量容差对比两个Exodus II结果文件')
+    parser.add_argument('gold', help='基准（gold）文件')
+    parser.add_argument('result', help='待检查的结果文件')
+    parser.add_argument('--rel-err', type=float, default=REL_ERR, help=f'相对误差容差（默认 {REL_ERR:g}）')
+    parser.add_argument('--abs-zero', type=float, default=ABS_ZERO, help=f'绝对值小于此值视为0（默认 {ABS_ZERO:g}）')
+    parser.add_argument('--var-tol', type=parse_var_tol, action='append', default=[], metavar='变量=相对容差[,绝对零值]',
+                        help='单个变量的容差（可多次指定）')
+    parser.add_argument('--fail-fast', action='store_true', help='发现第一处超差即停止')
+    parser.add_argument('--workers', type=int, help='并行比较的进程数（默认为CPU核数）')
+    args = parser.parse_args(argv)
+
+    try:
+        errors, outcomes = diff(args.gold, args.result, args.rel_err, args.abs_zero, dict(args.var_tol),
+                                args.fail_fast, args.workers)
+    except (OSError, ValueError, KeyError, ImportError) as e:  # ImportError: HDF5格式需要h5py
+        print(f"错误: {e}")
+        return 2
+    if errors:
+        print("文件结构不同，无法逐值比较:")
+        print('\n'.join(f"  {line}" for line in errors))
+        return 2
+
+    print(report(args.gold, args.result, outcomes))
+    failed = [o for o in outcomes if o['failures']]
+    print(f"\n{len(outcomes) - len(failed)}/{len(outcomes)} 个变量在容差内"
+          + ("（--fail-fast：比较在第一处超差后停止）" if args.fail_fast and failed else ""))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,590 @@
+"""
+Exodus II结果文件的按需读取（不经过ParaView）
+netCDF经典格式（CDF1/CDF2/CDF5，MOOSE默认输出）由本模块直接解析文件头，变量以np.memmap映射，
+只有实际切片到的块、边界、时间步和变量才会从磁盘读入；netCDF4/HDF5格式的文件需要安装h5py（同样按切片读取）。
+
+在此之上支持按块（pellet、clad）、侧集（pellet_outer、clad_inner）和节点集取数据，
+以及点/线采样：定位一次各点所在单元与插值权重，之后对所有时间步一次性矩阵运算。
+
+用法：
+    python exodus_reader.py out.e                                     # 文件概要
+    python exodus_reader.py out.e --var temp --sideset pellet_outer   # 侧集上各时间步的最小/平均/最大值
+    python exodus_reader.py out.e --var hoop_stress --line 0,0,0 0.0041,0,0 --points 50 --step -1
+"""
+
+import sys
+import argparse
+import numpy as np
+
+try:
+    import h5py
+except ModuleNotFoundError:
+    h5py = None
+
+# netCDF经典格式的标记与数据类型（大端）
+NC_DIMENSION, NC_VARIABLE, NC_ATTRIBUTE = 10, 11, 12
+NC_TYPES = {1: '>i1', 2: 'S1', 3: '>i2', 4: '>i4', 5: '>f4', 6: '>f8',
+            7: '>u1', 8: '>u2', 9: '>u4', 10: '>i8', 11: '>u8'}
+
+# 各单元族的侧面（Exodus编号从1开始）对应的角点
+SIDE_NODES = {
+    'EDGE': [[0], [1]],
+    'TRI': [[0, 1], [1, 2], [2, 0]],
+    'QUAD': [[0, 1], [1, 2], [2, 3], [3, 0]],
+    'TET': [[0, 1, 3], [1, 2, 3], [0, 3, 2], [0, 2, 1]],
+    'HEX': [[0, 1, 5, 4], [1, 2, 6, 5], [2, 3, 7, 6], [0, 4, 7, 3], [0, 3, 2, 1], [4, 5, 6, 7]],
+}
+CORNERS = {'EDGE': 2, 'TRI': 3, 'QUAD': 4, 'TET': 4, 'HEX': 8}
+# 参考单元坐标的取值范围：单纯形为[0,1]的重心型坐标，其余为[-1,1]
+SIMPLEX = {'TRI', 'TET'}
+NEWTON_ITERATIONS = 8
+INSIDE_TOL = 1e-6
+READ_CHUNK_BYTES = 64 << 20  # 按时间步分段读取变量时每段的数据量上限
+
+
+def element_family(elem_type):
+    """Exodus单元类型名 -> 单元族（HEX8/HEX20/HEX27 -> HEX，BAR2/TRUSS2 -> EDGE）"""
+    name = elem_type.upper().rstrip('0123456789')
+    if name in ('BAR', 'TRUSS', 'BEAM', 'EDGE'):
+        return 'EDGE'
+    if name in ('TRIANGLE', 'TRISHELL'):
+        return 'TRI'
+    if name in ('QUADRILATERAL', 'SHELL'):
+        return 'QUAD'
+    if name == 'TETRA':
+        return 'TET'
+    return name
+
+
+def decode_names(chars):
+    """netCDF字符数组（每行一个以\\0结尾的名字）-> 字符串列表"""
+    chars = np.asarray(chars)
+    if chars.ndim == 1:
+        chars = chars[None, :]
+    return [b''.join(row).split(b'\0')[0].decode('utf-8', errors='replace').strip() for row in chars]
+
+
+class NetcdfClassic:
+    """netCDF经典格式的只读解析：文件头读入为字典，变量为映射到文件的numpy数组（不复制）"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic = f.read(4)
+        if magic[:3] != b'CDF' or magic[3] not in (1, 2, 5):
+            raise ValueError(f"不是netCDF经典格式文件: {path}")
+        self.version = magic[3]
+        self._mm = np.memmap(path, dtype=np.uint8, mode='r')
+        self._pos = 4
+        self.numrecs = self._size()
+        self.dims = {}            # 名称 -> 长度（记录维为None）
+        self.attrs = {}
+        self.variables = {}       # 名称 -> 映射数组
+        self.variable_attrs = {}
+        self._parse_header()
+
+    # ---------- 文件头 ----------
+
+    def _take(self, n):
+        data = bytes(self._mm[self._pos:self._pos + n])
+        self._pos += n
+        return data
+
+    def _int(self):
+        return int.from_bytes(self._take(4), 'big', signed=True)
+
+    def _size(self):
+        """CDF5中长度与个数为8字节"""
+        return int.from_bytes(self._take(8 if self.version == 5 else 4), 'big')
+
+    def _name(self):
+        n = self._size()
+        name = self._take(n).decode('utf-8')
+        self._pos += -n % 4
+        return name
+
+    def _values(self, nc_type, n):
+        dtype = np.dtype(NC_TYPES[nc_type])
+        raw = self._take(n * dtype.itemsize)
+        self._pos += -len(raw) % 4
+        if nc_type == 2:
+            return raw.split(b'\0')[0].decode('utf-8', errors='replace')
+        values = np.frombuffer(raw, dtype=dtype)
+        return values[0].item() if n == 1 else values.copy()
+
+    def _list(self, tag):
+        kind, n = self._int(), self._size()
+        if kind not in (0, tag):
+            raise ValueError(f"netCDF文件头损坏（位置 {self._pos}）")
+        return n
+
+    def _attributes(self):
+        attrs = {}
+        for _ in range(self._list(NC_ATTRIBUTE)):
+            name = self._name()
+            nc_type = self._int()
+            attrs[name] = self._values(nc_type, self._size())
+        return attrs
+
+    def _parse_header(self):
+        dim_names = []
+        for _ in range(self._list(NC_DIMENSION)):
+            name = self._name()
+            length = self._size()
+            self.dims[name] = length or None
+            dim_names.append(name)
+        self.attrs = self._attributes()
+
+        specs = []
+        for _ in range(self._list(NC_VARIABLE)):
+            name = self._name()
+            dim_ids = [self._size() for _ in range(self._size())]
+            attrs = self._attributes()
+            nc_type = self._int()
+            vsize = self._size()
+            begin = int.from_bytes(self._take(4 if self.version == 1 else 8), 'big')
+            specs.append((name, [dim_names[i] for i in dim_ids], attrs, nc_type, vsize, begin))
+
+        # 记录变量逐记录交错存放，一个记录的大小为所有记录变量vsize之和（只有一个记录变量时不补齐）
+        record_vars = [s for s in specs if s[1] and self.dims[s[1][0]] is None]
+        if len(record_vars) == 1:
+            name, dims, _, nc_type, _, _ = record_vars[0]
+            shape = [self.dims[d] for d in dims[1:]]
+            record_size = int(np.prod(shape, dtype=np.int64)) * np.dtype(NC_TYPES[nc_type]).itemsize
+        else:
+            record_size = sum(s[4] for s in record_vars)
+
+        for name, dims, attrs, nc_type, vsize, begin in specs:
+            dtype = np.dtype(NC_TYPES[nc_type])
+            is_record = bool(dims) and self.dims[dims[0]] is None
+            shape = [self.numrecs if is_record and i == 0 else self.dims[d] for i, d in enumerate(dims)]
+            strides = [dtype.itemsize] * len(shape)
+            for i in range(len(shape) - 2, -1, -1):
+                strides[i] = strides[i + 1] * shape[i + 1]
+            if is_record:
+                strides[0] = record_size
+            self.variables[name] = np.ndarray(shape, dtype=dtype, buffer=self._mm, offset=begin,
+                                              strides=strides)
+            self.variable_attrs[name] = attrs
+
+
+class Hdf5Container:
+    """netCDF4（HDF5）格式，接口与NetcdfClassic一致；h5py的数据集在切片时才读取"""
+
+    def __init__(self, path):
+        if h5py is None:
+            raise ModuleNotFoundError("读取netCDF4/HDF5格式的Exodus文件需要安装h5py")
+        self.path = path
+        self._file = h5py.File(path, 'r')
+        self.variables, self.variable_attrs, self.dims = {}, {}, {}
+        for name, item in self._file.items():
+            if not isinstance(item, h5py.Dataset):
+                continue
+            if 'NAME' in item.attrs and b'This is a netCDF dimension but not a netCDF variable' in bytes(item.attrs['NAME']):
+                self.dims[name] = len(item)
+                continue
+            self.variables[name] = item
+            self.variable_attrs[name] = {k: (v.decode() if isinstance(v, bytes) else v)
+                                         for k, v in item.attrs.items()}
+            for dim, length in zip((d[0].name.lstrip('/') for d in item.dims if len(d)), item.shape):
+                self.dims.setdefault(dim, length)
+        self.attrs = dict(self._file.attrs)
+        self.numrecs = self.dims.get('time_step', 0)
+
+
+def open_container(path):
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic == b'\x89HDF':
+        return Hdf5Container(path)
+    return NetcdfClassic(path)
+
+
+def _shape_functions(family, xi):
+    """参考坐标xi (n, d) 处的线性形函数 (n, k) 及其导数 (n, k, d)"""
+    n = len(xi)
+    if family in SIMPLEX:
+        d = xi.shape[1]
+        N = np.concatenate([1 - xi.sum(axis=1, keepdims=True), xi], axis=1)
+        dN = np.zeros((n, d + 1, d))
+        dN[:, 0, :] = -1
+        dN[:, 1:, :] = np.eye(d)
+        return N, dN
+    # 张量积单元：EDGE/QUAD/HEX的角点按Exodus顺序
+    signs = {
+        'EDGE': [[-1], [1]],
+        'QUAD': [[-1, -1], [1, -1], [1, 1], [-1, 1]],
+        'HEX': [[-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+                [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1]],
+    }[family]
+    signs = np.asarray(signs, dtype=float)                 # (k, d)
+    factors = 1 + xi[:, None, :] * signs[None, :, :]       # (n, k, d)
+    N = factors.prod(axis=2) / 2 ** signs.shape[1]
+    dN = np.empty((n, len(signs), signs.shape[1]))
+    for j in range(signs.shape[1]):
+        others = np.delete(factors, j, axis=2).prod(axis=2)
+        dN[:, :, j] = signs[None, :, j] * others / 2 ** signs.shape[1]
+    return N, dN
+
+
+def _inside(family, xi):
+    if family in SIMPLEX:
+        return (xi >= -INSIDE_TOL).all(axis=1) & (xi.sum(axis=1) <= 1 + INSIDE_TOL)
+    return (np.abs(xi) <= 1 + INSIDE_TOL).all(axis=1)
+
+
+def _invert_map(family, corners, points):
+    """对每对（单元角点坐标 (n, k, d)，物理点 (n, d)）用牛顿法求参考坐标，返回 (xi, 是否在单元内)"""
+    d = points.shape[1]
+    xi = np.full((len(points), d), 0.25 if family in SIMPLEX else 0.0)
+    for _ in range(NEWTON_ITERATIONS):
+        N, dN = _shape_functions(family, xi)
+        residual = np.einsum('nk,nkd->nd', N, corners) - points
+        jacobian = np.einsum('nkd,nke->nde', corners, dN)
+        try:
+            xi -= np.linalg.solve(jacobian, residual[..., None])[..., 0]
+        except np.linalg.LinAlgError:  # 退化单元
+            break
+    return xi, _inside(family, xi)
+
+
+class ExodusFile:
+    """Exodus II结果文件：网格与变量按需映射读取
+
+    节点、单元编号均为文件内从0开始的索引；块、侧集、节点集可按名称或ID指定。
+    时间步参数steps可为整数（负数从末尾计）、切片或索引数组。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.nc = open_container(path)
+        v = self.nc.variables
+        self.num_dim = self.nc.dims.get('num_dim', 3)
+        self.num_nodes = self.nc.dims.get('num_nodes', 0)
+        self.nodal_variables = self._names('name_nod_var')
+        self.element_variables = self._names('name_elem_var')
+        self.global_variables = self._names('name_glo_var')
+        self.blocks = self._entities('eb', 'num_el_blk', 'block')
+        self.sidesets = self._entities('ss', 'num_side_sets', 'sideset')
+        self.nodesets = self._entities('ns', 'num_node_sets', 'nodeset')
+        # 块名 -> (块序号（1开始，对应connect<i>），首个单元的全局索引)
+        self._block_index = {}
+        offset = 0
+        for i, name in enumerate(self.blocks, start=1):
+            self._block_index[name] = (i, offset)
+            offset += self.nc.dims.get(f'num_el_in_blk{i}', 0)
+        self.num_elem = offset
+        self._coords = None
+        self._elem_var_tab = np.asarray(v['elem_var_tab']) if 'elem_var_tab' in v else None
+
+    def _names(self, variable):
+        if variable not in self.nc.variables:
+            return []
+        return decode_names(self.nc.variables[variable][:])
+
+    def _entities(self, prefix, count_dim, default):
+        """{名称: ID}，未命名的以"<类别>_<ID>"代替"""
+        count = self.nc.dims.get(count_dim, 0)
+        if not count:
+            return {}
+        ids = np.asarray(self.nc.variables[f'{prefix}_prop1'][:]).tolist()
+        names = self._names(f'{prefix}_names') or [''] * count
+        return {name or f'{default}_{id_}': id_ for name, id_ in zip(names, ids)}
+
+    @staticmethod
+    def _lookup(entities, key, kind):
+        if key in entities:
+            return list(entities).index(key) + 1
+        ids = list(entities.values())
+        if key in ids or str(key).lstrip('-').isdigit() and int(key) in ids:
+            return ids.index(int(key)) + 1
+        raise KeyError(f"没有{kind} {key}，可选: {', '.join(entities)}")
+
+    # ---------- 网格 ----------
+
+    @property
+    def times(self):
+        return np.asarray(self.nc.variables['time_whole'][:], dtype=float)
+
+    @property
+    def num_steps(self):
+        return len(self.nc.variables['time_whole'])
+
+    def step_at(self, time):
+        """离给定时刻最近的时间步"""
+        return int(np.abs(self.times - time).argmin())
+
+    @property
+    def coords(self):
+        """节点坐标 (num_nodes, num_dim)，首次访问时读入"""
+        if self._coords is None:
+            v = self.nc.variables
+            if 'coordx' in v:
+                axes = [v[name][:] for name in ('coordx', 'coordy', 'coordz')[:self.num_dim]]
+            else:
+                axes = list(v['coord'][:self.num_dim])
+            self._coords = np.stack([np.asarray(a, dtype=float) for a in axes], axis=1)
+        return self._coords
+
+    def block_type(self, block):
+        i = self._lookup(self.blocks, block, '块')
+        return self.nc.variable_attrs[f'connect{i}'].get('elem_type', '')
+
+    def connectivity(self, block):
+        """块的单元-节点表 (num_el_in_blk, num_nod_per_el)，0开始的节点索引"""
+        i = self._lookup(self.blocks, block, '块')
+        return np.asarray(self.nc.variables[f'connect{i}'][:], dtype=np.int64) - 1
+
+    def block_nodes(self, block):
+        return np.unique(self.connectivity(block))
+
+    def block_of_elements(self, elements):
+        """全局单元索引 -> (块名数组, 块内索引数组)"""
+        elements = np.asarray(elements)
+        names = list(self._block_index)
+        starts = np.array([self._block_index[name][1] for name in names])
+        which = np.searchsorted(starts, elements, side='right') - 1
+        return np.array(names)[which], elements - starts[which]
+
+    def nodeset_nodes(self, nodeset):
+        i = self._lookup(self.nodesets, nodeset, '节点集')
+        return np.asarray(self.nc.variables[f'node_ns{i}'][:], dtype=np.int64) - 1
+
+    def sideset(self, sideset):
+        """侧集的 (全局单元索引, 侧面编号（1开始）)"""
+        i = self._lookup(self.sidesets, sideset, '侧集')
+        v = self.nc.variables
+        return (np.asarray(v[f'elem_ss{i}'][:], dtype=np.int64) - 1,
+                np.asarray(v[f'side_ss{i}'][:], dtype=np.int64))
+
+    def sideset_nodes(self, sideset):
+        """侧集上的节点：有同名节点集时直接使用（MOOSE为每个边界同时写出侧集和节点集），否则由侧面角点推出"""
+        if sideset in self.nodesets:
+            return self.nodeset_nodes(sideset)
+        elements, sides = self.sideset(sideset)
+        block_names, local = self.block_of_elements(elements)
+        nodes = []
+        for block in np.unique(block_names):
+            mask = block_names == block
+            table = SIDE_NODES[element_family(self.block_type(block))]
+            connect = self.connectivity(block)[local[mask]]
+            for side in np.unique(sides[mask]):
+                rows = connect[sides[mask] == side]
+                nodes.append(rows[:, table[side - 1]].ravel())
+        return np.unique(np.concatenate(nodes)) if nodes else np.empty(0, dtype=np.int64)
+
+    # ---------- 变量 ----------
+
+    def _steps(self, steps):
+        if steps is None:
+            return slice(None)
+        return steps
+
+    def _read(self, data, steps, index=None, prefix=()):
+        """读取变量在所选时间步、所选节点/单元上的值，形状 (时间步数, 列数)，steps为整数时去掉时间维
+
+        先在映射数组上选取再转换为float64，并按时间步分段，读入的数据量只与所选的步数和列数有关。
+        prefix为时间维之后、列维之前的固定下标（旧格式的vals_nod_var带变量维）。
+        """
+        step_index = np.arange(data.shape[0])[self._steps(steps)]
+        scalar = np.ndim(step_index) == 0
+        step_index = np.atleast_1d(step_index)
+        if index is not None:
+            index = np.asarray(index, dtype=np.int64).ravel()
+        width = data.shape[-1] if index is None else len(index)
+        out = np.empty((len(step_index), width))
+        per_chunk = max(1, READ_CHUNK_BYTES // (8 * max(width, 1)))
+        for start in range(0, len(step_index), per_chunk):
+            chunk = step_index[start:start + per_chunk]
+            rows = out[start:start + len(chunk)]
+            if isinstance(data, np.ndarray):
+                # 时间步与列同时用数组下标，只从映射中取出这些元素
+                if index is None:
+                    rows[:] = data[(chunk,) + prefix]
+                else:
+                    rows[:] = data[(chunk[:, None],) + prefix + (index[None, :],)]
+            else:
+                # h5py每次只允许一个递增的下标列表：逐步读取所需的列
+                columns, inverse = (None, None) if index is None else np.unique(index, return_inverse=True)
+                for k, step in enumerate(chunk.tolist()):
+                    if columns is None:
+                        rows[k] = data[(step,) + prefix]
+                    else:
+                        rows[k] = data[(step,) + prefix + (columns.tolist(),)][inverse]
+        return out[0] if scalar else out
+
+    def nodal(self, name, steps=None, nodes=None):
+        """节点变量，形状 (时间步数, 节点数)；steps为整数时去掉时间维。只读入所选时间步、所选节点的数据"""
+        j = self.nodal_variables.index(name) + 1
+        v = self.nc.variables
+        if f'vals_nod_var{j}' in v:
+            return self._read(v[f'vals_nod_var{j}'], steps, nodes)
+        return self._read(v['vals_nod_var'], steps, nodes, prefix=(j - 1,))
+
+    def element(self, name, block, steps=None, elements=None):
+        """单元变量在一个块上的值，形状 (时间步数, 块内单元数)；该块没有此变量时返回nan"""
+        j = self.element_variables.index(name) + 1
+        i = self._lookup(self.blocks, block, '块')
+        key = f'vals_elem_var{j}eb{i}'
+        if key not in self.nc.variables:
+            count = self.nc.dims.get(f'num_el_in_blk{i}', 0) if elements is None else len(elements)
+            steps = np.arange(self.num_steps)[self._steps(steps)]
+            return np.full(np.shape(steps) + (count,), np.nan)
+        return self._read(self.nc.variables[key], steps, elements)
+
+    def global_(self, name, steps=None):
+        j = self.global_variables.index(name)
+        return self._read(self.nc.variables['vals_glo_var'], steps, [j])[..., 0]
+
+    def sideset_values(self, name, sideset, steps=None):
+        """节点变量在侧集节点上的值 (时间步数, 节点数)"""
+        return self.nodal(name, steps, self.sideset_nodes(sideset))
+
+    # ---------- 点/线采样 ----------
+
+    def locate(self, points, blocks=None):
+        """定位各点所在单元并计算插值权重
+
+        返回 (节点索引 (npts, k), 权重 (npts, k), 全局单元索引 (npts,))，找不到单元的点节点索引为-1、单元为-1。
+        二次单元只用角点做线性插值。
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))[:, :self.num_dim]
+        width = max(CORNERS[element_family(self.block_type(b))] for b in (blocks or self.blocks))
+        nodes = np.full((len(points), width), -1, dtype=np.int64)
+        weights = np.zeros((len(points), width))
+        found = np.full(len(points), -1, dtype=np.int64)
+        coords = self.coords
+        for block in blocks or self.blocks:
+            family = element_family(self.block_type(block))
+            k = CORNERS[family]
+            connect = self.connectivity(block)[:, :k]
+            corners = coords[connect]                       # (nelem, k, d)
+            lower, upper = corners.min(axis=1), corners.max(axis=1)
+            pad = (upper - lower).max(axis=1, keepdims=True) * INSIDE_TOL
+            _, offset = self._block_index[block]
+            for p in np.flatnonzero(found < 0):
+                candidates = np.flatnonzero(((points[p] >= lower - pad) & (points[p] <= upper + pad)).all(axis=1))
+                if not len(candidates):
+                    continue
+                xi, inside = _invert_map(family, corners[candidates],
+                                         np.broadcast_to(points[p], (len(candidates), self.num_dim)))
+                hits = np.flatnonzero(inside)
+                if len(hits):
+                    e = hits[0]
+                    N, _ = _shape_functions(family, xi[e:e + 1])
+                    nodes[p, :k] = connect[candidates[e]]
+                    weights[p, :k] = N[0]
+                    found[p] = offset + candidates[e]
+        return nodes, weights, found
+
+    def sample_points(self, name, points, steps=None, blocks=None):
+        """节点变量（插值）或单元变量（所在单元的值）在各点的值，形状 (时间步数, 点数)；单元外的点为nan
+
+        单元定位只做一次，之后所有时间步一起计算：只读入涉及到的节点列。
+        """
+        nodes, weights, elements = self.locate(points, blocks)
+        ok = elements >= 0
+        if not ok.any():
+            steps_index = np.arange(self.num_steps)[self._steps(steps)]
+            return np.full(np.shape(steps_index) + (len(elements),), np.nan)
+        if name in self.nodal_variables:
+            used = np.unique(nodes[ok][weights[ok] != 0])
+            values = self.nodal(name, steps, used)                  # (..., nused)
+            index = np.searchsorted(used, np.where(nodes >= 0, nodes, used[0]))
+            result = np.einsum('...pk,pk->...p', values[..., index], weights)
+        elif name in self.element_variables:
+            steps_index = np.arange(self.num_steps)[self._steps(steps)]
+            result = np.full(np.shape(steps_index) + (len(elements),), np.nan)
+            block_names, local = self.block_of_elements(np.where(ok, elements, 0))
+            for block in np.unique(block_names[ok]):
+                mask = ok & (block_names == block)
+                result[..., mask] = self.element(name, block, steps, local[mask])
+        else:
+            raise KeyError(f"没有变量 {name}")
+        result[..., ~ok] = np.nan
+        return result
+
+    def sample_line(self, name, start, end, points=100, steps=None, blocks=None):
+        """沿线段等距采样，返回 (沿线距离 (points,), 值 (时间步数, points))"""
+        start = np.asarray(start, dtype=float)[:self.num_dim]
+        end = np.asarray(end, dtype=float)[:self.num_dim]
+        s = np.linspace(0.0, 1.0, points)
+        xyz = start + s[:, None] * (end - start)
+        return s * np.linalg.norm(end - start), self.sample_points(name, xyz, steps, blocks)
+
+    def summary(self):
+        times = self.times
+        span = f" (t = {times[0]:g} … {times[-1]:g})" if len(times) else ""
+        lines = [f"{self.path}: {self.num_dim}维, {self.num_nodes}个节点, {self.num_elem}个单元, "
+                 f"{len(times)}个时间步{span}"]
+        for name, id_ in self.blocks.items():
+            i, _ = self._block_index[name]
+            lines.append(f"  块 {name} (ID {id_}): {self.nc.dims.get(f'num_el_in_blk{i}', 0)}个 {self.block_type(name)}")
+        for name, id_ in self.sidesets.items():
+            lines.append(f"  侧集 {name} (ID {id_}): {len(self.sideset(name)[0])}个侧面")
+        for name, id_ in self.nodesets.items():
+            lines.append(f"  节点集 {name} (ID {id_}): {len(self.nodeset_nodes(name))}个节点")
+        for label, names in (('节点变量', self.nodal_variables), ('单元变量', self.element_variables),
+                             ('全局变量', self.global_variables)):
+            if names:
+                lines.append(f"  {label}: {', '.join(names)}")
+        return '\n'.join(lines)
+
+
+def parse_point(text):
+    return [float(x) for x in text.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按需读取Exodus II结果文件中的变量')
+    parser.add_argument('exodus_file', help='.e结果文件')
+    parser.add_argument('--var', help='变量名（节点、单元或全局变量）')
+    parser.add_argument('--block', action='append', help='只在这些块中取值或定位采样点（可多次指定）')
+    parser.add_argument('--sideset', help='输出侧集节点上各时间步的最小/平均/最大值')
+    parser.add_argument('--nodeset', help='输出节点集上各时间步的最小/平均/最大值')
+    parser.add_argument('--point', type=parse_point, action='append', metavar='x,y[,z]',
+                        help='输出各采样点的时间历程（可多次指定）')
+    parser.add_argument('--line', type=parse_point, nargs=2, metavar='x,y[,z]', help='沿线段采样')
+    parser.add_argument('--points', type=int, default=100, help='线段采样点数')
+    parser.add_argument('--step', type=int, help='只取此时间步（负数从末尾计），默认全部')
+    parser.add_argument('--output', help='结果写入CSV文件（默认打印）')
+    args = parser.parse_args(argv)
+
+    exo = ExodusFile(args.exodus_file)
+    if not args.var:
+        print(exo.summary())
+        return 0
+
+    steps = args.step if args.step is not None else slice(None)
+    times = np.atleast_1d(exo.times[steps])
+    if args.line:
+        distance, values = exo.sample_line(args.var, *args.line, args.points, steps, args.block)
+        header = ['distance'] + [f't={t:g}' for t in times]
+        table = np.column_stack([distance, np.atleast_2d(values).T])
+    elif args.point:
+        values = exo.sample_points(args.var, args.point, steps, args.block)
+        header = ['time'] + [' '.join(f'{x:g}' for x in p) for p in args.point]
+        table = np.column_stack([times, np.atleast_2d(values)])
+    elif args.sideset or args.nodeset:
+        nodes = exo.sideset_nodes(args.sideset) if args.sideset else exo.nodeset_nodes(args.nodeset)
+        values = np.atleast_2d(exo.nodal(args.var, steps, nodes))
+        header = ['time', 'min', 'mean', 'max']
+        table = np.column_stack([times, values.min(axis=1), values.mean(axis=1), values.max(axis=1)])
+    elif args.var in exo.global_variables:
+        header = ['time', args.var]
+        table = np.column_stack([times, np.atleast_1d(exo.global_(args.var, steps))])
+    else:
+        parser.error('节点/单元变量需要指定 --sideset、--nodeset、--point 或 --line')
+
+    if args.output:
+        np.savetxt(args.output, table, delimiter=',', header=','.join(header), comments='')
+        print(f"已写入 {args.output}")
+    else:
+        print(','.join(header))
+        for row in table:
+            print(','.join(f'{x:.6g}' for x in row))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
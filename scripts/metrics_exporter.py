@@ -0,0 +1,108 @@
+"""
+Prometheus文本格式的本地指标接口（可选）
+后台线程提供 http://<host>:<port>/metrics ，每次被抓取时才调用各运行注册的采集函数取当前值，
+日志解析线程不做任何额外工作。
+
+用法：
+    exporter = MetricsExporter(9464).start()
+    exporter.register('CreepStrain', analyzer.metrics)
+"""
+
+import math
+import numbers
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 已知指标的类型与说明；采集函数返回其他名称时按gauge输出
+METRICS = {
+    'moose_time_step': ('gauge', '当前时间步号'),
+    'moose_sim_time': ('gauge', '当前物理时间'),
+    'moose_dt': ('gauge', '当前时间步长'),
+    'moose_nonlinear_iterations': ('gauge', '当前时间步尝试的非线性迭代次数'),
+    'moose_linear_iterations': ('gauge', '当前时间步尝试的线性迭代次数'),
+    'moose_nonlinear_iterations_total': ('counter', '累计非线性迭代次数'),
+    'moose_linear_iterations_total': ('counter', '累计线性迭代次数'),
+    'moose_step_seconds': ('gauge', '最近一个收敛时间步的耗时（秒）'),
+    'moose_steps_total': ('counter', '时间步尝试总数'),
+    'moose_failed_steps_total': ('counter', '未收敛（被回退）的时间步尝试数'),
+    'moose_rss_megabytes': ('gauge', '/proc采样的各rank合计RSS（MB）'),
+    'moose_max_memory_megabytes': ('gauge', '日志中报告的最大内存（MB）'),
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    """样本值：整数（计数）原样输出，浮点数用repr保留全部有效数字，nan/inf用Prometheus的写法"""
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+class MetricsExporter:
+    """按运行名注册采集函数（无参，返回{指标名: 数值}），抓取时汇总为Prometheus文本格式"""
+
+    def __init__(self, port=9464, host='127.0.0.1'):
+        self.address = (host, port)
+        self.collectors = {}
+        self.server = None
+
+    def register(self, run, collector):
+        self.collectors[run] = collector
+
+    def unregister(self, run):
+        self.collectors.pop(run, None)
+
+    def render(self):
+        values = {}  # 指标名 -> [(运行名, 数值)]
+        for run, collector in list(self.collectors.items()):
+            try:
+                metrics = collector()
+            except Exception:  # 单个运行采集失败不影响其他运行
+                continue
+            for name, value in metrics.items():
+                if value is not None:
+                    values.setdefault(name, []).append((run, value))
+        lines = []
+        for name, samples in values.items():
+            kind, help_text = METRICS.get(name, ('gauge', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f'{name}{{run="{_escape(run)}"}} {_format_value(value)}' for run, value in samples)
+        return '\n'.join(lines) + '\n'
+
+    def start(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不把每次抓取打印到终端
+
+        self.server = ThreadingHTTPServer(self.address, Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,161 @@
+"""
+MOOSE Performance Graph（--timing输出的性能表）解析工具
+把表格解析为带自身/子节点耗时、调用次数与内存的层次树，
+并导出为火焰图工具（flamegraph.pl、speedscope等）可读的折叠栈格式和JSON。
+
+用法：python perf_graph.py <日志文件> [输出前缀]
+"""
+
+import os
+import sys
+import json
+
+
+class PerfNode:
+    """性能图中的一个section"""
+
+    def __init__(self, name, calls=0, self_time=0.0, total_time=0.0, self_mem=0.0, total_mem=0.0):
+        self.name = name
+        self.calls = calls
+        self.self_time = self_time
+        self.total_time = total_time
+        self.self_mem = self_mem
+        self.total_mem = total_mem
+        self.children = []
+
+    @property
+    def children_time(self):
+        """子section耗时 = 总耗时 - 自身耗时"""
+        return max(self.total_time - self.self_time, 0.0)
+
+    def walk(self, path=()):
+        """深度优先遍历，产出(从根到本节点的名称路径, 节点)"""
+        path = path + (self.name,)
+        yield path, self
+        for child in self.children:
+            yield from child.walk(path)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'self_time': self.self_time,
+            'children_time': self.children_time,
+            'total_time': self.total_time,
+            'self_mem': self.self_mem,
+            'total_mem': self.total_mem,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+
+def _number(text):
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return 0
+
+
+def parse_perf_graph(lines):
+    """把Performance Graph表格行解析为树，返回根节点列表
+
+    只处理以|开头的行：第一行为表头，决定各列含义（表头中前一组Self/Avg/%/Mem
+    为自身数据，Total之后的一组为包含子节点的数据）；section名前的缩进（每级2个空格）表示层级。
+    """
+    header = None
+    roots = []
+    stack = []  # (缩进, 节点)
+    for line in lines:
+        line = line.strip()
+        if not line.startswith('|'):
+            continue
+        raw_cells = line.strip('|').split('|')
+        cells = [c.strip() for c in raw_cells]
+        if header is None:
+            if cells and cells[0] == 'Section':
+                header = cells
+            continue
+        if len(cells) != len(header):
+            continue
+
+        values = {}
+        in_total = False
+        for column, cell in zip(header[1:], cells[1:]):
+            if column.startswith('Total'):
+                in_total = True
+                values['total_time'] = _number(cell)
+            elif column == 'Calls':
+                values['calls'] = _number(cell)
+            elif column.startswith('Self'):
+                values['self_time'] = _number(cell)
+            elif column.startswith('Mem'):
+                values['total_mem' if in_total else 'self_mem'] = _number(cell)
+        name_cell = raw_cells[0]
+        indent = len(name_cell) - len(name_cell.lstrip(' ')) - 1  # 去掉|后的一个分隔空格
+        node = PerfNode(cells[0], **values)
+
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        if stack:
+            stack[-1][1].children.append(node)
+        else:
+            roots.append(node)
+        stack.append((indent, node))
+    return roots
+
+
+def to_folded(roots, scale=1e6):
+    """导出折叠栈：每行"根;子;孙 自身耗时"，耗时按scale换算为整数（默认微秒）"""
+    lines = []
+    for root in roots:
+        for path, node in root.walk():
+            value = int(round(node.self_time * scale))
+            if value > 0:
+                names = ';'.join(name.replace(';', ':').replace(' ', '_') for name in path)
+                lines.append(f"{names} {value}")
+    return '\n'.join(lines) + ('\n' if lines else '')
+
+
+def to_json(roots):
+    return json.dumps([root.to_dict() for root in roots], ensure_ascii=False, indent=1)
+
+
+def top_sections(roots, n=10):
+    """按自身耗时排序的前n个section"""
+    nodes = [node for root in roots for _, node in root.walk()]
+    return sorted(nodes, key=lambda node: node.self_time, reverse=True)[:n]
+
+
+def export_perf_graph(lines, prefix):
+    """解析并写出<prefix>.folded与<prefix>.json，返回根节点列表"""
+    roots = parse_perf_graph(lines)
+    if roots:
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(prefix + '.folded', 'w', encoding='utf-8') as f:
+            f.write(to_folded(roots))
+        with open(prefix + '.json', 'w', encoding='utf-8') as f:
+            f.write(to_json(roots))
+    return roots
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("使用方法: python perf_graph.py <日志文件> [输出前缀]")
+        sys.exit(1)
+    log_file = sys.argv[1]
+    prefix = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(log_file)[0] + '_perf'
+    with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+        # 只取最后一张表（多次输出时以最终结果为准）
+        lines = f.read().split('Performance Graph:')[-1].splitlines()
+    roots = export_perf_graph(lines, prefix)
+    if not roots:
+        print("日志中没有找到Performance Graph表格（运行时需加 --timing）")
+        sys.exit(1)
+    for node in top_sections(roots):
+        print(f"{node.name:<50} 自身 {node.self_time:>10.3f} s  子节点 {node.children_time:>10.3f} s  调用 {node.calls}")
+    print(f"\n已导出: {prefix}.folded  {prefix}.json")
@@ -0,0 +1,214 @@
+"""
+基于/proc的求解进程资源采样器（仅Linux）
+后台线程按固定间隔遍历mpiexec进程树，记录每个rank的RSS、CPU占用、上下文切换次数与I/O字节数，
+写入定长环形缓冲区；每个样本带上采样时刻的时间步号，内存峰值可以对应到具体的时间步和rank。
+
+用法：python proc_sampler.py <mpiexec的pid> [间隔秒数]   # 采样到进程结束后打印各rank汇总
+"""
+
+import os
+import sys
+import time
+import threading
+import numpy as np
+
+SAMPLE_DTYPE = np.dtype([
+    ('time', 'f8'),          # 相对采样开始的秒数
+    ('step', 'i4'),          # 采样时刻的时间步号
+    ('rank', 'i2'),
+    ('pid', 'i4'),
+    ('rss_mb', 'f4'),
+    ('cpu', 'f4'),           # 两次采样之间的CPU占用（1.0 = 一个核满载）
+    ('ctx_switches', 'i8'),  # 累计（自愿+非自愿）上下文切换次数
+    ('read_bytes', 'i8'),    # 累计实际读盘字节
+    ('write_bytes', 'i8'),   # 累计实际写盘字节
+])
+
+PAGE_MB = os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+RANK_ENV_KEYS = (b'PMI_RANK=', b'OMPI_COMM_WORLD_RANK=', b'PMIX_RANK=', b'MPI_LOCALRANKID=')
+
+
+def _read(path, mode='r'):
+    try:
+        with open(path, mode) as f:
+            return f.read()
+    except OSError:  # 进程已退出或无权限
+        return None
+
+
+def _children_map():
+    """{父pid: [子pid...]}，一次遍历/proc得到整个进程表"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        stat = _read(f'/proc/{entry}/stat')
+        if stat:
+            # comm可能含空格和括号，从最后一个')'之后开始取字段
+            ppid = int(stat[stat.rindex(')') + 2:].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _descendants(root):
+    children = _children_map()
+    result, stack = [], [root]
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def _rank_of(pid):
+    """从进程环境变量中读取MPI rank（MPICH/Open MPI/PMIx/Intel MPI），读不到时返回None"""
+    environ = _read(f'/proc/{pid}/environ', 'rb')
+    for item in (environ or b'').split(b'\0'):
+        for key in RANK_ENV_KEYS:
+            if item.startswith(key):
+                return int(item[len(key):])
+    return None
+
+
+class ProcessTreeSampler:
+    """跟踪root_pid下的求解进程（rank）资源使用
+
+    capacity个样本的环形缓冲区写满后覆盖最旧的样本；每个时间步的内存峰值另外增量保存，不受覆盖影响。
+    step_source为无参可调用对象，返回当前时间步号（由日志解析线程更新）。
+    """
+
+    def __init__(self, root_pid, interval=1.0, capacity=65536, exe_name=None, step_source=None):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.buffer = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self.count = 0  # 累计写入的样本数
+        self.comm = os.path.basename(exe_name)[:15] if exe_name else None  # /proc/<pid>/comm最多15个字符
+        self.step_source = step_source or (lambda: 0)
+        self.step_peaks = {}   # 时间步 -> (各rank合计RSS峰值, (单rank RSS峰值, 该rank))
+        self.last_total = None  # 最近一次采样的各rank合计RSS（MB）
+        self._ranks = {}       # pid -> rank
+        self._cpu = {}         # pid -> (上次采样时刻, 上次累计CPU秒数)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._start = time.monotonic()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _rank_pids(self):
+        pids = _descendants(self.root_pid)
+        if self.comm:
+            matched = [pid for pid in pids if (_read(f'/proc/{pid}/comm') or '').strip() == self.comm]
+            if matched:
+                return matched
+        # 没有指定或匹配不到可执行文件名时，取进程树的叶子进程
+        children = set()
+        for pid in pids:
+            stat = _read(f'/proc/{pid}/stat')
+            if stat:
+                children.add(int(stat[stat.rindex(')') + 2:].split()[1]))
+        return [pid for pid in pids if pid not in children]
+
+    def _sample_pid(self, pid, now):
+        stat = _read(f'/proc/{pid}/stat')
+        statm = _read(f'/proc/{pid}/statm')
+        status = _read(f'/proc/{pid}/status')
+        if not (stat and statm and status):
+            return None
+        fields = stat[stat.rindex(')') + 2:].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS  # utime + stime
+        last = self._cpu.get(pid)
+        self._cpu[pid] = (now, cpu_seconds)
+        cpu = (cpu_seconds - last[1]) / (now - last[0]) if last and now > last[0] else 0.0
+
+        ctx = 0
+        for line in status.splitlines():
+            if line.startswith(('voluntary_ctxt_switches', 'nonvoluntary_ctxt_switches')):
+                ctx += int(line.split()[1])
+        io = {}
+        for line in (_read(f'/proc/{pid}/io') or '').splitlines():
+            key, _, value = line.partition(':')
+            io[key] = int(value)
+
+        if pid not in self._ranks:
+            rank = _rank_of(pid)
+            self._ranks[pid] = rank if rank is not None else len(self._ranks)
+        return (self._ranks[pid], pid, int(statm.split()[1]) * PAGE_MB, cpu, ctx,
+                io.get('read_bytes', 0), io.get('write_bytes', 0))
+
+    def sample(self):
+        """采样一次，返回本次采到的rank数"""
+        now = time.monotonic()
+        step = self.step_source()
+        rows = [row for row in (self._sample_pid(pid, now) for pid in self._rank_pids()) if row]
+        capacity = len(self.buffer)
+        for row in rows:
+            self.buffer[self.count % capacity] = (now - self._start, step, *row)
+            self.count += 1
+        if rows:
+            total = sum(row[2] for row in rows)
+            rank_peak = max((row[2], row[0]) for row in rows)
+            old_total, old_peak = self.step_peaks.get(step, (0.0, (0.0, -1)))
+            self.step_peaks[step] = (max(total, old_total), max(rank_peak, old_peak))
+            self.last_total = total
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def samples(self):
+        """按时间顺序返回缓冲区中保留的样本"""
+        capacity = len(self.buffer)
+        if self.count <= capacity:
+            return self.buffer[:self.count].copy()
+        start = self.count % capacity
+        return np.concatenate([self.buffer[start:], self.buffer[:start]])
+
+    def total_rss_history(self):
+        """[(时刻, 各rank合计RSS MB)...]，同一次采样的rank合并为一个点"""
+        samples = self.samples()
+        if not samples.size:
+            return []
+        times, index = np.unique(samples['time'], return_inverse=True)
+        totals = np.bincount(index, weights=samples['rss_mb'])
+        return list(zip(times.tolist(), totals.tolist()))
+
+    def rank_summary(self):
+        """{rank: {峰值RSS, 平均CPU, 上下文切换, 读写字节}}"""
+        samples = self.samples()
+        summary = {}
+        for rank in np.unique(samples['rank']).tolist():
+            s = samples[samples['rank'] == rank]
+            summary[rank] = {
+                'peak_rss_mb': float(s['rss_mb'].max()),
+                'mean_cpu': float(s['cpu'][1:].mean()) if len(s) > 1 else 0.0,
+                'ctx_switches': int(s['ctx_switches'].max()),
+                'read_bytes': int(s['read_bytes'].max()),
+                'write_bytes': int(s['write_bytes'].max()),
+            }
+        return summary
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("使用方法: python proc_sampler.py <mpiexec的pid> [间隔秒数]")
+        sys.exit(1)
+    sampler = ProcessTreeSampler(int(sys.argv[1]), float(sys.argv[2]) if len(sys.argv) > 2 else 1.0)
+    try:
+        while os.path.exists(f'/proc/{sampler.root_pid}'):
+            sampler.sample()
+            time.sleep(sampler.interval)
+    except KeyboardInterrupt:
+        pass
+    for rank, info in sorted(sampler.rank_summary().items()):
+        print(f"rank {rank}: 峰值RSS {info['peak_rss_mb']:.1f} MB  平均CPU {info['mean_cpu']:.2f}  "
+              f"上下文切换 {info['ctx_switches']}  读 {info['read_bytes']} B  写 {info['write_bytes']} B")
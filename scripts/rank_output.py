@@ -0,0 +1,36 @@
+"""
+mpiexec多rank输出的标记与分离
+让mpiexec给每行加上rank前缀（MPICH/Intel MPI: -prepend-rank → "[3] ..."；
+Open MPI: --tag-output → "[1,3]<stdout>:..."），再按rank把交错的输出拆回各自的行流。
+"""
+
+import re
+import subprocess
+
+# 两种前缀格式：[rank] 文本 / [作业,rank]<stdout>:文本
+TAG = re.compile(r'^\[(?:\d+,)?(\d+)\](?:<std(?:out|err)>)?:? ?([^\n]*)$', re.MULTILINE)
+
+
+def rank_tag_args(mpiexec='mpiexec'):
+    """根据mpiexec的实现返回给输出加rank前缀的参数；无法识别时返回空列表"""
+    try:
+        result = subprocess.run([mpiexec, '--version'], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return []
+    version = result.stdout + result.stderr
+    if 'Open MPI' in version or 'OpenRTE' in version:
+        return ['--tag-output']
+    if 'HYDRA' in version or 'MPICH' in version or 'Intel' in version:
+        return ['-prepend-rank']
+    return []
+
+
+def split_by_rank(text):
+    """把带rank前缀的文本按rank拆分：{rank: 该rank的完整行文本（每行以换行结尾）}
+
+    没有前缀的行（mpiexec自身的提示等）被丢弃。各rank内部保持原有顺序。
+    """
+    lines = {}
+    for match in TAG.finditer(text):
+        lines.setdefault(int(match[1]), []).append(match[2])
+    return {rank: '\n'.join(rank_lines) + '\n' for rank, rank_lines in lines.items()}
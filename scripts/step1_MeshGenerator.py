@@ -1,7 +1,9 @@
 import os
 import re
+import json
+import hashlib
+import math
 import shutil
-import itertools
 from datetime import datetime
 
 # 基础配置
@@ -11,6 +13,14 @@ template_main = os.path.join(base_dir, 'NoClad3D_ThermalCreepFracture.i')
 template_sub = os.path.join(base_dir, 'NoClad3D_ThermalCreepFracture_Sub.i')
 output_dir = os.path.join(base_dir, 'parameter_studies')
 
+# 案例文件写出缓冲区大小（字节）
+WRITE_BUFFER_SIZE = 1 << 20
+
+# 增量生成：清单文件记录每个案例的编号与输入文件哈希，重复运行只改动变化的案例
+MANIFEST_NAME = '.study_manifest.json'
+# 为True时恢复旧行为：每次生成前清空整个输出目录（会删除已有计算结果！）
+clean_output_dir = False
+
 # Checkpoint配置，加入存档功能
 checkpoint_config = '''
   [my_checkpoint]
@@ -34,27 +44,130 @@ exclude_combinations = [
     ('Gf', 10, 'length_scale_paramete', 5e-5),  # 示例：排除另一个组合
 ]
 
-def should_exclude_combination(params):
-    """检查参数组合是否在排除列表中"""
-    for exclude_combo in exclude_combinations:
-        # 将排除组合转换为字典进行比较
-        exclude_dict = {}
-        for i in range(0, len(exclude_combo), 2):
-            param_name = exclude_combo[i]
-            param_value = exclude_combo[i+1]
-            exclude_dict[param_name] = param_value
-        
-        # 检查所有排除参数是否匹配
-        match = True
+def parse_exclude_rule(exclude_combo):
+    """将排除元组('参数', 值, ...)转换为字典"""
+    return {exclude_combo[i]: exclude_combo[i+1] for i in range(0, len(exclude_combo), 2)}
+
+class CombinationStream:
+    """惰性生成参数组合，按深度优先遍历并提前剪掉被排除的子树
+
+    排除规则按“最后约束的参数”及其取值建立索引：遍历到某一参数取某值时，
+    只需检查恰好在此处被完全确定的规则，命中即跳过整个子树，
+    因此内存占用与组合总数无关，第一个案例可立即产出。
+    """
+
+    def __init__(self, params_dict, exclude_rules=()):
+        self.keys = list(params_dict.keys())
+        self.values = [list(v) for v in params_dict.values()]
+        self.sizes = [len(v) for v in self.values]
+        # 每条规则编译为逐维约束：None表示不约束，否则为匹配的取值下标集合
+        self._rules = []
+        self._always_excluded = False
+        for combo in exclude_rules:
+            rule = self._compile_rule(parse_exclude_rule(combo))
+            if rule is None:
+                continue
+            if all(c is None for c in rule):
+                self._always_excluded = True
+            self._rules.append(rule)
+        # 索引：_index[维度][取值下标] -> [(规则在更浅维度上的约束), ...]
+        self._index = [dict() for _ in self.keys]
+        for rule in self._rules:
+            constrained = [d for d, c in enumerate(rule) if c is not None]
+            if not constrained:
+                continue
+            deepest = constrained[-1]
+            earlier = tuple((d, rule[d]) for d in constrained[:-1])
+            for j in rule[deepest]:
+                self._index[deepest].setdefault(j, []).append(earlier)
+        self._excluded_count = None
+
+    def _compile_rule(self, exclude_dict):
+        """返回逐维约束；规则不可能命中任何组合时返回None"""
+        rule = [None] * len(self.keys)
         for param_name, param_value in exclude_dict.items():
-            if param_name not in params or abs(params[param_name] - param_value) > 1e-10:
-                match = False
-                break
-        
-        if match:
-            return True
-    
-    return False
+            if param_name not in self.keys:
+                return None
+            d = self.keys.index(param_name)
+            matched = frozenset(j for j, v in enumerate(self.values[d])
+                                if abs(v - param_value) <= 1e-10)
+            if not matched:
+                return None
+            rule[d] = matched if rule[d] is None else rule[d] & matched
+            if not rule[d]:
+                return None
+        return rule
+
+    def _is_pruned(self, depth, idx):
+        """检查在depth处被完全确定的规则是否命中当前前缀"""
+        for earlier in self._index[depth].get(idx[depth], ()):
+            if all(idx[d] in allowed for d, allowed in earlier):
+                return True
+        return False
+
+    def __iter__(self):
+        if self._always_excluded:
+            return
+        n = len(self.keys)
+        if n == 0:
+            yield {}
+            return
+        idx = [-1] * n
+        depth = 0
+        while depth >= 0:
+            idx[depth] += 1
+            if idx[depth] >= self.sizes[depth]:
+                idx[depth] = -1
+                depth -= 1
+                continue
+            if self._is_pruned(depth, idx):
+                continue
+            if depth == n - 1:
+                yield {k: self.values[d][idx[d]] for d, k in enumerate(self.keys)}
+            else:
+                depth += 1
+
+    @property
+    def total_count(self):
+        """笛卡尔积总数"""
+        return math.prod(self.sizes)
+
+    @property
+    def excluded_count(self):
+        """被排除的组合数，按规则约束的并集解析计算，不逐个枚举"""
+        if self._excluded_count is None:
+            self._excluded_count = self._count_excluded()
+        return self._excluded_count
+
+    def _count_excluded(self):
+        n = len(self.keys)
+        suffix = [1] * (n + 1)
+        for d in range(n - 1, -1, -1):
+            suffix[d] = suffix[d + 1] * self.sizes[d]
+        last = [max((d for d, c in enumerate(rule) if c is not None), default=-1)
+                for rule in self._rules]
+        memo = {}
+
+        def count(depth, active):
+            # active：前缀已全部匹配的规则；若其中有规则已被完全确定，整个子树都被排除
+            if not active:
+                return 0
+            if any(last[r] < depth for r in active):
+                return suffix[depth]
+            key = (depth, active)
+            if key not in memo:
+                memo[key] = sum(
+                    count(depth + 1, frozenset(
+                        r for r in active
+                        if self._rules[r][depth] is None or j in self._rules[r][depth]))
+                    for j in range(self.sizes[depth])
+                )
+            return memo[key]
+
+        return count(0, frozenset(range(len(self._rules))))
+
+    def __len__(self):
+        return self.total_count - self.excluded_count
 
 def add_checkpoint_to_outputs(content):
     """在[Outputs]块中添加checkpoint配置"""
@@ -72,28 +185,19 @@ def add_checkpoint_to_outputs(content):
         content += f'\n[Outputs]{checkpoint_config}\n[]'
     return content
 
-def extract_end_time(template_file):
-    """从模板文件中提取end_time值"""
-    try:
-        with open(template_file, 'r') as f:
-            content = f.read()
-            match = re.search(r'end_time\s*=\s*([\d\.eE+-]+)', content)
-            if match:
-                return float(match.group(1))
-    except Exception as e:
-        print(f"警告：无法从模板文件中提取end_time: {str(e)}")
+def extract_end_time(content):
+    """从模板内容中提取end_time值"""
+    match = re.search(r'end_time\s*=\s*([\d\.eE+-]+)', content)
+    if match:
+        try:
+            return float(match.group(1))
+        except ValueError as e:
+            print(f"警告：无法从模板文件中提取end_time: {str(e)}")
     return None
 
 def generate_parameter_combinations(params_dict):
-    """生成所有参数的笛卡尔积组合，排除不可运行的组合"""
-    keys = params_dict.keys()
-    values = params_dict.values()
-    all_combinations = [dict(zip(keys, combo)) for combo in itertools.product(*values)]
-    
-    # 过滤掉排除列表中的组合
-    valid_combinations = [combo for combo in all_combinations if not should_exclude_combination(combo)]
-    
-    return valid_combinations
+    """生成所有参数的笛卡尔积组合（惰性），排除不可运行的组合"""
+    return CombinationStream(params_dict, exclude_combinations)
 
 def format_scientific(value):
     """将数值格式化为科学计数法字符串"""
@@ -106,49 +210,114 @@ def generate_case_name(params):
     return '_'.join([f"{k[:2]}{format_scientific(v).replace('.','_')}" 
                     for k, v in params.items()])
 
-def replace_parameters(content, params):
-    """动态替换所有参数"""
-    # 先处理常规参数
-    for param, value in params.items():
-        pattern = rf'(\s*){param}\s*=\s*[\d\.eE+-]+(.*?)(\n)'
-        replacement = f'\\1{param} = {format_scientific(value)}\\2\\3'
-        content = re.sub(pattern, replacement, content, flags=re.MULTILINE)
-    
-    # 特殊处理MultiApp的input_files参数
-    subapp_filename = f"sub_{generate_case_name(params)}.i"
-    content = re.sub(
-        r'(input_files\s*=\s*)\'\S+\.i\'',
-        f"\\1'{subapp_filename}'", 
-        content
-    )
-    return content
+class InputTemplate:
+    """一次性解析的输入文件模板
+
+    模板只读取、扫描一次，参数赋值行与MultiApp的input_files被预先切分为替换槽，
+    每个案例只需按槽位填值并一次拼接即可得到完整内容。
+    """
+
+    def __init__(self, template_file, param_names, replace_input_files=False, with_checkpoint=False):
+        self.template_file = template_file
+        with open(template_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        if with_checkpoint:
+            content = add_checkpoint_to_outputs(content)
+        self.end_time = extract_end_time(content)
+        self._parts, self._slots = self._tokenize(content, list(param_names), replace_input_files)
 
-def generate_header(params):
+    @staticmethod
+    def _tokenize(content, param_names, replace_input_files):
+        """将模板切分为固定文本与替换槽，槽位记录为(索引, 参数名)"""
+        alternatives = []
+        if param_names:
+            # 长名称优先，避免一个参数名是另一个参数名的后缀时被截断匹配
+            names = '|'.join(re.escape(p) for p in sorted(param_names, key=len, reverse=True))
+            alternatives.append(rf'(?P<pre>\s*)(?P<name>{names})\s*=\s*[\d\.eE+-]+(?P<post>.*?\n)')
+        if replace_input_files:
+            alternatives.append(r"(?P<inpre>input_files\s*=\s*)'\S+\.i'")
+        if not alternatives:
+            return [content], []
+
+        parts, slots = [], []
+        literal = []
+        pos = 0
+        for match in re.finditer('|'.join(alternatives), content, re.MULTILINE):
+            literal.append(content[pos:match.start()])
+            if param_names and match.group('name') is not None:
+                name = match.group('name')
+                literal.append(f"{match.group('pre')}{name} = ")
+                suffix = match.group('post')
+            else:
+                name = None  # input_files槽
+                literal.append(f"{match.group('inpre')}'")
+                suffix = "'"
+            parts.append(''.join(literal))
+            slots.append((len(parts), name))
+            parts.append(None)
+            literal = [suffix]
+            pos = match.end()
+        literal.append(content[pos:])
+        parts.append(''.join(literal))
+        return parts, slots
+
+    def render(self, params, subapp_filename=None):
+        """按参数填充替换槽，线性拼接出完整内容"""
+        parts = self._parts.copy()
+        values = {k: format_scientific(v) for k, v in params.items()}
+        for idx, name in self._slots:
+            parts[idx] = values[name] if name is not None else subapp_filename
+        return ''.join(parts)
+
+
+def generate_header(params, end_time=None):
     """生成包含参数信息的注释头"""
     header = "# === 参数研究案例 ===\n"
-    
-    # 从模板文件中提取end_time
-    end_time = extract_end_time(template_main)
     if end_time is not None:
         header += f"# end_time = {format_scientific(end_time)}\n"
-    
+
     for k, v in params.items():
         header += f"# {k}: {format_scientific(v)}\n"
     header += f"# 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
     return header
 
-def rename_and_cleanup_files(case_dir, case_name, is_multiapp):
-    """重命名文件并清理不需要的文件"""
-    main_file = os.path.join(case_dir, f"main_{case_name}.i")
-    if not is_multiapp:
-        # 在单程序模式下，将main_前缀的文件重命名为不带前缀的文件
-        new_file = os.path.join(case_dir, f"{case_name}.i")
-        if os.path.exists(main_file):
-            os.rename(main_file, new_file)
-        # 删除可能存在的sub文件
-        sub_file = os.path.join(case_dir, f"sub_{case_name}.i")
-        if os.path.exists(sub_file):
-            os.remove(sub_file)
+def write_input_file(path, header, content):
+    """以大缓冲区一次性写出输入文件"""
+    with open(path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(header)
+        f.write(content)
+
+def content_hash(text):
+    """计算渲染后输入内容的哈希（不含带时间戳的注释头）"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def load_manifest(path):
+    """读取案例清单；不存在或损坏时返回空清单"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == 1:
+            return manifest
+        print(f"警告：清单版本不兼容，将重新建立: {path}")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"警告：无法读取清单，将重新建立: {str(e)}")
+    return {'version': 1, 'next_id': 1, 'ids': {}, 'cases': {}}
+
+def save_manifest(path, manifest):
+    """先写临时文件再替换，避免中断时留下半个清单"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def remove_stale_inputs(case_dir, case_name, keep):
+    """删除切换单/多程序模式后遗留的旧输入文件"""
+    for filename in (f"main_{case_name}.i", f"sub_{case_name}.i", f"{case_name}.i"):
+        path = os.path.join(case_dir, filename)
+        if filename not in keep and os.path.exists(path):
+            os.remove(path)
 
 def generate_study_cases():
     # 校验主程序模板文件
@@ -158,74 +327,106 @@ def generate_study_cases():
     # 判断是否为多程序模式 - 修改判断逻辑
     is_multiapp = os.path.exists(template_sub) and os.path.abspath(template_main) != os.path.abspath(template_sub)
 
-    # 清理并创建输出目录
-    if os.path.exists(output_dir):
+    # 创建输出目录（仅在显式要求时清空）
+    if clean_output_dir and os.path.exists(output_dir):
         shutil.rmtree(output_dir)
     os.makedirs(output_dir, exist_ok=True)
 
-    # 生成所有参数组合（排除不可运行的组合）
+    # 读取清单：编号按案例名永久分配，新增或排除组合不会导致其他案例编号移位
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    case_ids = manifest['ids']
+    old_cases = manifest['cases']
+    new_cases = {}
+    stats = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+
+    # 生成所有参数组合（排除不可运行的组合），边生成边写出
     all_params = generate_parameter_combinations(parameter_matrix)
-    
+
     # 打印排除的组合信息
-    total_combinations = len(list(itertools.product(*parameter_matrix.values())))
-    excluded_count = total_combinations - len(all_params)
-    print(f"\n已排除 {excluded_count} 个已知无法运行的参数组合")
+    print(f"\n已排除 {all_params.excluded_count} 个已知无法运行的参数组合")
     print("排除的组合：")
     for combo in exclude_combinations:
         params_str = ", ".join(f"{combo[i]}={combo[i+1]}" for i in range(0, len(combo), 2))
         print(f"  - {params_str}")
     print()
 
-    for idx, params in enumerate(all_params, 1):
+    # 模板只解析一次，之后每个案例只做填槽拼接
+    param_names = list(parameter_matrix.keys())
+    main_template = InputTemplate(template_main, param_names,
+                                  replace_input_files=is_multiapp, with_checkpoint=True)
+    sub_template = InputTemplate(template_sub, param_names, replace_input_files=True) if is_multiapp else None
+
+    for params in all_params:
         case_name = generate_case_name(params)
-        case_dir = os.path.join(output_dir, f"case_{idx:03d}_{case_name}")
-        os.makedirs(case_dir, exist_ok=True)
+        if case_name not in case_ids:
+            case_ids[case_name] = manifest['next_id']
+            manifest['next_id'] += 1
+        idx = case_ids[case_name]
+        case_dir_name = f"case_{idx:03d}_{case_name}"
+        case_dir = os.path.join(output_dir, case_dir_name)
 
-        # 处理主程序文件
-        with open(template_main, 'r') as f:
-            main_content = generate_header(params) + f.read()
-        
-        # 添加checkpoint配置
-        main_content = add_checkpoint_to_outputs(main_content)
-        
-        # 如果是多程序模式，需要替换input_files参数
         if is_multiapp:
-            main_content = replace_parameters(main_content, params)
+            # 多程序模式：主程序的input_files指向本案例的子程序文件
+            subapp_filename = f"sub_{case_name}.i"
+            files = {
+                f"main_{case_name}.i": main_template.render(params, subapp_filename),
+                subapp_filename: sub_template.render(params, subapp_filename),
+            }
         else:
-            # 单程序模式不需要替换input_files参数
-            for param, value in params.items():
-                pattern = rf'(\s*){param}\s*=\s*[\d\.eE+-]+(.*?)(\n)'
-                replacement = f'\\1{param} = {format_scientific(value)}\\2\\3'
-                main_content = re.sub(pattern, replacement, main_content, flags=re.MULTILINE)
-                
-        main_output = os.path.join(case_dir, f"main_{case_name}.i")
-        with open(main_output, 'w') as f:
-            f.write(main_content)
-
-        # 如果存在子程序文件，则处理子程序文件
-        if is_multiapp:
-            with open(template_sub, 'r') as f:
-                sub_content = generate_header(params) + f.read()
-            sub_content = replace_parameters(sub_content, params)
-            sub_output = os.path.join(case_dir, f"sub_{case_name}.i")
-            with open(sub_output, 'w') as f:
-                f.write(sub_content)
+            # 单程序模式直接写出不带前缀的文件
+            files = {f"{case_name}.i": main_template.render(params)}
+        contents = list(files.values())
+        entry = {
+            'id': idx,
+            'dir': case_dir_name,
+            'params': params,
+            'main_hash': content_hash(contents[0]),
+            'sub_hash': content_hash(contents[1]) if is_multiapp else None,
+        }
+        new_cases[case_name] = entry
 
-        # 重命名和清理文件
-        rename_and_cleanup_files(case_dir, case_name, is_multiapp)
+        old = old_cases.get(case_name)
+        if (old is not None and os.path.isdir(case_dir)
+                and old['main_hash'] == entry['main_hash'] and old['sub_hash'] == entry['sub_hash']):
+            stats['unchanged'] += 1
+            continue
 
-        print(f"生成案例 {idx:03d}: {case_name}")
+        # 只重写输入文件，案例目录中的其他结果文件保持不动
+        os.makedirs(case_dir, exist_ok=True)
+        remove_stale_inputs(case_dir, case_name, files)
+        header = generate_header(params, main_template.end_time)
+        for filename, content in files.items():
+            write_input_file(os.path.join(case_dir, filename), header, content)
+
+        status = '更新' if old is not None else '新增'
+        stats['updated' if old is not None else 'added'] += 1
+        print(f"{status}案例 {idx:03d}: {case_name}")
         print(f"  路径: {case_dir}")
         if is_multiapp:
             print("  模式: MultiApp")
         else:
             print("  模式: SingleApp")
 
+    # 删除已不在参数矩阵中（或新被排除）的案例
+    for case_name, old in old_cases.items():
+        if case_name not in new_cases:
+            shutil.rmtree(os.path.join(output_dir, old['dir']), ignore_errors=True)
+            stats['removed'] += 1
+            print(f"删除案例 {old['id']:03d}: {case_name}")
+
+    manifest['cases'] = new_cases
+    save_manifest(manifest_path, manifest)
+    print(f"\n新增 {stats['added']} 个，更新 {stats['updated']} 个，"
+          f"未变 {stats['unchanged']} 个，删除 {stats['removed']} 个案例")
+
+    return len(all_params)
+
 if __name__ == '__main__':
     try:
-        generate_study_cases()
+        case_count = generate_study_cases()
         print(f"\n所有案例已成功生成至: {os.path.abspath(output_dir)}")
-        print(f"总案例数: {len(generate_parameter_combinations(parameter_matrix))}")
+        print(f"总案例数: {case_count}")
     except Exception as e:
         print(f"\n错误发生: {str(e)}")
         print("故障排查建议:")
@@ -0,0 +1,618 @@
+"""
+参数研究案例批量运行调度器
+配合step1_MeshGenerator.py使用：扫描生成的case_NNN_*目录，
+在给定的总核数预算内按(进程数 × 线程数)打包并行运行各案例，
+支持单案例超时、失败重试，以及可中断续跑的持久化队列状态。
+开启--resume后，被杀死、超时或崩溃的案例会以--recover从最新检查点续算，
+并可用--chunk-time把长时间计算切分为墙钟时间有限的若干段。
+开启--cache后，输入内容与求解器完全相同的案例直接从共享结果缓存链接输出，不再重复计算。
+开启--abort-diverging后，定期检查各案例日志的收敛健康度，明显发散的案例提前终止并记为失败（不重试）。
+
+用法：python step2_CaseRunner.py [案例目录] --cores 80 --procs 4 --threads 1
+测试时可用 --mpiexec '' --exe ./fake_solver.sh 以替身程序代替fuel_rods-opt
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import signal
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from convergence_health import DivergencePolicy, LogHealthWatcher
+
+# 基础配置（可被命令行参数覆盖）
+study_dir = '/home/yp/projects/raccoon/FuelFracture/ScriptTesting/parameter_studies'
+moose_exe = '/home/yp/projects/fuel_rods/fuel_rods-opt'
+mpiexec = 'mpiexec'
+
+TOTAL_CORES = os.cpu_count() or 1   # 本机可用于计算的总核数
+PROCS_PER_CASE = 4                  # 每个案例的MPI进程数
+THREADS_PER_CASE = 1                # 每个进程的线程数
+CASE_TIMEOUT = 3 * 24 * 3600        # 单案例墙钟时间上限（秒）
+MAX_RETRIES = 1                     # 失败或超时后的重试次数
+POLL_INTERVAL = 0.5                 # 调度轮询间隔（秒）
+KILL_GRACE = 10                     # 超时后SIGTERM到SIGKILL的等待时间（秒）
+
+# 检查点续算配置（与step1中注入的Checkpoint块配合使用）
+MAX_RESUMES = 50                    # 单案例最多续算次数（每次必须有新的检查点产生）
+CHUNK_WALL_TIME = None              # 每段运行的墙钟时间（秒），None表示不分段
+CHECKPOINT_GRACE = 120              # 分段结束时发出SIGUSR1后等待写出检查点的时间（秒）
+
+# 结果缓存配置：键为规范化后的主/子输入内容、顶层${}参数与求解器指纹
+CACHE_DIR = None                    # 共享缓存目录，None表示不启用
+CACHE_MAX_BYTES = 200 * 1024**3     # 缓存总大小上限，超出后按最近最少使用淘汰
+CACHED_OUTPUT_PATTERN = re.compile(r'\.(csv|e|e-s\d+|log)$')  # 需要缓存的输出文件（案例目录下的RUN_LOG_NAME除外）
+FICLONE = 0x40049409                # Linux的reflink ioctl（btrfs/XFS等支持写时复制的文件系统）
+
+# 提前终止明显发散的案例（判定条件见convergence_health.DivergencePolicy）
+HEALTH_CHECK_INTERVAL = 10          # 检查案例日志收敛健康度的间隔（秒）
+
+# 单独指定某些案例的资源，键为案例目录名前缀，例如 {'case_003': (8, 2)}
+case_resources = {}
+
+QUEUE_STATE_NAME = '.run_queue.json'
+RUN_LOG_NAME = 'run.log'
+
+CASE_DIR_PATTERN = re.compile(r'^case_(\d+)_')
+
+
+def find_main_input(case_dir):
+    """定位案例的主输入文件：多程序模式为main_*.i，单程序模式为唯一的非sub_*.i"""
+    inputs = sorted(f for f in os.listdir(case_dir) if f.endswith('.i'))
+    main_inputs = [f for f in inputs if f.startswith('main_')]
+    if main_inputs:
+        return main_inputs[0]
+    others = [f for f in inputs if not f.startswith('sub_')]
+    return others[0] if others else None
+
+
+def hash_inputs(case_dir):
+    """对案例目录中全部.i文件计算哈希，用于判断已完成案例的输入是否被重新生成"""
+    h = hashlib.sha256()
+    for name in sorted(f for f in os.listdir(case_dir) if f.endswith('.i')):
+        h.update(name.encode('utf-8'))
+        with open(os.path.join(case_dir, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def latest_checkpoint(case_dir):
+    """返回案例目录下最新检查点文件的(修改时间, 路径)，没有检查点时返回None
+
+    MOOSE的Checkpoint输出写在以_cp结尾的目录中，--recover会自动选用其中最新的一个。
+    """
+    latest = None
+    for dirpath, dirnames, filenames in os.walk(case_dir):
+        if not dirpath.endswith('_cp'):
+            continue
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue  # 检查点正在被轮换删除
+            if latest is None or mtime > latest[0]:
+                latest = (mtime, path)
+    return latest
+
+
+def strip_comment(line):
+    """去掉不在引号内的#注释"""
+    quote = None
+    for i, ch in enumerate(line):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in '\'"':
+            quote = ch
+        elif ch == '#':
+            return line[:i]
+    return line
+
+
+def normalize_input(text):
+    """规范化输入文件内容：去掉注释（包括带生成时间的注释头）、空行与行尾空白，
+    并把MultiApp的input_files替换为占位符，使不同研究中同一参数点得到相同的键"""
+    lines = []
+    for line in text.splitlines():
+        line = strip_comment(line).rstrip()
+        if line:
+            lines.append(re.sub(r"(input_files\s*=\s*)'\S+\.i'", r"\1'<sub>'", line))
+    return '\n'.join(lines)
+
+
+def top_level_parameters(text):
+    """提取块外的顶层变量赋值（即${}引用的参数）"""
+    params = {}
+    depth = 0
+    for line in text.splitlines():
+        stripped = strip_comment(line).strip()
+        if stripped.startswith('['):
+            depth += -1 if stripped in ('[]', '[../]') else 1
+        elif depth == 0 and '=' in stripped:
+            name, value = stripped.split('=', 1)
+            params[name.strip()] = value.strip()
+    return params
+
+
+def clone_file(src, dst):
+    """把src复制为可写的dst：文件系统支持时用reflink（共享数据块、写时复制），否则普通复制；保留修改时间"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            if fcntl is None:
+                raise OSError
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            shutil.copyfileobj(fsrc, fdst, 1 << 20)
+    st = os.stat(src)
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+class ResultCache:
+    """按输入内容寻址的共享结果缓存
+
+    每个条目是 objects/<键前两位>/<键>/ 目录，内含输出文件副本与meta.json。
+    命中时把文件复制（支持时为reflink）到案例目录，案例中的文件与缓存互不影响；目录修改时间即最近使用时间，
+    总大小超过上限时按最近最少使用淘汰。
+    """
+
+    def __init__(self, root, max_bytes=CACHE_MAX_BYTES):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._exe_fingerprints = {}
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+
+    def exe_fingerprint(self, exe):
+        """求解器可执行文件的内容哈希，按(大小, 修改时间)在进程内缓存"""
+        st = os.stat(exe)
+        stamp = (exe, st.st_size, st.st_mtime_ns)
+        if stamp not in self._exe_fingerprints:
+            h = hashlib.sha256()
+            with open(exe, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+            self._exe_fingerprints[stamp] = h.hexdigest()
+        return self._exe_fingerprints[stamp]
+
+    def key(self, case_dir, exe):
+        """计算案例的缓存键"""
+        main_input = find_main_input(case_dir)
+        material = {'exe': self.exe_fingerprint(exe), 'params': {}}
+        for name in sorted(f for f in os.listdir(case_dir) if f.endswith('.i')):
+            with open(os.path.join(case_dir, name), 'r', encoding='utf-8') as f:
+                text = f.read()
+            role = 'main' if name == main_input else 'sub'
+            material[role] = normalize_input(text)
+            material['params'][role] = sorted(top_level_parameters(text).items())
+        blob = json.dumps(material, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(blob).hexdigest()
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, 'objects', key[:2], key)
+
+    def restore(self, key, case_dir):
+        """命中时把缓存的输出复制到案例目录，返回复制的相对路径列表；未命中返回None"""
+        entry_dir = self.entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            os.utime(entry_dir)  # 记录最近使用时间
+        except (OSError, ValueError):
+            return None
+        restored = []
+        for rel in meta['files']:
+            if rel == RUN_LOG_NAME:
+                continue  # 旧版本写入的缓存条目可能包含运行器日志
+            src = os.path.join(entry_dir, 'files', rel)
+            dst = os.path.join(case_dir, rel)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if os.path.lexists(dst):
+                os.remove(dst)
+            # 不用硬链接：缓存文件只读，且与案例共用inode时原地修改输出会破坏缓存
+            clone_file(src, dst)
+            restored.append(rel)
+        return restored
+
+    def store(self, key, case_dir, case_name):
+        """把完成案例的输出复制进缓存（先写临时目录再原子改名）"""
+        entry_dir = self.entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+        files = []
+        for dirpath, dirnames, filenames in os.walk(case_dir):
+            dirnames[:] = [d for d in dirnames if not d.endswith('_cp')]  # 检查点不缓存
+            for filename in filenames:
+                rel = os.path.relpath(os.path.join(dirpath, filename), case_dir)
+                # 运行器自己的日志记录的是原案例的运行过程，不属于求解器输出
+                if CACHED_OUTPUT_PATTERN.search(filename) and rel != RUN_LOG_NAME:
+                    files.append(rel)
+        tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+        size = 0
+        for rel in files:
+            dst = os.path.join(tmp_dir, 'files', rel)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            # 复制而非硬链接：求解器重跑时会截断重写输出文件，不能与缓存共用inode
+            shutil.copy2(os.path.join(case_dir, rel), dst)
+            os.chmod(dst, 0o444)
+            size += os.path.getsize(dst)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'case': case_name, 'files': files, 'size': size,
+                       'stored': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, f, ensure_ascii=False)
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # 其他调度器已写入同一条目
+        self.evict()
+
+    def evict(self):
+        """总大小超出上限时，按最近使用时间从旧到新删除条目"""
+        entries = []
+        total = 0
+        objects_dir = os.path.join(self.root, 'objects')
+        for prefix in os.listdir(objects_dir):
+            for key in os.listdir(os.path.join(objects_dir, prefix)):
+                entry_dir = os.path.join(objects_dir, prefix, key)
+                try:
+                    with open(os.path.join(entry_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                        size = json.load(f)['size']
+                    entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+                except (OSError, ValueError, KeyError):
+                    continue  # 正在写入的临时目录或损坏条目
+                total += size
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+
+def discover_cases(root):
+    """按编号顺序列出所有case_NNN_*目录"""
+    cases = []
+    for name in os.listdir(root):
+        match = CASE_DIR_PATTERN.match(name)
+        if match and os.path.isdir(os.path.join(root, name)):
+            cases.append((int(match.group(1)), name))
+    return [name for _, name in sorted(cases)]
+
+
+class CaseScheduler:
+    """在核数预算内并行运行案例的本地调度器"""
+
+    def __init__(self, root, total_cores=TOTAL_CORES, procs=PROCS_PER_CASE, threads=THREADS_PER_CASE,
+                 timeout=CASE_TIMEOUT, max_retries=MAX_RETRIES, exe=None, launcher=None,
+                 extra_args=(), resume=False, chunk_time=CHUNK_WALL_TIME, max_resumes=MAX_RESUMES,
+                 cache=None, policy=None):
+        self.root = os.path.abspath(root)
+        self.total_cores = total_cores
+        self.procs = procs
+        self.threads = threads
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.exe = os.path.abspath(exe or moose_exe)
+        self.launcher = mpiexec if launcher is None else launcher
+        self.extra_args = list(extra_args)
+        self.resume = resume
+        self.chunk_time = chunk_time
+        self.max_resumes = max_resumes
+        self.cache = cache
+        self.policy = policy  # 提前终止策略，None表示不检查
+        self.state_path = os.path.join(self.root, QUEUE_STATE_NAME)
+        self.state = {}
+        # 案例名 -> {'process', 'log', 'start', 'cores', 'killed_at', 'chunk_signal_at', 'chunked',
+        #           'health', 'checked_at', 'aborted'}
+        self.running = {}
+
+    # ---------- 队列状态 ----------
+
+    def load_state(self, retry_failed=False):
+        """读取持久化队列，并与当前目录中的案例同步"""
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+
+        cases = discover_cases(self.root)
+        for name in list(self.state):
+            if name not in cases:
+                del self.state[name]  # 案例已被生成器删除
+
+        for name in cases:
+            case_dir = os.path.join(self.root, name)
+            entry = self.state.setdefault(name, {'status': 'pending', 'attempts': 0})
+            input_hash = hash_inputs(case_dir)
+            if entry.get('input_hash') != input_hash:
+                # 新案例或输入文件已被重新生成：需要（重新）运行
+                entry.update(status='pending', attempts=0, resumes=0, input_hash=input_hash,
+                             run_epoch=None, cache_key=None)
+            elif entry['status'] == 'running':
+                # 上次调度器被中断时仍在运行的案例
+                entry['status'] = 'pending'
+            elif retry_failed and entry['status'] in ('failed', 'timeout'):
+                entry.update(status='pending', attempts=0, resumes=0)
+            entry['procs'], entry['threads'] = self.resources_for(name)
+        self.save_state()
+
+    def save_state(self):
+        """先写临时文件再替换，保证队列状态文件始终完整"""
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def resources_for(self, name):
+        """返回案例的(进程数, 线程数)"""
+        for prefix, resources in case_resources.items():
+            if name.startswith(prefix):
+                return tuple(resources)
+        return self.procs, self.threads
+
+    # ---------- 进程管理 ----------
+
+    def usable_checkpoint(self, name):
+        """返回当前输入版本运行后写出的最新检查点；旧输入留下的检查点不可用于续算"""
+        entry = self.state[name]
+        checkpoint = latest_checkpoint(os.path.join(self.root, name))
+        if checkpoint is None or not entry.get('run_epoch') or checkpoint[0] < entry['run_epoch']:
+            return None
+        return checkpoint
+
+    def build_command(self, name):
+        """构造运行命令；launcher为空时直接运行可执行文件（用于替身程序测试）"""
+        entry = self.state[name]
+        input_file = find_main_input(os.path.join(self.root, name))
+        cmd = [self.exe, '-i', input_file, f"--n-threads={entry['threads']}"] + self.extra_args
+        if self.resume and self.usable_checkpoint(name) is not None:
+            cmd.append('--recover')
+        if self.launcher:
+            cmd = [self.launcher, '-n', str(entry['procs'])] + cmd
+        return cmd
+
+    def launch(self, name):
+        """启动案例进程，输出重定向到案例目录下的日志文件"""
+        entry = self.state[name]
+        case_dir = os.path.join(self.root, name)
+        if not entry.get('run_epoch'):
+            entry['run_epoch'] = time.time()  # 当前输入版本的首次运行时间
+        for rel in entry.pop('cached_files', []):
+            # 删除从缓存恢复的旧输出，避免与本次运行的输出混在一起
+            path = os.path.join(case_dir, rel)
+            if os.path.lexists(path):
+                os.remove(path)
+        cmd = self.build_command(name)
+        mode = '续算' if '--recover' in cmd else '运行'
+        log = open(os.path.join(case_dir, RUN_LOG_NAME), 'a', encoding='utf-8')
+        log.write(f"\n# === 第{entry['attempts'] + 1}次{mode} {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n")
+        log.write(f"# {' '.join(cmd)}\n")
+        log.flush()
+        # 只分析本次运行新写入的日志
+        health = LogHealthWatcher(log.name, log.tell()) if self.policy else None
+        env = dict(os.environ, OMP_NUM_THREADS=str(entry['threads']))
+        # 独立进程组，超时时可连同mpiexec的全部子进程一起终止
+        process = subprocess.Popen(cmd, cwd=case_dir, stdout=log, stderr=subprocess.STDOUT,
+                                   env=env, start_new_session=True)
+        entry.pop('abort_reason', None)
+        entry.update(status='running', attempts=entry['attempts'] + 1,
+                     started=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        checkpoint = self.usable_checkpoint(name)
+        entry['checkpoint_at_launch'] = checkpoint[0] if checkpoint else None
+        self.running[name] = {'process': process, 'log': log, 'start': time.time(),
+                              'cores': entry['procs'] * entry['threads'], 'killed_at': None,
+                              'chunk_signal_at': None, 'chunked': False,
+                              'health': health, 'checked_at': time.time(), 'aborted': None}
+        print(f"启动 {name} (进程: {entry['procs']}, 线程: {entry['threads']}, 第{entry['attempts']}次{mode})")
+        self.save_state()
+
+    def kill(self, name, sig=signal.SIGTERM):
+        """向案例的整个进程组发送信号"""
+        try:
+            os.killpg(self.running[name]['process'].pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def made_progress(self, name):
+        """本次运行期间是否写出了新的检查点"""
+        checkpoint = self.usable_checkpoint(name)
+        before = self.state[name].get('checkpoint_at_launch')
+        return checkpoint is not None and (before is None or checkpoint[0] > before)
+
+    def finish(self, name, returncode, timed_out=False):
+        """记录案例结束状态，并决定是否续算或重新排队重试"""
+        job = self.running.pop(name)
+        job['log'].close()
+        entry = self.state[name]
+        entry.update(returncode=returncode, elapsed=round(time.time() - job['start'], 1),
+                     finished=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        if job['chunk_signal_at'] is not None and returncode != 0:
+            job['chunked'] = True  # 收到SIGUSR1后自行退出同样视为分段结束
+        if job['chunked']:
+            timed_out = False  # 分段结束是主动停止，不算超时
+        if job['aborted']:
+            # 明显发散：重试或续算也只会重复同样的过程
+            entry['status'] = 'failed'
+            entry['abort_reason'] = job['aborted']
+            timed_out = False
+        elif returncode == 0 and not job['chunked']:
+            entry['status'] = 'done'
+            if self.cache is not None and entry.get('cache_key'):
+                self.cache.store(entry['cache_key'], os.path.join(self.root, name), name)
+        elif (self.resume and entry.get('resumes', 0) < self.max_resumes
+              and self.made_progress(name)):
+            # 有新检查点：从检查点续算，不消耗重试次数
+            entry['resumes'] = entry.get('resumes', 0) + 1
+            entry['attempts'] -= 1
+            entry['status'] = 'pending'
+        elif entry['attempts'] <= self.max_retries:
+            entry['status'] = 'pending'
+        else:
+            entry['status'] = 'timeout' if timed_out else 'failed'
+        reason = (f"提前终止（{job['aborted']}）" if job['aborted'] else '分段结束' if job['chunked']
+                  else '超时' if timed_out else f'返回码 {returncode}')
+        print(f"结束 {name}: {reason}"
+              f"，耗时 {entry['elapsed']:.1f} 秒 -> {entry['status']}")
+        self.save_state()
+
+    def poll(self):
+        """检查运行中的案例：回收已结束的进程，终止超时的进程组"""
+        now = time.time()
+        for name, job in list(self.running.items()):
+            returncode = job['process'].poll()
+            if returncode is not None:
+                self.finish(name, returncode, timed_out=job['killed_at'] is not None)
+            elif (job['health'] and job['killed_at'] is None
+                  and now - job['checked_at'] > HEALTH_CHECK_INTERVAL and self.check_health(name)):
+                self.kill(name, signal.SIGTERM)
+                job['killed_at'] = now
+            elif job['killed_at'] is None and now - job['start'] > self.timeout:
+                self.kill(name, signal.SIGTERM)
+                job['killed_at'] = now
+            elif (self.chunk_time and job['killed_at'] is None and job['chunk_signal_at'] is None
+                  and now - job['start'] > self.chunk_time):
+                # 分段结束：SIGUSR1让MOOSE立即写出检查点，等待片刻后停止并排队续算
+                self.kill(name, signal.SIGUSR1)
+                job['chunk_signal_at'] = now
+            elif (job['chunk_signal_at'] is not None and job['killed_at'] is None
+                  and now - job['chunk_signal_at'] > CHECKPOINT_GRACE):
+                self.kill(name, signal.SIGTERM)
+                job['killed_at'] = now
+                job['chunked'] = True
+            elif job['killed_at'] is not None and now - job['killed_at'] > KILL_GRACE:
+                self.kill(name, signal.SIGKILL)
+
+    def check_health(self, name):
+        """读取案例日志的新增部分并检查提前终止策略，判定发散时记录原因并返回True"""
+        job = self.running[name]
+        job['checked_at'] = time.time()
+        watcher = job['health']
+        try:
+            if not watcher.update():
+                return False
+            reason = self.policy.check(watcher.converged, watcher.counts, watcher.rates)
+        except Exception as e:
+            # 监控本身出错不代表算例发散：停止监控该案例，既不中断调度循环也不终止仿真
+            print(f"收敛健康度检查失败，停止监控 {name}: {e}")
+            job['health'] = None
+            return False
+        if reason:
+            job['aborted'] = reason
+            print(f"提前终止 {name}: {reason}")
+        return bool(reason)
+
+    # ---------- 调度主循环 ----------
+
+    def free_cores(self):
+        return self.total_cores - sum(job['cores'] for job in self.running.values())
+
+    def pending(self):
+        return [name for name, entry in self.state.items() if entry['status'] == 'pending']
+
+    def fill(self):
+        """按顺序启动能放进剩余核数的案例（大案例放不下时允许后面的小案例回填）"""
+        free = self.free_cores()
+        for name in self.pending():
+            entry = self.state[name]
+            cores = entry['procs'] * entry['threads']
+            if cores > self.total_cores:
+                print(f"跳过 {name}: 需要 {cores} 核，超过总预算 {self.total_cores} 核")
+                entry['status'] = 'failed'
+                self.save_state()
+                continue
+            if cores <= free:
+                self.launch(name)
+                free -= cores
+
+    def restore_cached(self):
+        """对待运行案例查询结果缓存，命中的案例直接链接输出并标记完成"""
+        for name in self.pending():
+            entry = self.state[name]
+            case_dir = os.path.join(self.root, name)
+            if not entry.get('cache_key'):
+                entry['cache_key'] = self.cache.key(case_dir, self.exe)
+            restored = self.cache.restore(entry['cache_key'], case_dir)
+            if restored is not None:
+                entry.update(status='done', cached_files=restored,
+                             finished=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                print(f"缓存命中 {name}: 复制 {len(restored)} 个输出文件")
+        self.save_state()
+
+    def run(self):
+        """运行直到队列中没有待运行和运行中的案例"""
+        if self.cache is not None:
+            self.restore_cached()
+        try:
+            while self.running or self.pending():
+                self.fill()
+                time.sleep(POLL_INTERVAL)
+                self.poll()
+        except KeyboardInterrupt:
+            print("\n收到中断，终止运行中的案例并保存队列状态...")
+            for name in list(self.running):
+                self.kill(name, signal.SIGKILL)
+                self.running[name]['process'].wait()
+                self.running.pop(name)['log'].close()
+                self.state[name]['status'] = 'pending'
+            self.save_state()
+            raise
+        return self.summary()
+
+    def summary(self):
+        counts = {}
+        for entry in self.state.values():
+            counts[entry['status']] = counts.get(entry['status'], 0) + 1
+        return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='在核数预算内并行运行参数研究案例')
+    parser.add_argument('study_dir', nargs='?', default=study_dir, help='step1生成的案例根目录')
+    parser.add_argument('--cores', type=int, default=TOTAL_CORES, help='总核数预算')
+    parser.add_argument('--procs', type=int, default=PROCS_PER_CASE, help='每个案例的MPI进程数')
+    parser.add_argument('--threads', type=int, default=THREADS_PER_CASE, help='每个进程的线程数')
+    parser.add_argument('--timeout', type=float, default=CASE_TIMEOUT, help='单案例超时（秒）')
+    parser.add_argument('--retries', type=int, default=MAX_RETRIES, help='失败后的重试次数')
+    parser.add_argument('--exe', default=moose_exe, help='求解器可执行文件')
+    parser.add_argument('--mpiexec', default=mpiexec, help="MPI启动器，传入''则直接运行可执行文件")
+    parser.add_argument('--retry-failed', action='store_true', help='重新运行之前失败或超时的案例')
+    parser.add_argument('--resume', action='store_true', help='被杀死、超时或崩溃的案例从最新检查点续算')
+    parser.add_argument('--chunk-time', type=float, default=CHUNK_WALL_TIME,
+                        help='每段运行的墙钟时间（秒），到时写检查点并续算（需配合--resume）')
+    parser.add_argument('--max-resumes', type=int, default=MAX_RESUMES, help='单案例最多续算次数')
+    parser.add_argument('--cache', default=CACHE_DIR, help='共享结果缓存目录，输入相同的案例直接复用结果')
+    parser.add_argument('--abort-diverging', action='store_true',
+                        help='提前终止明显发散（连续不收敛、反复回退或残差停滞）的案例')
+    parser.add_argument('--cache-size', type=float, default=CACHE_MAX_BYTES / 1024**3,
+                        help='结果缓存大小上限（GB）')
+    args = parser.parse_args(argv)
+
+    if args.chunk_time and not args.resume:
+        parser.error('--chunk-time 需要同时开启 --resume')
+    if not os.path.isdir(args.study_dir):
+        raise FileNotFoundError(f"案例目录不存在: {args.study_dir}")
+
+    cache = ResultCache(args.cache, int(args.cache_size * 1024**3)) if args.cache else None
+    scheduler = CaseScheduler(args.study_dir, total_cores=args.cores, procs=args.procs,
+                              threads=args.threads, timeout=args.timeout, max_retries=args.retries,
+                              exe=args.exe, launcher=args.mpiexec, resume=args.resume,
+                              chunk_time=args.chunk_time, max_resumes=args.max_resumes,
+                              cache=cache, policy=DivergencePolicy() if args.abort_diverging else None)
+    scheduler.load_state(retry_failed=args.retry_failed)
+    print(f"待运行 {len(scheduler.pending())} 个案例，总核数预算 {args.cores}")
+    start = time.time()
+    counts = scheduler.run()
+    print(f"\n总耗时: {time.time() - start:.1f}秒")
+    print("  ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+    return 0 if counts.get('failed', 0) + counts.get('timeout', 0) == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
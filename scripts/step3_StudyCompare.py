@@ -0,0 +1,285 @@
+"""
+参数研究结果批量对比
+配合step1_MeshGenerator.py与step2_CaseRunner.py使用：扫描case_NNN_*目录，按glob找到每个案例的CSV输出，
+在进程池中并行读取（列投影+旁路缓存，见csv_timeseries），把案例参数与汇总量（如hoop_stress_max峰值、
+strain_energy_total终值）合并为一张汇总表，并输出多页对比图（每页一个变量、至多CASES_PER_PAGE个案例）。
+
+案例参数依次取自：step1的清单文件、输入文件的注释头、CSV文件名中的"键=值"（如h=..._l=..._Gc=...）、目录名。
+
+用法：python step3_StudyCompare.py [案例目录] --summary hoop_stress_max:max --plot T_avg
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from csv_timeseries import decimate, load_csv
+
+try:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+except ModuleNotFoundError:
+    plt = None
+
+# 基础配置（可被命令行参数覆盖）
+study_dir = '/home/yp/projects/raccoon/FuelFracture/ScriptTesting/parameter_studies'
+
+# 每个案例的CSV按顺序尝试这些glob（相对案例目录），取第一个有匹配的模式中文件名最短的一个（主程序）
+CSV_GLOBS = ['*_csv.csv', 'outputs/*.csv', '**/*.csv']
+# 汇总量：(列名, 统计方式)，统计方式为 max/min/final/mean/tmax（峰值时刻）
+SUMMARIES = [
+    ('hoop_stress_max', 'max'),
+    ('hoop_stress_max', 'tmax'),
+    ('strain_energy_total', 'final'),
+    ('T_avg', 'max'),
+    ('time', 'final'),
+]
+PLOT_COLUMNS = ['hoop_stress_max', 'strain_energy_total', 'T_avg']
+CASES_PER_PAGE = 10
+PLOT_WIDTH = 1600                       # 对比图降采样的像素宽度
+SUMMARY_NAME = 'study_summary.csv'
+FIGURE_NAME = 'study_comparison.pdf'
+
+MANIFEST_NAME = '.study_manifest.json'  # 与step1一致
+CASE_DIR_PATTERN = re.compile(r'^case_(\d+)_(.*)$')
+HEADER_START = '# === 参数研究案例 ==='
+HEADER_PARAM = re.compile(r'^#\s*([^:=\s]+)\s*[:=]\s*(\S+)\s*$')
+FILE_BASE_PARAM = re.compile(r'([A-Za-z][A-Za-z0-9]*)=([-+]?[\d.]+(?:[eE][-+]?\d+)?)')
+# step1的案例名：参数名前两个字符 + 数值（小数点写成下划线），各参数以下划线连接
+CASE_NAME_PARAM = re.compile(r'([A-Za-z][A-Za-z]?)(-?\d+(?:_\d+)?(?:e[-+]?\d+)?)(?=_|$)')
+TIME_STEP_CSV = re.compile(r'_\d{4,}\.csv$')  # VectorPostprocessor每步一个文件，不是时间序列
+
+
+def parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return text
+
+
+def discover_cases(root):
+    """按编号顺序列出所有case_NNN_*目录"""
+    cases = []
+    for name in os.listdir(root):
+        match = CASE_DIR_PATTERN.match(name)
+        if match and os.path.isdir(os.path.join(root, name)):
+            cases.append((int(match.group(1)), name))
+    return [name for _, name in sorted(cases)]
+
+
+def find_case_csv(case_dir, globs=CSV_GLOBS):
+    for pattern in globs:
+        matches = [p for p in Path(case_dir).glob(pattern)
+                   if not p.name.startswith('.') and not TIME_STEP_CSV.search(p.name)]
+        if matches:
+            return min(matches, key=lambda p: (len(p.name), str(p)))
+    return None
+
+
+def header_params(case_dir):
+    """从step1写入的输入文件注释头读取参数"""
+    inputs = sorted(p for p in Path(case_dir).glob('*.i') if not p.name.startswith('sub_'))
+    for path in inputs:
+        params = {}
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            if f.readline().strip() != HEADER_START:
+                continue
+            for line in f:
+                match = HEADER_PARAM.match(line)
+                if not match:
+                    break  # 注释头以空行结束
+                if match.group(1) != '生成时间':
+                    params[match.group(1)] = parse_value(match.group(2))
+        if params:
+            return params
+    return {}
+
+
+def case_params(case_dir, csv_path, manifest_params=None):
+    if manifest_params:
+        return dict(manifest_params)
+    params = header_params(case_dir)
+    if params:
+        return params
+    if csv_path is not None:
+        params = {k: parse_value(v) for k, v in FILE_BASE_PARAM.findall(csv_path.stem)}
+        if params:
+            return params
+    name = CASE_DIR_PATTERN.match(os.path.basename(case_dir)).group(2)
+    return {k: parse_value(v.replace('_', '.')) for k, v in CASE_NAME_PARAM.findall(name)}
+
+
+def summarize(data, column, stat):
+    values = data.get(column)
+    if values is None or not np.isfinite(values).any():
+        return None
+    if stat == 'max':
+        return float(np.nanmax(values))
+    if stat == 'min':
+        return float(np.nanmin(values))
+    if stat == 'mean':
+        return float(np.nanmean(values))
+    if stat == 'final':
+        return float(values[np.flatnonzero(np.isfinite(values))[-1]])
+    if stat == 'tmax':
+        return float(data['time'][np.nanargmax(values)]) if 'time' in data else None
+    raise ValueError(f"未知的统计方式: {stat}")
+
+
+def process_case(task):
+    """进程池任务：读取一个案例的CSV，返回参数、汇总量与降采样后的曲线"""
+    case_dir, manifest_params, summaries, plot_columns, globs = task
+    csv_path = find_case_csv(case_dir, globs)
+    result = {'case': os.path.basename(case_dir), 'csv': None, 'error': None,
+              'params': case_params(case_dir, csv_path, manifest_params), 'summary': {}, 'curves': {}}
+    if csv_path is None:
+        result['error'] = '没有找到CSV'
+        return result
+    result['csv'] = str(csv_path)
+    try:
+        data = load_csv(csv_path, ['time'] + [c for c, _ in summaries] + list(plot_columns))
+    except (OSError, ValueError) as e:
+        result['error'] = str(e)
+        return result
+    for column, stat in summaries:
+        result['summary'][f'{column}_{stat}'] = summarize(data, column, stat)
+    if 'time' in data:
+        for column in plot_columns:
+            if column in data:
+                result['curves'][column] = decimate(data['time'], data[column], PLOT_WIDTH)
+    return result
+
+
+def load_manifest_params(root):
+    """step1清单中 目录名 -> 参数"""
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {entry['dir']: entry['params'] for entry in manifest.get('cases', {}).values()}
+
+
+def collect(root, summaries=SUMMARIES, plot_columns=PLOT_COLUMNS, globs=CSV_GLOBS, workers=None):
+    root = os.path.abspath(root)
+    manifest = load_manifest_params(root)
+    tasks = [(os.path.join(root, name), manifest.get(name), summaries, plot_columns, globs)
+             for name in discover_cases(root)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        return [process_case(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 每个进程一次领取若干案例，减少数百个小任务的往返开销
+        return list(pool.map(process_case, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+
+
+def write_summary(results, output_path):
+    """汇总表：案例、各参数、各汇总量、CSV路径；返回列名"""
+    param_names = list(dict.fromkeys(k for r in results for k in r['params']))
+    summary_names = list(dict.fromkeys(k for r in results for k in r['summary']))
+    fieldnames = ['case'] + param_names + summary_names + ['csv', 'error']
+    tmp_path = str(output_path) + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for r in results:
+            writer.writerow({'case': r['case'], **r['params'], **r['summary'], 'csv': r['csv'], 'error': r['error']})
+    os.replace(tmp_path, output_path)
+    return fieldnames
+
+
+def format_summary(results, summary_names):
+    lines = []
+    for r in results:
+        params = ' '.join(f"{k}={v}" for k, v in r['params'].items())
+        values = '  '.join(f"{name}={r['summary'][name]:.4g}" if r['summary'].get(name) is not None
+                           else f"{name}=-" for name in summary_names)
+        lines.append(f"{r['case']:<40}{params:<40}  {r['error'] or values}")
+    return '\n'.join(lines)
+
+
+def write_figures(results, plot_columns, output_path, per_page=CASES_PER_PAGE):
+    """多页PDF：每个变量按每页per_page个案例分页；返回页数"""
+    pages = 0
+    with PdfPages(output_path) as pdf:
+        for column in plot_columns:
+            cases = [r for r in results if column in r['curves']]
+            for start in range(0, len(cases), per_page):
+                chunk = cases[start:start + per_page]
+                fig, ax = plt.subplots(figsize=(11, 7))
+                for r in chunk:
+                    label = ' '.join(f"{k}={v}" for k, v in r['params'].items()) or r['case']
+                    ax.plot(*r['curves'][column], label=f"{r['case'][:8]} {label}")
+                ax.set_xlabel('time')
+                ax.set_ylabel(column)
+                ax.set_title(f"{column}（案例 {start + 1}-{start + len(chunk)} / {len(cases)}）")
+                ax.legend(fontsize=8)
+                fig.tight_layout()
+                pdf.savefig(fig)
+                plt.close(fig)
+                pages += 1
+    return pages
+
+
+def parse_summary(text):
+    column, sep, stat = text.rpartition(':')
+    if not sep or stat not in ('max', 'min', 'final', 'mean', 'tmax'):
+        raise argparse.ArgumentTypeError(f"格式应为 列名:max|min|final|mean|tmax: {text}")
+    return column, stat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量汇总与对比参数研究各案例的CSV结果')
+    parser.add_argument('study_dir', nargs='?', default=study_dir, help='step1生成的案例根目录')
+    parser.add_argument('--summary', type=parse_summary, action='append', metavar='列名:统计',
+                        help='汇总量（可多次指定，替换默认列表），统计为max/min/final/mean/tmax')
+    parser.add_argument('--plot', action='append', metavar='列名', help='对比图的变量（可多次指定，替换默认列表）')
+    parser.add_argument('--glob', action='append', help='查找案例CSV的glob（相对案例目录，可多次指定）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行读取的进程数')
+    parser.add_argument('--per-page', type=int, default=CASES_PER_PAGE, help='对比图每页的案例数')
+    parser.add_argument('--output', help='输出目录，默认为案例根目录')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.study_dir):
+        raise FileNotFoundError(f"案例目录不存在: {args.study_dir}")
+    summaries = args.summary or SUMMARIES
+    plot_columns = args.plot or PLOT_COLUMNS
+    output_dir = args.output or args.study_dir
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = collect(args.study_dir, summaries, plot_columns, args.glob or CSV_GLOBS, args.workers)
+    if not results:
+        print("没有找到case_NNN_*目录")
+        return 1
+    summary_path = os.path.join(output_dir, SUMMARY_NAME)
+    write_summary(results, summary_path)
+    print(format_summary(results, [f'{c}_{s}' for c, s in summaries]))
+    print(f"\n汇总表: {summary_path}")
+
+    if plt is None:
+        print("未安装matplotlib，跳过对比图")
+    else:
+        figure_path = os.path.join(output_dir, FIGURE_NAME)
+        pages = write_figures(results, plot_columns, figure_path, args.per_page)
+        print(f"对比图: {figure_path}（{pages}页）")
+
+    failed = [r['case'] for r in results if r['error']]
+    if failed:
+        print(f"{len(failed)} 个案例没有可用结果: {', '.join(failed)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())